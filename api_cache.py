@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 256
+MAX_BYTES = 64 * 1024 * 1024
+MAX_AGE = 30
+
+_lock = threading.Lock()
+_versions = {}
+_entries = OrderedDict()
+_cached_bytes = 0
+
+def bump_data_version(*tables):
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+def get_data_version(*tables):
+    return tuple(_versions.get(table, 0) for table in tables)
+
+def clear():
+    global _cached_bytes
+    with _lock:
+        _entries.clear()
+        _cached_bytes = 0
+
+def get_cached_json(key, tables, builder):
+    global _cached_bytes
+    version = get_data_version(*tables)
+    now = time.monotonic()
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry and entry['version'] == version and now - entry['created'] < MAX_AGE:
+            _entries.move_to_end(key)
+            return entry, True
+
+    payload = builder()
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    entry = {
+        'version': version,
+        'created': now,
+        'body': body,
+        'etag': hashlib.blake2b(body, digest_size=12).hexdigest()
+    }
+
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous:
+            _cached_bytes -= len(previous['body'])
+        _entries[key] = entry
+        _cached_bytes += len(body)
+        while len(_entries) > MAX_ENTRIES or (_cached_bytes > MAX_BYTES and len(_entries) > 1):
+            _, evicted = _entries.popitem(last=False)
+            _cached_bytes -= len(evicted['body'])
+
+    return entry, False
+
+def cached_json_response(tables, builder):
+    from flask import request, Response
+
+    key = (request.path, tuple(sorted(request.args.items(multi=True))))
+    entry, hit = get_cached_json(key, tables, builder)
+
+    if request.if_none_match.contains(entry['etag']):
+        response = Response(status=304)
+    else:
+        from assets import choose_encoding, compress_body, MIN_COMPRESS_SIZE
+
+        body = entry['body']
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding and len(body) >= MIN_COMPRESS_SIZE:
+            encoded = entry.setdefault('encoded', {})
+            if encoding not in encoded:
+                encoded[encoding] = compress_body(body, encoding)
+            body = encoded[encoding]
+        else:
+            encoding = None
+
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(entry['etag'])
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path(__file__).parent / 'static'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESSIBLE_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'image/svg+xml'
+)
+MIN_COMPRESS_SIZE = 1024
+
+_manifest = {}
+_assets = {}
+
+def compress_body(body, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if static else 5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9 if static else 6, mtime=0)
+    return body
+
+def available_encodings():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+def choose_encoding(accept_encodings):
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+def load_assets(static_dir=STATIC_DIR):
+    _manifest.clear()
+    _assets.clear()
+
+    for path in sorted(Path(static_dir).rglob('*')):
+        if not path.is_file():
+            continue
+
+        logical = path.relative_to(static_dir).as_posix()
+        body = path.read_bytes()
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        fingerprinted = path.with_name(f"{path.stem}.{digest}{path.suffix}").relative_to(static_dir).as_posix()
+
+        mimetype = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        variants = {None: body}
+        if mimetype in COMPRESSIBLE_MIMETYPES and len(body) >= MIN_COMPRESS_SIZE:
+            for encoding in available_encodings():
+                variants[encoding] = compress_body(body, encoding, static=True)
+
+        _manifest[logical] = fingerprinted
+        _assets[fingerprinted] = {
+            'mimetype': mimetype,
+            'etag': digest,
+            'variants': variants
+        }
+
+    return dict(_manifest)
+
+def asset_url(path):
+    from flask import url_for
+    return url_for('serve_asset', filename=_manifest.get(path, path))
+
+def serve_asset(filename):
+    from flask import request, Response, abort
+
+    asset = _assets.get(filename)
+    if not asset:
+        abort(404)
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding not in asset['variants']:
+        encoding = None
+
+    if request.if_none_match.contains(asset['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(asset['variants'][encoding], mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(asset['etag'])
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def compress_response(response):
+    from flask import request
+
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def init_app(app):
+    load_assets()
+    app.add_url_rule('/assets/<path:filename>', 'serve_asset', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.after_request(compress_response)
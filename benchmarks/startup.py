@@ -0,0 +1,76 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULT_PREFIX = 'STARTUP_RESULT '
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import web_Server
+imported = time.perf_counter()
+ready = web_Server.lifecycle.start()
+finished = time.perf_counter()
+status = web_Server.lifecycle.status()
+print({prefix!r} + json.dumps({{
+    'import_seconds': imported - started,
+    'startup_seconds': finished - imported,
+    'total_seconds': finished - started,
+    'ready': ready,
+    'subsystems': {{name: state['seconds'] for name, state in status['subsystems'].items()}}
+}}))
+web_Server.lifecycle.stop()
+'''
+
+def run_once(workdir):
+    code = PROBE.format(root=str(ROOT), prefix=RESULT_PREFIX)
+    completed = subprocess.run(
+        [sys.executable, '-c', code], cwd=workdir,
+        capture_output=True, text=True, timeout=120
+    )
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"Замер не удался:\n{completed.stderr[-2000:]}")
+
+def summarize(runs):
+    summary = {}
+    for key in ('import_seconds', 'startup_seconds', 'total_seconds'):
+        values = sorted(run[key] for run in runs)
+        summary[key] = {
+            'median': round(statistics.median(values), 4),
+            'min': round(values[0], 4),
+            'max': round(values[-1], 4)
+        }
+    summary['ready'] = all(run['ready'] for run in runs)
+    summary['subsystems'] = runs[-1]['subsystems']
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер времени запуска сервера FiroAccess')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, help='Допустимая медиана полного запуска, с')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_once(workdir)
+        runs = [run_once(workdir) for _ in range(args.runs)]
+
+    summary = summarize(runs)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    if not summary['ready']:
+        return 1
+    if args.budget is not None and summary['total_seconds']['median'] > args.budget:
+        print(f"Превышен бюджет запуска: {summary['total_seconds']['median']} > {args.budget} с", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
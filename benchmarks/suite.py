@@ -0,0 +1,293 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+HISTORY_FILE = Path(__file__).resolve().parent / 'history.json'
+REGRESSION_THRESHOLD = 0.10
+
+SCALES = {
+    'small': {'users': 10000, 'groups': 200, 'doors': 100, 'permissions': 5000, 'schedules': 100, 'events': 200000},
+    'full': {'users': 100000, 'groups': 2000, 'doors': 1000, 'permissions': 50000, 'schedules': 1000, 'events': 2000000}
+}
+
+FIRST_NAMES = ['Иван', 'Анна', 'Петр', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Елена', 'Сергей', 'Наталья']
+LAST_NAMES = ['Иванов', 'Петрова', 'Сидоров', 'Кузнецова', 'Смирнов', 'Попова', 'Васильев', 'Соколова', 'Морозов', 'Волкова']
+
+def _configure(workdir):
+    import users_db
+    import ologger
+    import scenarios_db
+
+    os.chdir(workdir)
+    users_db.DB_NAME = Path(workdir) / 'firo_access.db'
+    ologger.LOG_DB = str(Path(workdir) / 'log.db')
+    ologger.ARCHIVE_DIR = Path(workdir) / 'log_archive'
+    ologger.RETENTION_MONTHS = 0
+    scenarios_db.DB_NAME = str(Path(workdir) / 'firo_access.db')
+
+def _quiet():
+    return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+def generate_dataset(workdir, scale, seed=1):
+    import users_db
+    import ologger
+    import scenarios_db
+
+    sizes = SCALES[scale]
+    workdir = Path(workdir)
+    marker = workdir / 'dataset.json'
+    if marker.exists() and json.loads(marker.read_text()) == {'scale': scale, 'seed': seed, 'sizes': sizes}:
+        return sizes
+
+    workdir.mkdir(parents=True, exist_ok=True)
+    for name in ('firo_access.db', 'log.db'):
+        (workdir / name).unlink(missing_ok=True)
+    _configure(workdir)
+    rng = random.Random(seed)
+
+    with _quiet():
+        users_db.setupUserDB()
+        ologger.setupLogger()
+        scenarios_db.setup_scenarios_db()
+
+    group_ids = [f"G{i:05d}" for i in range(sizes['groups'])]
+    door_ids = [f"door-{i:05d}" for i in range(sizes['doors'])]
+
+    connection = sqlite3.connect(users_db.DB_NAME)
+    cursor = connection.cursor()
+    cursor.executemany(
+        'INSERT INTO Groups (name, id, status) VALUES (?, ?, ?)',
+        [(f"Группа {group_id}", group_id, 'active') for group_id in group_ids]
+    )
+    cursor.executemany(
+        'INSERT INTO Doors (device_id, name, location, status, auto_created) VALUES (?, ?, ?, ?, 0)',
+        [(door_id, f"Дверь {door_id}", f"Корпус {i % 20}", 'active' if i % 50 else 'inactive') for i, door_id in enumerate(door_ids)]
+    )
+
+    users = []
+    # Идентификаторы уникальны: Credentials не допускает общих PIN и номеров
+    pins = rng.sample(range(1000, 10000000), sizes['users'])
+    for i in range(sizes['users']):
+        groups = ','.join(rng.sample(group_ids, rng.randint(1, 3)))
+        users.append((
+            f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {i}",
+            f"U{i:07d}",
+            'active' if rng.random() < 0.95 else 'inactive',
+            groups,
+            pins[i],
+            f"C{i:08d}",
+            f"А{i % 1000:03d}ВС{i // 1000:03d}"
+        ))
+    cursor.executemany(
+        'INSERT INTO Users (name, id, status, groups, pin, cardcode, liplate) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        users
+    )
+
+    pairs = set()
+    while len(pairs) < sizes['permissions']:
+        pairs.add((rng.choice(group_ids), rng.choice(door_ids)))
+    schedules = ['{}', '{"always": true}', '{"time_range": {"start": "08:00", "end": "20:00"}}']
+    cursor.executemany(
+        'INSERT INTO DoorPermissions (group_id, device_id, permission_type, schedule) VALUES (?, ?, ?, ?)',
+        [(group_id, door_id, 'allow' if rng.random() < 0.9 else 'deny', rng.choice(schedules)) for group_id, door_id in sorted(pairs)]
+    )
+    cursor.executemany(
+        'INSERT INTO DoorAccessSchedules (door_id, schedule_name, start_time_utc, end_time_utc, weekdays, access_type) VALUES (?, ?, ?, ?, ?, ?)',
+        [(door_id, 'Рабочие часы', '06:00', '07:00', '1111100', 'allow_all') for door_id in rng.sample(door_ids, sizes['schedules'])]
+    )
+    connection.commit()
+    connection.close()
+
+    log = sqlite3.connect(ologger.LOG_DB)
+    log_cursor = log.cursor()
+    now = time.time()
+    span = 60 * 24 * 3600
+    batch = []
+    for i in range(sizes['events']):
+        timestamp = now - span + span * i / sizes['events']
+        door_id = rng.choice(door_ids)
+        outcome = 'РАЗРЕШЕН' if rng.random() < 0.85 else 'ЗАПРЕЩЕН'
+        batch.append((timestamp, door_id, f"Доступ {outcome}: устройство: {door_id}, карта=C{rng.randrange(sizes['users']):08d}"))
+        if len(batch) == 50000 or i == sizes['events'] - 1:
+            partitions = {}
+            for entry in batch:
+                partitions.setdefault(ologger._ensure_partition(log_cursor, entry[0]), []).append(entry)
+            for partition, rows in partitions.items():
+                log_cursor.executemany(
+                    f'INSERT INTO {partition} (time, device, id, levent) VALUES (?, ?, ?, ?)',
+                    [(timestamp, door_id, door_id, message) for timestamp, door_id, message in rows]
+                )
+            log.commit()
+            batch = []
+    log.close()
+
+    marker.write_text(json.dumps({'scale': scale, 'seed': seed, 'sizes': sizes}))
+    return sizes
+
+def _measure(function, args_list, repeat):
+    timings = []
+    with _quiet():
+        for i in range(repeat):
+            args = args_list[i % len(args_list)]
+            started = time.perf_counter()
+            function(*args)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'calls': len(timings),
+        'median_ms': round(statistics.median(timings) * 1000, 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 4),
+        'ops_per_second': round(len(timings) / sum(timings), 1)
+    }
+
+def run_benchmarks(sizes, repeat, only=None, seed=2):
+    import users_db
+    import ologger
+    import mqtt_client
+    import plate_index
+    from traffic import _LocalClient
+
+    rng = random.Random(seed)
+    user_ids = [f"U{rng.randrange(sizes['users']):07d}" for _ in range(200)]
+    door_ids = [f"door-{rng.randrange(sizes['doors']):05d}" for _ in range(200)]
+    group_ids = [f"G{rng.randrange(sizes['groups']):05d}" for _ in range(200)]
+    cards = [f"C{int(user_id[1:]):08d}" for user_id in user_ids]
+    # Номера в латинице, как их возвращает распознавание, половина с ошибкой в одном символе
+    plates = [f"A{int(user_id[1:]) % 1000:03d}BC{int(user_id[1:]) // 1000:03d}" for user_id in user_ids]
+    plates = [plate if i % 2 else plate[:-1] for i, plate in enumerate(plates)]
+
+    with _quiet():
+        users = [users_db.get_user_by_id(user_id) for user_id in user_ids]
+
+    handler = mqtt_client.MQTTHandler()
+    handler.client = _LocalClient(lambda topic, payload: None)
+    handler.is_connected = True
+    requests = [
+        {'request_id': str(i), 'device_id': door_ids[i], 'card_number': cards[i]}
+        for i in range(len(cards))
+    ]
+
+    benchmarks = {
+        'get_user_by_card': (users_db.get_user_by_card, [(card,) for card in cards]),
+        'find_user_by_plate': (plate_index.find_user_by_plate, [(plate,) for plate in plates]),
+        'check_user_access': (users_db.check_user_access, [(users[i], door_ids[i], 'card') for i in range(len(users))]),
+        'get_accessible_doors_for_user': (users_db.get_accessible_doors_for_user, [(user_id,) for user_id in user_ids]),
+        'get_door_permissions_by_door': (users_db.get_door_permissions, [(door_id,) for door_id in door_ids]),
+        'get_door_permissions_by_group': (users_db.get_door_permissions, [(None, group_id) for group_id in group_ids]),
+        'get_events_filtered_hour': (ologger.get_events_filtered, [(None, None, 'hour')]),
+        'get_events_filtered_device_week': (ologger.get_events_filtered, [(door_id, None, 'week') for door_id in door_ids]),
+        'handle_access_request': (handler._handle_access_request, [(request,) for request in requests])
+    }
+
+    results = {}
+    for name, (function, args_list) in benchmarks.items():
+        if only and name not in only:
+            continue
+        calls = repeat if not name.startswith('get_events') else max(3, repeat // 20)
+        results[name] = _measure(function, args_list, calls)
+        print(f"{name:34s} {results[name]['median_ms']:10.3f} мс  p95 {results[name]['p95_ms']:10.3f} мс", file=sys.stderr)
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def load_history(path=HISTORY_FILE):
+    path = Path(path)
+    return json.loads(path.read_text(encoding='utf-8')) if path.exists() else []
+
+def append_history(run, path=HISTORY_FILE):
+    history = load_history(path)
+    history.append(run)
+    Path(path).write_text(json.dumps(history, ensure_ascii=False, indent=2), encoding='utf-8')
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    report = {}
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        ratio = current['median_ms'] / previous['median_ms'] if previous['median_ms'] else None
+        report[name] = {
+            'baseline_ms': previous['median_ms'],
+            'current_ms': current['median_ms'],
+            'change': round(ratio - 1, 4) if ratio is not None else None,
+            'regression': ratio is not None and ratio - 1 > threshold
+        }
+    return report
+
+def _load_baseline(value, scale):
+    if value == 'last':
+        runs = [run for run in load_history() if run['scale'] == scale]
+        return runs[-1]['results'] if runs else {}
+    data = json.loads(Path(value).read_text(encoding='utf-8'))
+    return data.get('results', data)
+
+def main():
+    parser = argparse.ArgumentParser(description='Набор бенчмарков users_db и пути принятия решения о доступе')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--only', nargs='*', help='Запустить только указанные бенчмарки')
+    parser.add_argument('--data-dir', default=str(DATA_DIR))
+    parser.add_argument('--baseline', help="JSON файл с результатами или 'last' для предыдущего запуска из истории")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument('--no-history', action='store_true')
+    parser.add_argument('--output', help='Сохранить результаты запуска в отдельный JSON файл')
+    args = parser.parse_args()
+
+    workdir = Path(args.data_dir).resolve() / args.scale
+    started = time.perf_counter()
+    sizes = generate_dataset(workdir, args.scale)
+    print(f"Набор данных {args.scale} готов за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    baseline = _load_baseline(args.baseline, args.scale) if args.baseline else None
+
+    _configure(workdir)
+    # Схема могла измениться после генерации набора: применяем миграции
+    import users_db
+    with _quiet():
+        users_db.setupUserDB()
+    results = run_benchmarks(sizes, args.repeat, args.only)
+
+    run = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'scale': args.scale,
+        'sizes': sizes,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': results
+    }
+    if not args.no_history:
+        append_history(run)
+    if args.output:
+        Path(args.output).write_text(json.dumps(run, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    output = {'run': run}
+    exit_code = 0
+    if baseline is not None:
+        output['comparison'] = compare(results, baseline, args.threshold)
+        if any(item['regression'] for item in output['comparison'].values()):
+            exit_code = 1
+
+    print(json.dumps(output, ensure_ascii=False, indent=2))
+    return exit_code
+
+if __name__ == '__main__':
+    sys.exit(main())
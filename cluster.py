@@ -0,0 +1,126 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+import shared_state
+
+DEFAULT_GROUP = 'firoaccess'
+DEFAULT_STATE_URL = 'sqlite:///shared_state.db'
+
+def configure(group, state_url, message_queue=None):
+    import mqtt_client
+    import realtime
+    shared_state.configure(state_url)
+    mqtt_client.SHARED_GROUP = group
+    realtime.SOCKETIO_MESSAGE_QUEUE = message_queue
+
+def run_worker(index, group, state_url, host, port, message_queue=None):
+    configure(group, state_url, message_queue)
+    if message_queue:
+        import realtime
+        realtime.connect_queue()
+
+    import ologger
+    import schedules
+    from users_db import setupUserDB
+    from mqtt_client import init_mqtt, stop_mqtt
+
+    setupUserDB()
+    ologger.setupLogger()
+    # Решения о доступе принимает этот процесс: таблицы переходов расписаний должны обновляться и здесь
+    schedules.start_transition_refresh()
+    init_mqtt(host, port)
+    print(f"Обработчик {index} (pid {os.getpid()}) подключается к группе $share/{group}")
+
+    # Остановкой обработчиков управляет основной процесс через SIGTERM
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+    try:
+        stopped.wait()
+    finally:
+        stop_mqtt()
+        schedules.stop_transition_refresh()
+
+def run_http_worker(index, group, state_url, host, port, http_host, http_port, message_queue):
+    # Процесс HTTP работает на eventlet без отладочного режима; сообщения устройств
+    # обрабатывают процессы run_worker, а MQTT здесь только для отправки команд
+    import eventlet
+    eventlet.monkey_patch()
+    configure(group, state_url, message_queue)
+
+    import mqtt_client
+    import schedule_scheduler
+    mqtt_client.MQTT_HOST, mqtt_client.MQTT_PORT = host, port
+    mqtt_client.MQTT_CONSUME = False
+    schedule_scheduler.SCHEDULER_ENABLED = index == 0
+
+    import web_Server
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    print(f"Процесс HTTP {index} (pid {os.getpid()}) на порту {http_port}")
+    web_Server.start(run_server=False)
+    web_Server.serve(http_host, http_port, debug=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Запуск нескольких обработчиков запросов доступа FiroAccess')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--group', default=DEFAULT_GROUP, help='Имя группы общей подписки MQTT')
+    parser.add_argument('--state', default=DEFAULT_STATE_URL, help='sqlite:///путь или redis://хост:порт/0')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--http-workers', type=int, default=0, help='Количество процессов веб-сервера')
+    parser.add_argument('--with-web', action='store_true', help='Запустить один процесс веб-сервера')
+    parser.add_argument('--http-host', default='0.0.0.0')
+    parser.add_argument('--http-port', type=int, default=80)
+    parser.add_argument('--message-queue', help='Очередь сообщений Socket.IO: redis://хост:порт/0 или amqp://')
+    args = parser.parse_args()
+
+    if args.state.startswith('memory://'):
+        parser.error('memory:// не разделяется между процессами')
+    http_workers = max(args.http_workers, 1 if args.with_web else 0)
+    if http_workers and not args.workers:
+        parser.error('процессы веб-сервера не обрабатывают MQTT, нужен хотя бы один обработчик (--workers)')
+    if http_workers > 1 and not args.message_queue:
+        parser.error('для нескольких процессов веб-сервера нужна --message-queue')
+    if args.message_queue and args.message_queue.startswith('local://'):
+        parser.error('local:// не разделяется между процессами')
+
+    workers = [
+        multiprocessing.Process(
+            target=run_worker, name=f"firo-worker-{index}",
+            args=(index, args.group, args.state, args.host, args.port, args.message_queue)
+        )
+        for index in range(args.workers)
+    ]
+    # Процессы HTTP запускаются заново, а не копией основного: eventlet подменяет модули до их импорта
+    spawn = multiprocessing.get_context('spawn')
+    workers += [
+        spawn.Process(
+            target=run_http_worker, name=f"firo-http-{index}",
+            args=(index, args.group, args.state, args.host, args.port, args.http_host, args.http_port, args.message_queue)
+        )
+        for index in range(http_workers)
+    ]
+    if http_workers and not args.message_queue:
+        print("Без --message-queue уведомления сценариев из обработчиков MQTT не доходят до браузеров")
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        for worker in workers:
+            worker.join()
+
+if __name__ == '__main__':
+    main()
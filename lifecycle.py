@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = metrics.gauge('firo_startup_seconds', 'Время запуска подсистем сервера')
+SUBSYSTEM_READY = metrics.gauge('firo_subsystem_ready', 'Готовность подсистем сервера', ['subsystem'])
+SUBSYSTEM_START_SECONDS = metrics.gauge('firo_subsystem_start_seconds', 'Время запуска подсистемы', ['subsystem'])
+
+class Lifecycle:
+    def __init__(self):
+        self.subsystems = {}
+        self.state = {}
+        self.started_at = None
+        self.startup_seconds = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._events = {}
+
+    def register(self, name, start, stop=None, depends=(), required=True):
+        self.subsystems[name] = {
+            'start': start,
+            'stop': stop,
+            'depends': tuple(depends),
+            'required': required
+        }
+        self.state[name] = {'status': 'pending', 'seconds': None, 'error': None}
+        self._events[name] = threading.Event()
+        SUBSYSTEM_READY.labels(name).set(0)
+
+    def _run(self, name):
+        subsystem = self.subsystems[name]
+        try:
+            for dependency in subsystem['depends']:
+                self._events[dependency].wait()
+                if self.state[dependency]['status'] != 'ready':
+                    raise RuntimeError(f"Зависимость {dependency} не запущена")
+
+            self.state[name]['status'] = 'starting'
+            started = time.perf_counter()
+            subsystem['start']()
+            elapsed = time.perf_counter() - started
+
+            self.state[name].update(status='ready', seconds=round(elapsed, 4))
+            SUBSYSTEM_READY.labels(name).set(1)
+            SUBSYSTEM_START_SECONDS.labels(name).set(elapsed)
+            logger.info(f"Подсистема {name} запущена за {elapsed:.3f} с")
+        except Exception as e:
+            self.state[name].update(status='failed', error=str(e))
+            logger.error(f"Ошибка запуска подсистемы {name}: {e}")
+        finally:
+            self._events[name].set()
+
+    def start(self, wait=True):
+        with self._lock:
+            if self.started_at is not None:
+                return self.wait_ready() if wait else None
+            self.started_at = time.perf_counter()
+
+        executor = ThreadPoolExecutor(max_workers=max(len(self.subsystems), 1), thread_name_prefix='startup')
+        for name in self.subsystems:
+            executor.submit(self._run, name)
+
+        def finish():
+            executor.shutdown(wait=True)
+            self.startup_seconds = time.perf_counter() - self.started_at
+            STARTUP_SECONDS.set(self.startup_seconds)
+            self._ready.set()
+            logger.info(f"Запуск сервера завершен за {self.startup_seconds:.3f} с")
+
+        if wait:
+            finish()
+            return self.is_ready()
+        threading.Thread(target=finish, name='startup-wait', daemon=True).start()
+
+    def wait_ready(self, timeout=None):
+        self._ready.wait(timeout)
+        return self.is_ready()
+
+    def is_ready(self):
+        return self._ready.is_set() and all(
+            self.state[name]['status'] == 'ready'
+            for name, subsystem in self.subsystems.items() if subsystem['required']
+        )
+
+    def status(self):
+        return {
+            'ready': self.is_ready(),
+            'startup_seconds': round(self.startup_seconds, 4) if self.startup_seconds is not None else None,
+            'subsystems': {name: dict(state) for name, state in self.state.items()}
+        }
+
+    def stop(self):
+        for name in reversed(list(self.subsystems)):
+            stop = self.subsystems[name]['stop']
+            if stop and self.state[name]['status'] == 'ready':
+                try:
+                    stop()
+                except Exception as e:
+                    logger.error(f"Ошибка остановки подсистемы {name}: {e}")
+            self.state[name]['status'] = 'stopped'
+            self._events[name].clear()
+            SUBSYSTEM_READY.labels(name).set(0)
+        self._ready.clear()
+        self.started_at = None
@@ -1,5 +1,7 @@
-import ologger
-import mqtt_client
+import eventlet
+# До остальных импортов: сокеты, time.sleep и потоки уступают управление другим клиентам сервера
+eventlet.monkey_patch()
+
 import web_Server
 
-mqtt_client.startClient()
\ No newline at end of file
+web_Server.start()
@@ -1,25 +1,248 @@
 import paho.mqtt.client as mqtt
+import asyncio
+import itertools
 import json
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, CancelledError as FutureCancelledError
 from datetime import datetime
 import threading
 import time
+from collections import deque
 import sys
 import os
+import socket
 import ologger
+import metrics
+import occupancy
+import shared_state
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MQTT_MESSAGES = metrics.counter('firo_mqtt_messages_total', 'Входящие MQTT сообщения по топикам', ['topic'])
+MQTT_PUBLISHED = metrics.counter('firo_mqtt_published_total', 'Исходящие MQTT сообщения по топикам и результату', ['topic', 'result'])
+MQTT_HANDLER_SECONDS = metrics.histogram('firo_mqtt_handler_seconds', 'Время обработки MQTT сообщения', ['topic'])
+MQTT_CONNECTED = metrics.gauge('firo_mqtt_connected', 'Подключен ли сервер к MQTT брокеру')
+MQTT_DEVICES = metrics.gauge('firo_mqtt_devices', 'Количество известных устройств')
+ACCESS_DECISIONS = metrics.counter('firo_access_decisions_total', 'Решения о доступе по результату и причине', ['outcome', 'reason'])
+ACCESS_DECISION_SECONDS = metrics.histogram('firo_access_decision_seconds', 'Время принятия решения о доступе', ['outcome'])
+MQTT_RECONNECTS = metrics.counter('firo_mqtt_disconnects_total', 'Потери соединения с MQTT брокером')
+
+MQTT_OUTBOUND = metrics.counter('firo_mqtt_outbound_total', 'Сообщения очереди исходящих публикаций по результату', ['result'])
+MQTT_OUTBOUND_QUEUED = metrics.gauge('firo_mqtt_outbound_queued', 'Сообщения в очереди исходящих публикаций')
+
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+OUTBOUND_QUEUE_SIZE = 1000
+OUTBOUND_DRAIN_BATCH = 100
+DEFAULT_PUBLISH_TTL = 60
+ACCESS_RESPONSE_TTL = 5
+DOOR_COMMAND_TTL = 30
+SCHEDULE_COMMAND_TTL = 300
+# publish() возвращает это значение, если сообщение принято в очередь до переподключения
+PUBLISH_QUEUED = 'queued'
+
+MQTT_HOST = '127.0.0.1'
+MQTT_PORT = 1883
+SHARED_GROUP = None
+# False - процесс только отправляет команды, сообщения устройств обрабатывают процессы cluster.py
+MQTT_CONSUME = True
+TRAFFIC_CAPTURE_PATH = None
+
+INGEST_QUEUE_SIZE = 10000
+# Сообщения одного устройства обрабатываются по порядку поступления (запрос доступа, затем
+# событие двери): у каждого устройства своя очередь и задача в цикле asyncio, а блокирующая
+# работа с БД выполняется в пуле из INGEST_DB_WORKERS потоков
+INGEST_DB_WORKERS = 8
+INGEST_SUBMIT_TIMEOUT = 5
+INGEST_SLOW_HANDLER_SECONDS = 30
+
+INGEST_QUEUED = metrics.gauge('firo_mqtt_ingest_queued', 'Сообщения в очереди обработки')
+INGEST_IN_FLIGHT = metrics.gauge('firo_mqtt_ingest_in_flight', 'Сообщения, обрабатываемые в данный момент')
+INGEST_WAIT_SECONDS = metrics.histogram('firo_mqtt_ingest_wait_seconds', 'Время ожидания сообщения в очереди обработки')
+INGEST_DROPPED = metrics.counter('firo_mqtt_ingest_dropped_total', 'Сообщения, не принятые в обработку', ['reason'])
+INGEST_LANES = metrics.gauge('firo_mqtt_ingest_lanes', 'Устройства с сообщениями в обработке')
+
+DEVICE_ID_FIELD = re.compile(rb'"device_id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+class IngestionCore:
+    def __init__(self, handler, queue_size=INGEST_QUEUE_SIZE, db_workers=INGEST_DB_WORKERS):
+        self.handler = handler
+        self.queue_size = queue_size
+        self.db_workers = db_workers
+        self.loop = None
+        self.executor = None
+        self.thread = None
+        self.lanes = {}
+        self.pending = 0
+        self._group = None
+        self._capacity = None
+        self._idle = None
+        self._stopping = None
+        self._next = itertools.count()
+        self._started = threading.Event()
+        INGEST_QUEUED.set_function(lambda: self.pending)
+        INGEST_LANES.set_function(lambda: len(self.lanes))
+
+    @property
+    def running(self):
+        return self.loop is not None and self.loop.is_running()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self._started.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.db_workers, thread_name_prefix='mqtt-db')
+        self.thread = threading.Thread(target=self._run_loop, name='mqtt-ingest', daemon=True)
+        self.thread.start()
+        self._started.wait()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        try:
+            loop.run_until_complete(self._main())
+        finally:
+            self.loop = None
+            self._started.set()
+            loop.close()
+
+    async def _main(self):
+        self._capacity = asyncio.Semaphore(self.queue_size)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stopping = asyncio.Event()
+        try:
+            async with asyncio.TaskGroup() as group:
+                self._group = group
+                self._started.set()
+                await self._stopping.wait()
+                # Оставшиеся задачи устройств отменяются, выход из группы дожидается их завершения
+                for _, task in self.lanes.values():
+                    task.cancel()
+        finally:
+            self._group = None
+            # Вызовы submit, ожидающие места в очереди, тоже отменяются
+            waiting = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in waiting:
+                task.cancel()
+            await asyncio.gather(*waiting, return_exceptions=True)
+
+    async def _enqueue(self, key, item):
+        await self._capacity.acquire()
+        if self._stopping.is_set():
+            self._capacity.release()
+            return False
+        self.pending += 1
+        self._idle.clear()
+        lane = self.lanes.get(key)
+        if lane is None:
+            items = asyncio.Queue()
+            lane = self.lanes[key] = (items, self._group.create_task(self._lane(key, items)))
+        lane[0].put_nowait(item)
+        return True
+
+    def _release(self, count=1):
+        self.pending -= count
+        for _ in range(count):
+            self._capacity.release()
+        if not self.pending:
+            self._idle.set()
+
+    async def _lane(self, key, items):
+        try:
+            while not items.empty():
+                topic, payload, enqueued = items.get_nowait()
+                try:
+                    await self._handle(topic, payload, enqueued)
+                finally:
+                    self._release()
+        finally:
+            del self.lanes[key]
+            if not items.empty():
+                INGEST_DROPPED.labels('shutdown').inc(items.qsize())
+                self._release(items.qsize())
+
+    async def _handle(self, topic, payload, enqueued):
+        INGEST_WAIT_SECONDS.observe(time.monotonic() - enqueued)
+        INGEST_IN_FLIGHT.inc()
+        future = self.loop.run_in_executor(self.executor, self.handler, topic, payload)
+        try:
+            # Медленный обработчик не прерывается: следующее сообщение устройства ждет его завершения
+            done, _ = await asyncio.wait({future}, timeout=INGEST_SLOW_HANDLER_SECONDS)
+            if not done:
+                logger.warning(f"Обработка сообщения {topic} идет дольше {INGEST_SLOW_HANDLER_SECONDS} с")
+            await future
+        except Exception as e:
+            logger.error(f"Ошибка обработки сообщения MQTT: {e}")
+        finally:
+            INGEST_IN_FLIGHT.dec()
+
+    def _lane_key(self, payload):
+        # device_id берется из текста сообщения без разбора JSON, который выполняет обработчик
+        match = DEVICE_ID_FIELD.search(payload) if isinstance(payload, (bytes, bytearray)) else None
+        if match:
+            return match.group(1)
+        return (None, next(self._next))
+
+    def submit(self, topic, payload):
+        # Вызывается из сетевого потока paho: при заполненной очереди поток ждет,
+        # и брокер перестает отдавать новые сообщения, пока обработчики не освободятся
+        loop = self.loop
+        if loop is None:
+            INGEST_DROPPED.labels('shutdown').inc()
+            return False
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(self._lane_key(payload), (topic, payload, time.monotonic())), loop)
+        try:
+            if future.result(INGEST_SUBMIT_TIMEOUT):
+                return True
+        except FutureTimeoutError:
+            future.cancel()
+            INGEST_DROPPED.labels('queue_full').inc()
+            logger.error(f"Очередь обработки MQTT переполнена, сообщение {topic} отброшено")
+            return False
+        except FutureCancelledError:
+            pass
+        INGEST_DROPPED.labels('shutdown').inc()
+        return False
+
+    async def _shutdown(self, drain_timeout):
+        try:
+            await asyncio.wait_for(self._idle.wait(), drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._stopping.set()
+
+    def stop(self, drain_timeout=5):
+        if not self.running:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(drain_timeout), self.loop).result()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
 class MQTTHandler:
-    def __init__(self, host='127.0.0.1', port=1883):
+    def __init__(self, host='127.0.0.1', port=1883, shared_group=None):
         self.host = host
         self.port = port
+        self.shared_group = shared_group
+        self.client_id = f"firoaccess_server-{socket.gethostname()}-{os.getpid()}"
         self.client = None
         self.is_connected = False
-        self.connected_devices = {}
+        self.connected = threading.Event()
+        self.connected_devices = shared_state.SharedDict('devices')
+        self.ingest = IngestionCore(self._process_message)
+        self.recorder = None
+        self.outbound = deque()
+        self.outbound_lock = threading.Lock()
+        self.draining = False
+        MQTT_OUTBOUND_QUEUED.set_function(lambda: len(self.outbound))
+        MQTT_CONNECTED.set_function(lambda: 1 if self.is_connected else 0)
+        MQTT_DEVICES.set_function(lambda: len(self.connected_devices))
         
         try:
             from users_db import get_user_by_card, get_user_by_pin, register_device, update_device_last_seen
@@ -37,64 +260,101 @@ class MQTTHandler:
     
     def connect(self):
         try:
-            self.client = mqtt.Client(client_id="firoaccess_server")
+            self.client = mqtt.Client(client_id=self.client_id)
             self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
             self.client.on_message = self._on_message
+            self.client.reconnect_delay_set(min_delay=RECONNECT_MIN_DELAY, max_delay=RECONNECT_MAX_DELAY)
             
             logger.info(f"Подключение к MQTT {self.host}:{self.port}")
             ologger.newLog(f"Подключение к MQTT {self.host}:{self.port}", "FiroAccessServer", "FiroAccessServer")
             
-            self.client.connect(self.host, self.port, 60)
-            
-            thread = threading.Thread(target=self._mqtt_loop, daemon=True)
-            thread.start()
-            
-            for i in range(5):
-                if self.is_connected:
-                    return True
-                time.sleep(0.5)
-            
-            return False
+            # Соединение устанавливается в фоновом потоке paho, который сам
+            # повторяет попытки с экспоненциальной задержкой, пока брокер недоступен
+            if MQTT_CONSUME:
+                self.ingest.start()
+            if TRAFFIC_CAPTURE_PATH and not self.recorder:
+                self.start_recording(TRAFFIC_CAPTURE_PATH)
+            self.client.connect_async(self.host, self.port, 60)
+            self.client.loop_start()
+            return True
             
         except Exception as e:
             logger.error(f"Ошибка подключения: {e}")
             ologger.newLog(f"Ошибка подключения к MQTT: {e}", "FiroAccessServer", "FiroAccessServer")
             return False
     
-    def _mqtt_loop(self):
-        try:
-            self.client.loop_forever()
-        except Exception as e:
-            ologger.newLog(f"Ошибка в MQTT цикле: {e}", "FiroAccessServer", "FiroAccessServer")
-            pass
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
     
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self.is_connected = True
+            self.connected.set()
             logger.info("✓ Подключено к MQTT")
             ologger.newLog("✓ Подключено к MQTT", "FiroAccessServer", "FiroAccessServer")
             
             topics = [
                 ("access/events", 0),
                 ("access/requests", 0),
+                ("access/plate_requests", 0),
                 ("access/status", 0),
                 ("access/commands", 0),
                 ("access/responses", 0)
             ]
             
-            for topic, qos in topics:
+            for topic, qos in topics if MQTT_CONSUME else ():
+                if self.shared_group:
+                    # Общая подписка: брокер отдает каждое сообщение одному из процессов группы
+                    topic = f"$share/{self.shared_group}/{topic}"
                 client.subscribe(topic, qos=qos)
                 logger.debug(f"Подписан на топик: {topic}")
             
+            self._start_drain()
+            
         else:
             error_msg = f"Ошибка подключения MQTT: {rc}"
             logger.error(error_msg)
             ologger.newLog(error_msg, "FiroAccessServer", "FiroAccessServer")
     
+    def _on_disconnect(self, client, userdata, rc):
+        self.is_connected = False
+        self.connected.clear()
+        if rc != 0:
+            MQTT_RECONNECTS.inc()
+            logger.warning(f"Соединение с MQTT потеряно ({rc}), переподключение")
+            ologger.newLog(f"Соединение с MQTT потеряно ({rc}), переподключение", "FiroAccessServer", "FiroAccessServer")
+    
+    def start_recording(self, path):
+        from traffic import TrafficRecorder
+        self.stop_recording()
+        self.recorder = TrafficRecorder(path)
+        logger.info(f"Запись MQTT трафика в {path}")
+        ologger.newLog(f"Запись MQTT трафика в {path}", "FiroAccessServer", "FiroAccessServer")
+    
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.close()
+            logger.info(f"Запись MQTT трафика остановлена: {recorder.count} сообщений")
+        return recorder.count if recorder else 0
+    
     def _on_message(self, client, userdata, msg):
+        topic = msg.topic
+        MQTT_MESSAGES.labels(topic).inc()
+        
+        recorder = self.recorder
+        if recorder:
+            recorder.record(topic, msg.payload)
+        
+        if self.ingest.running:
+            self.ingest.submit(topic, msg.payload)
+        else:
+            self._process_message(topic, msg.payload)
+    
+    def _process_message(self, topic, raw_payload):
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8')
+            payload = raw_payload.decode('utf-8')
             
             logger.debug(f"MQTT [{topic}]: {payload[:100]}")
             
@@ -106,14 +366,17 @@ class MQTTHandler:
                 ologger.newLog(error_msg, "FiroAccessServer", "FiroAccessServer")
                 return
             
-            if topic == "access/events":
-                self._handle_event(data)
-            elif topic == "access/requests":
-                self._handle_access_request(data)
-            elif topic == "access/status":
-                self._handle_status(data)
-            elif topic == "access/responses":
-                self._handle_client_response(data)
+            with MQTT_HANDLER_SECONDS.labels(topic).time():
+                if topic == "access/events":
+                    self._handle_event(data)
+                elif topic == "access/requests":
+                    self._handle_access_request(data)
+                elif topic == "access/plate_requests":
+                    self._handle_plate_request(data)
+                elif topic == "access/status":
+                    self._handle_status(data)
+                elif topic == "access/responses":
+                    self._handle_client_response(data)
                 
         except Exception as e:
             error_msg = f"Ошибка обработки сообщения MQTT: {e}"
@@ -128,10 +391,7 @@ class MQTTHandler:
         logger.info(f"Событие от {device_id}: {event_type}")
         ologger.newLog(f"Событие: {event_type} - {description}", device_id, device_id)
         
-        if device_id not in self.connected_devices:
-            self.connected_devices[device_id] = {}
-        
-        self.connected_devices[device_id].update({
+        self.connected_devices.merge(device_id, {
             'last_event': event_type,
             'last_seen': datetime.now().isoformat(),
             'status': 'online'
@@ -144,12 +404,46 @@ class MQTTHandler:
                 logger.error(f"Ошибка обновления времени устройства {device_id}: {e}")
     
     def _handle_access_request(self, data):
-        request_id = data.get('request_id')
-        device_id = data.get('device_id')
         card_number = data.get('card_number')
+        facility_code = data.get('facility_code')
         pin_code = data.get('pin_code')
         
-        logger.info(f"Запрос доступа на {device_id}: карта={card_number}, PIN={pin_code}")
+        def lookup():
+            user = None
+            if card_number:
+                user = self.get_user_by_card(card_number, facility_code)
+                logger.info(f"Поиск по карте {card_number}: {'найден' if user else 'не найден'}")
+            elif pin_code:
+                user = self.get_user_by_pin(pin_code)
+                logger.info(f"Поиск по PIN {pin_code}: {'найден' if user else 'не найден'}")
+            return user, 'card' if card_number else 'pin', {}
+        
+        self._decide_access(data, lookup, f"карта={card_number}, PIN={pin_code}", card_number)
+    
+    def _handle_plate_request(self, data):
+        plate = data.get('plate')
+        
+        def lookup():
+            from plate_index import find_user_by_plate
+            user, match = find_user_by_plate(plate)
+            logger.info(f"Поиск по номеру {plate}: {match.get('matched') or 'не найден'} (расстояние {match['distance']})")
+            details = {'plate': match}
+            if not user and match.get('candidates'):
+                details['message'] = "Номер соответствует нескольким пользователям"
+                details['reason'] = 'plate_ambiguous'
+            return user, 'plate', details
+        
+        self._decide_access(data, lookup, f"номер={plate}")
+    
+    def _decide_access(self, data, lookup, credential_text, scenario_card=None):
+        request_id = data.get('request_id')
+        device_id = data.get('device_id')
+        started = time.perf_counter()
+        reason = 'error'
+        user_name = None
+        user_id = None
+        
+        logger.info(f"Запрос доступа на {device_id}: {credential_text}")
         
         response = {
             'request_id': request_id,
@@ -162,6 +456,7 @@ class MQTTHandler:
                 logger.error("База данных недоступна")
                 response['success'] = False
                 response['message'] = "Ошибка сервера: база данных недоступна"
+                reason = 'db_unavailable'
                 ologger.newLog("База данных недоступна", device_id, device_id)
             else:
                 try:
@@ -169,43 +464,50 @@ class MQTTHandler:
                 except Exception as e:
                     logger.warning(f"Не удалось зарегистрировать устройство {device_id}: {e}")
                 
-                user = None
-                
-                if card_number:
-                    user = self.get_user_by_card(card_number)
-                    logger.info(f"Поиск по карте {card_number}: {'найден' if user else 'не найден'}")
-                elif pin_code:
-                    user = self.get_user_by_pin(pin_code)
-                    logger.info(f"Поиск по PIN {pin_code}: {'найден' if user else 'не найден'}")
+                user, access_type, details = lookup()
+                not_found_message = details.pop('message', "Пользователь не найден")
+                not_found_reason = details.pop('reason', 'user_not_found')
+                response.update(details)
                 
                 if user:
                     user_status = user.get('status', '').lower()
                     user_name = user.get('name', 'Неизвестно')
+                    user_id = user.get('id')
                     
                     if user_status == 'active':
-                        from users_db import check_user_access
-                        has_access, access_message = check_user_access(user, device_id, 'card' if card_number else 'pin')
+                        from users_db import check_user_access, access_reason_code
+                        has_access, access_message = check_user_access(user, device_id, access_type)
+                        passback_message = occupancy.check_and_record(user_id, device_id, user_name) if has_access else None
                         
-                        if has_access:
+                        if has_access and not passback_message:
                             response['success'] = True
                             response['message'] = f"Доступ разрешен для {user_name}"
                             response['user'] = {
                                 'id': user.get('id'),
                                 'name': user_name
                             }
+                            reason = 'granted'
                             logger.info(f"✓ Доступ разрешен: {user_name}")
+                        elif passback_message:
+                            response['success'] = False
+                            response['message'] = passback_message
+                            reason = 'anti_passback'
+                            logger.warning(f"✗ Доступ запрещен: {passback_message}")
                         else:
                             response['success'] = False
                             response['message'] = access_message
+                            reason = access_reason_code(access_message)
                             logger.warning(f"✗ Доступ запрещен: {access_message}")
                     else:
                         response['success'] = False
                         response['message'] = f"Пользователь {user_name} не активен"
+                        reason = 'user_inactive'
                         logger.warning(f"✗ Пользователь не активен: {user_name}")
                 else:
                     response['success'] = False
-                    response['message'] = "Пользователь не найден"
-                    logger.warning(f"✗ Пользователь не найден: карта={card_number}")
+                    response['message'] = not_found_message
+                    reason = not_found_reason
+                    logger.warning(f"✗ {not_found_message}: {credential_text}")
                 
         except Exception as e:
             logger.error(f"Ошибка проверки доступа: {e}")
@@ -213,12 +515,18 @@ class MQTTHandler:
             response['message'] = f"Ошибка сервера: {str(e)}"
             ologger.newLog(f"Ошибка проверки доступа: {e}", device_id, device_id)
         
-        self.publish('access/responses', response)
+        outcome = 'granted' if response['success'] else 'denied'
+        ACCESS_DECISIONS.labels(outcome, reason).inc()
+        ACCESS_DECISION_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+        self.publish('access/responses', response, ttl=ACCESS_RESPONSE_TTL)
+        ologger.record_access_decision(device_id, user_id, outcome, reason)
 
-        from scenarios_db import check_card_scenario
-        check_card_scenario(card_number, user_name)
-        ologger.newLog(f"Доступ {'РАЗРЕШЕН' if response['success'] else 'ЗАПРЕЩЕН'}: устройство: {device_id}, карта={card_number}, PIN={pin_code}, результат={response['message']}", device_id, device_id)
-        logger.info(f"Доступ {'РАЗРЕШЕН' if response['success'] else 'ЗАПРЕЩЕН'}: устройство={device_id}, карта={card_number}, PIN={pin_code}, результат={response['message']}")
+        if scenario_card:
+            from scenarios_db import check_card_scenario
+            check_card_scenario(scenario_card, user_name)
+        ologger.newLog(f"Доступ {'РАЗРЕШЕН' if response['success'] else 'ЗАПРЕЩЕН'}: устройство: {device_id}, {credential_text}, результат={response['message']}", device_id, device_id)
+        logger.info(f"Доступ {'РАЗРЕШЕН' if response['success'] else 'ЗАПРЕЩЕН'}: устройство={device_id}, {credential_text}, результат={response['message']}")
     
     def _handle_status(self, data):
         device_id = data.get('device_id')
@@ -227,7 +535,6 @@ class MQTTHandler:
         
         if device_id:
             if device_id not in self.connected_devices:
-                self.connected_devices[device_id] = {}
                 if self.db_available:
                     try:
                         self.register_device(device_id, ip_address=ip_address)
@@ -235,7 +542,7 @@ class MQTTHandler:
                     except Exception as e:
                         logger.error(f"Не удалось зарегистрировать устройство {device_id}: {e}")
             
-            self.connected_devices[device_id].update({
+            self.connected_devices.merge(device_id, {
                 'status': status,
                 'ip': ip_address,
                 'last_seen': datetime.now().isoformat()
@@ -257,20 +564,86 @@ class MQTTHandler:
         logger.info(f"Ответ от {device_id} на команду {command}: {result}")
         ologger.newLog(f"Ответ на команду {command}: {result} - {message}", device_id, device_id)
     
-    def publish(self, topic, data):
-        if not self.is_connected:
-            logger.warning(f"Не могу опубликовать: клиент не подключен")
-            ologger.newLog(f"Не могу опубликовать в {topic}: клиент не подключен", "FiroAccessServer", "FiroAccessServer")
-            return False
+    def _enqueue(self, topic, payload, ttl):
+        with self.outbound_lock:
+            if len(self.outbound) >= OUTBOUND_QUEUE_SIZE:
+                dropped_topic = self.outbound.popleft()[0]
+                MQTT_OUTBOUND.labels('dropped').inc()
+                logger.warning(f"Очередь публикаций переполнена, отброшено сообщение в {dropped_topic}")
+            self.outbound.append((topic, payload, time.monotonic() + ttl))
+        MQTT_OUTBOUND.labels('queued').inc()
+    
+    def _start_drain(self):
+        with self.outbound_lock:
+            if self.draining or not self.outbound:
+                return
+            self.draining = True
+        threading.Thread(target=self._drain_outbound, name='mqtt-drain', daemon=True).start()
+    
+    def _drain_outbound(self):
+        sent = expired = 0
+        try:
+            while self.is_connected:
+                with self.outbound_lock:
+                    batch = [self.outbound.popleft() for _ in range(min(OUTBOUND_DRAIN_BATCH, len(self.outbound)))]
+                if not batch:
+                    break
+                
+                now = time.monotonic()
+                for index, (topic, payload, expires_at) in enumerate(batch):
+                    if expires_at < now:
+                        expired += 1
+                        MQTT_OUTBOUND.labels('expired').inc()
+                        continue
+                    if not self.is_connected:
+                        # Связь снова потеряна: возвращаем неотправленное в начало очереди
+                        with self.outbound_lock:
+                            self.outbound.extendleft(reversed(batch[index:]))
+                        return
+                    self._publish_payload(topic, payload)
+                    sent += 1
+                    MQTT_OUTBOUND.labels('sent').inc()
+        finally:
+            with self.outbound_lock:
+                self.draining = False
+            if sent or expired:
+                logger.info(f"Очередь публикаций: отправлено {sent}, просрочено {expired}")
+                ologger.newLog(f"Очередь публикаций после переподключения: отправлено {sent}, просрочено {expired}", "FiroAccessServer", "FiroAccessServer")
         
+        if self.is_connected and self.outbound:
+            self._start_drain()
+    
+    def publish(self, topic, data, ttl=DEFAULT_PUBLISH_TTL):
         try:
             payload = json.dumps(data, ensure_ascii=False)
+        except Exception as e:
+            error_msg = f"Ошибка публикации в {topic}: {e}"
+            logger.error(error_msg)
+            ologger.newLog(error_msg, "FiroAccessServer", "FiroAccessServer")
+            return False
+        
+        # Пока очередь не опустела, новые сообщения встают за ней, чтобы сохранить порядок команд
+        if not self.is_connected or self.outbound or self.draining:
+            self._enqueue(topic, payload, ttl)
+            MQTT_PUBLISHED.labels(topic, 'queued').inc()
+            if self.is_connected:
+                self._start_drain()
+            else:
+                logger.warning(f"Клиент MQTT не подключен, сообщение в {topic} поставлено в очередь")
+            return PUBLISH_QUEUED
+        
+        return self._publish_payload(topic, payload)
+    
+    def _publish_payload(self, topic, payload):
+        try:
             result = self.client.publish(topic, payload, qos=1)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                MQTT_PUBLISHED.labels(topic, 'ok').inc()
                 logger.debug(f"Опубликовано в {topic}")
                 return True
             else:
+                MQTT_PUBLISHED.labels(topic, 'error').inc()
                 error_msg = f"Ошибка публикации в {topic}: код {result.rc}"
                 logger.error(error_msg)
                 ologger.newLog(error_msg, "FiroAccessServer", "FiroAccessServer")
@@ -290,7 +663,7 @@ class MQTTHandler:
         }
         logger.info(f"Отправка команды открытия двери на {device_id}")
         ologger.newLog(f"Отправка команды открытия двери", device_id, device_id)
-        return self.publish('access/commands', data)
+        return self.publish('access/commands', data, ttl=DOOR_COMMAND_TTL)
     
     def close_door(self, device_id):
         data = {
@@ -300,7 +673,7 @@ class MQTTHandler:
         }
         logger.info(f"Отправка команды закрытия двери на {device_id}")
         ologger.newLog(f"Отправка команды закрытия двери", device_id, device_id)
-        return self.publish('access/commands', data)
+        return self.publish('access/commands', data, ttl=DOOR_COMMAND_TTL)
     
     def open_door_sh(self, device_id):
         data = {
@@ -310,7 +683,7 @@ class MQTTHandler:
         }
         logger.info(f"Начало расписания для {device_id}")
         ologger.newLog(f"Начало расписания", device_id, device_id)
-        return self.publish('access/commands', data)
+        return self.publish('access/commands', data, ttl=SCHEDULE_COMMAND_TTL)
 
     def close_door_sh(self, device_id):
         data = {
@@ -320,7 +693,7 @@ class MQTTHandler:
         }
         logger.info(f"Конец расписания для {device_id}")
         ologger.newLog(f"Конец расписания", device_id, device_id)
-        return self.publish('access/commands', data)
+        return self.publish('access/commands', data, ttl=SCHEDULE_COMMAND_TTL)
 
     def reboot_device(self, device_id):
         data = {
@@ -330,25 +703,29 @@ class MQTTHandler:
         }
         logger.info(f"Отправка команды перезагрузки на {device_id}")
         ologger.newLog(f"Отправка команды перезагрузки", device_id, device_id)
-        return self.publish('access/commands', data)
+        return self.publish('access/commands', data, ttl=DOOR_COMMAND_TTL)
     
     def get_connected_devices(self):
-        return self.connected_devices
+        return self.connected_devices.snapshot()
     
     def disconnect(self):
         if self.client:
             self.client.disconnect()
+            self.client.loop_stop()
+            self.ingest.stop()
+            self.stop_recording()
             self.is_connected = False
+            self.connected.clear()
             logger.info("Отключено от MQTT")
             ologger.newLog("Отключено от MQTT", "FiroAccessServer", "FiroAccessServer")
 
 mqtt_handler = None
 
-def init_mqtt(host='127.0.0.1', port=1883):
+def init_mqtt(host=None, port=None, shared_group=None):
     global mqtt_handler
     
     if mqtt_handler is None:
-        mqtt_handler = MQTTHandler(host, port)
+        mqtt_handler = MQTTHandler(host or MQTT_HOST, port or MQTT_PORT, shared_group or SHARED_GROUP)
         if mqtt_handler.connect():
             logger.info("MQTT обработчик запущен")
             ologger.newLog("MQTT обработчик запущен", "FiroAccessServer", "FiroAccessServer")
@@ -358,5 +735,11 @@ def init_mqtt(host='127.0.0.1', port=1883):
     
     return mqtt_handler
 
+def stop_mqtt():
+    global mqtt_handler
+    if mqtt_handler:
+        mqtt_handler.disconnect()
+        mqtt_handler = None
+
 def get_mqtt_handler():
     return mqtt_handler
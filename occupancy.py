@@ -0,0 +1,296 @@
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+
+import metrics
+import shared_state
+from api_cache import get_data_version
+
+logger = logging.getLogger(__name__)
+
+OUTSIDE = ''
+JOURNAL_FLUSH_INTERVAL = 1.0
+# Версии данных локальны для процесса: настройки зон перечитываются и по времени
+DOOR_ZONES_TTL = 30
+
+ZONE_OCCUPANCY = metrics.gauge('firo_zone_occupancy', 'Количество людей в зоне', ['zone'])
+ANTI_PASSBACK_DENIED = metrics.counter('firo_anti_passback_denied_total', 'Отказы в доступе по правилу anti-passback')
+JOURNAL_PENDING = metrics.gauge('firo_zone_journal_pending', 'Изменения присутствия, ожидающие записи в БД')
+JOURNAL_FLUSH_SECONDS = metrics.histogram('firo_zone_journal_flush_seconds', 'Время записи журнала присутствия')
+
+def _denial(door, state):
+    # Местоположение неизвестно (первый проход или после сброса) - проход разрешается
+    if not door[2] or not state or state[0] != door[1]:
+        return None
+    if door[1] == OUTSIDE:
+        return "Доступ запрещен (повторный выход, anti-passback)"
+    return f"Доступ запрещен (повторный вход в зону {door[1]}, anti-passback)"
+
+class ZoneTracker:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._presence = {}
+        self._counts = {}
+        self._doors = {}
+        self._doors_version = None
+        self._doors_loaded = 0.0
+        self._loaded = False
+        self._dirty = {}
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._writer = None
+
+    def _db(self):
+        from users_db import DB_NAME
+        return sqlite3.connect(DB_NAME, timeout=10)
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            connection = self._db()
+            try:
+                rows = connection.execute('SELECT user_id, user_name, zone, device_id, entered_at FROM ZonePresence').fetchall()
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Не удалось загрузить присутствие в зонах: {e}")
+                rows = []
+            finally:
+                connection.close()
+            for user_id, user_name, zone, device_id, entered_at in rows:
+                self._move(user_id, zone, device_id, entered_at, user_name)
+            self._loaded = True
+            logger.info(f"Загружено присутствие в зонах: {len(rows)} записей")
+
+    def _door(self, device_id):
+        version = get_data_version('doors')
+        if self._doors_version != version or time.monotonic() - self._doors_loaded > DOOR_ZONES_TTL:
+            from users_db import get_door_zones
+            self._doors = get_door_zones()
+            self._doors_version = version
+            self._doors_loaded = time.monotonic()
+        return self._doors.get(device_id)
+
+    def _move(self, user_id, zone, device_id, timestamp, user_name):
+        previous = self._presence.get(user_id)
+        if previous and previous[0] != OUTSIDE:
+            self._counts[previous[0]] -= 1
+            ZONE_OCCUPANCY.labels(previous[0]).set(self._counts[previous[0]])
+        if zone is None:
+            self._presence.pop(user_id, None)
+            return
+        self._presence[user_id] = (zone, device_id, timestamp, user_name)
+        if zone != OUTSIDE:
+            self._counts[zone] = self._counts.get(zone, 0) + 1
+            ZONE_OCCUPANCY.labels(zone).set(self._counts[zone])
+
+    def check_and_record(self, user_id, device_id, user_name=''):
+        # Проверка и запись прохода под одной блокировкой: два одновременных прохода
+        # по одной карте не могут оба пройти проверку до записи
+        door = self._door(device_id)
+        if not door:
+            return None
+        self.load()
+        with self._lock:
+            message = _denial(door, self._presence.get(user_id))
+            if message is None:
+                self._move(user_id, door[1], device_id, time.time(), user_name or '')
+                self._dirty[user_id] = self._presence[user_id]
+                JOURNAL_PENDING.set(len(self._dirty))
+        if message is not None:
+            ANTI_PASSBACK_DENIED.inc()
+            return message
+        self._start_writer()
+        return None
+
+    def reset(self, user_id=None, zone=None):
+        self.load()
+        with self._lock:
+            if user_id is not None:
+                users = [user_id] if user_id in self._presence else []
+            else:
+                users = [uid for uid, state in self._presence.items() if zone is None or state[0] == zone]
+            for uid in users:
+                self._move(uid, None, None, None, None)
+                self._dirty[uid] = None
+            JOURNAL_PENDING.set(len(self._dirty))
+        self._start_writer()
+        return len(users)
+
+    def zone_of(self, user_id):
+        self.load()
+        state = self._presence.get(user_id)
+        return state[0] if state else None
+
+    def occupancy(self):
+        self.load()
+        with self._lock:
+            zones = {zone: count for zone, count in self._counts.items() if count > 0}
+        return {'zones': dict(sorted(zones.items())), 'total': sum(zones.values())}
+
+    def _snapshot(self):
+        self.load()
+        with self._lock:
+            return dict(self._presence)
+
+    def roll_call(self, zone=None):
+        people = [
+            {'user_id': user_id, 'name': state[3], 'zone': state[0], 'device_id': state[1], 'entered_at': state[2]}
+            for user_id, state in self._snapshot().items()
+            if state[0] != OUTSIDE and (zone is None or state[0] == zone)
+        ]
+        return sorted(people, key=lambda person: (person['zone'], person['name'] or person['user_id']))
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._flush_lock:
+            if self._writer is None:
+                self._stopped.clear()
+                self._writer = threading.Thread(target=self._write_behind, name='zone-journal', daemon=True)
+                self._writer.start()
+
+    def _write_behind(self):
+        while not self._stopped.wait(JOURNAL_FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи журнала присутствия: {e}")
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                JOURNAL_PENDING.set(0)
+            if not dirty:
+                return 0
+
+            started = time.perf_counter()
+            connection = self._db()
+            try:
+                with connection:
+                    connection.executemany(
+                        'DELETE FROM ZonePresence WHERE user_id = ?',
+                        [(user_id,) for user_id, state in dirty.items() if state is None]
+                    )
+                    connection.executemany('''
+                    INSERT INTO ZonePresence (user_id, user_name, zone, device_id, entered_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        user_name = excluded.user_name, zone = excluded.zone,
+                        device_id = excluded.device_id, entered_at = excluded.entered_at
+                    ''', [(user_id, state[3], state[0], state[1], state[2]) for user_id, state in dirty.items() if state is not None])
+            except Exception:
+                # Не записанные изменения возвращаются в журнал, если их не перекрыли новые
+                with self._lock:
+                    for user_id, state in dirty.items():
+                        self._dirty.setdefault(user_id, state)
+                    JOURNAL_PENDING.set(len(self._dirty))
+                raise
+            finally:
+                connection.close()
+            JOURNAL_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            return len(dirty)
+
+    def stop(self):
+        self._stopped.set()
+        writer, self._writer = self._writer, None
+        if writer and writer is not threading.current_thread():
+            writer.join(JOURNAL_FLUSH_INTERVAL * 2)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Ошибка записи журнала присутствия: {e}")
+
+class SharedZoneTracker(ZoneTracker):
+    # Процессы cluster.py: присутствие хранится в общем хранилище состояния (сохраняется им же,
+    # без таблицы ZonePresence), проверка и запись прохода - одна атомарная операция хранилища
+    NAMESPACE = 'presence'
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._zones = set()
+
+    def load(self):
+        pass
+
+    def check_and_record(self, user_id, device_id, user_name=''):
+        door = self._door(device_id)
+        if not door:
+            return None
+        result = {}
+
+        def update(state):
+            result['message'] = _denial(door, state)
+            if result['message'] is not None:
+                return state
+            return [door[1], device_id, time.time(), user_name or '']
+
+        self.store.update(self.NAMESPACE, user_id, update)
+        if result['message'] is not None:
+            ANTI_PASSBACK_DENIED.inc()
+        return result['message']
+
+    def _snapshot(self):
+        return {user_id: tuple(state) for user_id, state in self.store.items(self.NAMESPACE).items()}
+
+    def zone_of(self, user_id):
+        state = self.store.get(self.NAMESPACE, user_id)
+        return state[0] if state else None
+
+    def occupancy(self):
+        counts = {}
+        for state in self._snapshot().values():
+            if state[0] != OUTSIDE:
+                counts[state[0]] = counts.get(state[0], 0) + 1
+        self._zones.update(counts)
+        for zone in self._zones:
+            ZONE_OCCUPANCY.labels(zone).set(counts.get(zone, 0))
+        return {'zones': dict(sorted(counts.items())), 'total': sum(counts.values())}
+
+    def reset(self, user_id=None, zone=None):
+        if user_id is not None:
+            return 1 if self.store.delete(self.NAMESPACE, user_id) else 0
+        users = [uid for uid, state in self._snapshot().items() if zone is None or state[0] == zone]
+        return sum(1 for uid in users if self.store.delete(self.NAMESPACE, uid))
+
+    def flush(self):
+        return 0
+
+    def stop(self):
+        pass
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_tracker():
+    # Хранилище выбирается при первом обращении: cluster.py настраивает его после импорта модулей
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                store = shared_state.get_store()
+                _tracker = ZoneTracker() if isinstance(store, shared_state.LocalStateStore) else SharedZoneTracker(store)
+    return _tracker
+
+def load():
+    get_tracker().load()
+
+def check_and_record(user_id, device_id, user_name=''):
+    return get_tracker().check_and_record(user_id, device_id, user_name)
+
+def get_occupancy():
+    return get_tracker().occupancy()
+
+def get_roll_call(zone=None):
+    return get_tracker().roll_call(zone)
+
+def reset_presence(user_id=None, zone=None):
+    return get_tracker().reset(user_id, zone)
+
+def stop():
+    if _tracker is not None:
+        _tracker.stop()
+
+atexit.register(stop)
@@ -1,72 +1,315 @@
 import sqlite3
+import threading
 import time
 from datetime import datetime
+from pathlib import Path
+import metrics
+from api_cache import bump_data_version
+from profiler import profiled
+
+LOG_WRITE_SECONDS = metrics.histogram('firo_logger_write_seconds', 'Время записи события в журнал')
+LOG_PENDING_WRITES = metrics.gauge('firo_logger_pending_writes', 'Записи в журнал, ожидающие завершения')
+LOG_EVENTS = metrics.counter('firo_logger_events_total', 'Записанные события журнала')
+
+LOG_DB = 'log.db'
+ARCHIVE_DIR = Path(__file__).parent / 'log_archive'
+RETENTION_MONTHS = 12
+ARCHIVE_EXPIRED = True
+PARTITION_PREFIX = 'Event_'
+STATS_BUCKET_SECONDS = 3600
+STATS_GROUPS = {'hour': 'hour', 'door': 'door', 'user': 'user_id', 'outcome': 'outcome', 'reason': 'reason'}
+
+_partitions_lock = threading.Lock()
+_known_partitions = set()
+
+def _month_start(timestamp):
+    return datetime.fromtimestamp(timestamp).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+def _partition_name(month):
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+def _list_partitions(cursor, start=None, end=None):
+    query = 'SELECT name FROM EventPartitions WHERE 1=1'
+    params = []
+    if start is not None:
+        query += ' AND end > ?'
+        params.append(start)
+    if end is not None:
+        query += ' AND start <= ?'
+        params.append(end)
+    cursor.execute(query + ' ORDER BY start DESC', params)
+    return [row[0] for row in cursor.fetchall()]
+
+def _refresh_event_view(cursor):
+    cursor.execute('DROP VIEW IF EXISTS Event')
+    partitions = _list_partitions(cursor)
+    if partitions:
+        union = ' UNION ALL '.join(f'SELECT num, device, id, levent, time FROM {name}' for name in partitions)
+        cursor.execute(f'CREATE VIEW Event AS {union}')
+
+def _ensure_partition(cursor, timestamp):
+    month = _month_start(timestamp)
+    name = _partition_name(month)
+    if name in _known_partitions:
+        return name
+
+    with _partitions_lock:
+        cursor.execute('SELECT 1 FROM EventPartitions WHERE name = ?', (name,))
+        if cursor.fetchone() is None:
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+            num INTEGER PRIMARY KEY AUTOINCREMENT,
+            device TEXT NOT NULL,
+            id TEXT NOT NULL,
+            levent TEXT NOT NULL,
+            time REAL NOT NULL
+            )
+            ''')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name}(time)')
+
+            # Номера событий продолжают последовательность предыдущих разделов
+            cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence')
+            last_num = cursor.fetchone()[0]
+            cursor.execute('INSERT OR REPLACE INTO sqlite_sequence (name, seq) VALUES (?, ?)', (name, last_num))
+
+            cursor.execute(
+                'INSERT OR IGNORE INTO EventPartitions (name, start, end) VALUES (?, ?, ?)',
+                (name, month.timestamp(), _next_month(month).timestamp())
+            )
+            _refresh_event_view(cursor)
+        _known_partitions.add(name)
+    return name
+
+def _migrate_legacy_events(cursor):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'Event'")
+    row = cursor.fetchone()
+    if not row or row[0] != 'table':
+        return 0
+
+    cursor.execute('SELECT MIN(time), MAX(time), COUNT(*) FROM Event')
+    first, last, total = cursor.fetchone()
+    cursor.execute('ALTER TABLE Event RENAME TO EventLegacy')
+
+    if total:
+        month = _month_start(first)
+        while month.timestamp() <= last:
+            following = _next_month(month)
+            name = _ensure_partition(cursor, month.timestamp())
+            cursor.execute(
+                f'INSERT INTO {name} (num, device, id, levent, time) '
+                'SELECT num, device, id, levent, time FROM EventLegacy WHERE time >= ? AND time < ? ORDER BY num',
+                (month.timestamp(), following.timestamp())
+            )
+            month = following
+
+    cursor.execute('DROP TABLE EventLegacy')
+    _refresh_event_view(cursor)
+    return total
 
 def setupLogger():
-    connection = sqlite3.connect('log.db')
+    connection = sqlite3.connect(LOG_DB)
     cursor = connection.cursor()
 
+    cursor.execute('PRAGMA auto_vacuum')
+    if cursor.fetchone()[0] != 2:
+        # Режим INCREMENTAL включается только через полный VACUUM
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Event (
-    num INTEGER PRIMARY KEY AUTOINCREMENT,
-    device TEXT NOT NULL,
-    id TEXT NOT NULL,
-    levent TEXT NOT NULL,  
-    time REAL NOT NULL
+    CREATE TABLE IF NOT EXISTS EventPartitions (
+    name TEXT PRIMARY KEY,
+    start REAL NOT NULL,
+    end REAL NOT NULL
     )
     ''')
 
+    _known_partitions.clear()
+    migrated = _migrate_legacy_events(cursor)
+    if migrated:
+        print(f"Журнал событий разбит на месячные разделы: перенесено {migrated} записей")
+
+    _ensure_partition(cursor, time.time())
+    setup_access_stats(cursor)
     connection.commit()
     connection.close()
 
-def newLog(msg, device, id):
-    connection = sqlite3.connect('log.db')
+    apply_retention()
+
+def _archive_partition(connection, name):
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    connection.execute('ATTACH DATABASE ? AS archive', (str(ARCHIVE_DIR / f"{name}.db"),))
+    try:
+        connection.execute(f'DROP TABLE IF EXISTS archive.{name}')
+        connection.execute(f'CREATE TABLE archive.{name} AS SELECT * FROM main.{name}')
+        connection.commit()
+    finally:
+        connection.execute('DETACH DATABASE archive')
+
+def apply_retention(retention_months=None, archive=None, now=None):
+    retention_months = RETENTION_MONTHS if retention_months is None else retention_months
+    archive = ARCHIVE_EXPIRED if archive is None else archive
+    if not retention_months:
+        return []
+
+    cutoff = _month_start(now or time.time())
+    for _ in range(retention_months - 1):
+        cutoff = cutoff.replace(year=cutoff.year - 1, month=12) if cutoff.month == 1 else cutoff.replace(month=cutoff.month - 1)
+
+    connection = sqlite3.connect(LOG_DB)
     cursor = connection.cursor()
+    cursor.execute('SELECT name FROM EventPartitions WHERE end <= ? ORDER BY start', (cutoff.timestamp(),))
+    expired = [row[0] for row in cursor.fetchall()]
+
+    for name in expired:
+        if archive:
+            _archive_partition(connection, name)
+        cursor.execute(f'DROP TABLE IF EXISTS {name}')
+        cursor.execute('DELETE FROM EventPartitions WHERE name = ?', (name,))
+        _refresh_event_view(cursor)
+        connection.commit()
+        _known_partitions.discard(name)
+
+    cursor.execute('DELETE FROM AccessStats WHERE hour < ?', (cutoff.timestamp(),))
+    connection.commit()
+
+    if expired:
+        cursor.execute('PRAGMA incremental_vacuum')
+        cursor.fetchall()
+    connection.close()
+    return expired
+
+def newLog(msg, device, id):
+    LOG_PENDING_WRITES.inc()
+    started = time.perf_counter()
+    try:
+        connection = sqlite3.connect(LOG_DB)
+        cursor = connection.cursor()
+
+        tim = time.time()
+        known = len(_known_partitions)
+        partition = _ensure_partition(cursor, tim)
+
+        cursor.execute(f'INSERT INTO {partition} (levent, device, id, time) VALUES (?, ?, ?, ?)', (msg, device, id, tim))
 
-    tim = time.time()
+        connection.commit()
+        connection.close()
+        LOG_EVENTS.inc()
 
-    cursor.execute('INSERT INTO Event (levent, device, id, time) VALUES (?, ?, ?, ?)', (msg, device, id, tim))
+        if len(_known_partitions) > known:
+            apply_retention()
+    finally:
+        LOG_PENDING_WRITES.dec()
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - started)
 
+def setup_access_stats(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS AccessStats (
+    hour REAL NOT NULL,
+    door TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, door, user_id, outcome, reason)
+    ) WITHOUT ROWID
+    ''')
+
+def record_access_decision(door, user_id, outcome, reason, timestamp=None):
+    timestamp = time.time() if timestamp is None else timestamp
+    hour = timestamp - timestamp % STATS_BUCKET_SECONDS
+
+    connection = sqlite3.connect(LOG_DB)
+    cursor = connection.cursor()
+    cursor.execute('''
+    INSERT INTO AccessStats (hour, door, user_id, outcome, reason, count)
+    VALUES (?, ?, ?, ?, ?, 1)
+    ON CONFLICT(hour, door, user_id, outcome, reason) DO UPDATE SET count = count + 1
+    ''', (hour, door or '', user_id or '', outcome, reason or ''))
     connection.commit()
     connection.close()
+    bump_data_version('access_stats')
 
+def _time_filter_start(time_filter):
+    now = time.time()
+    if time_filter == 'hour':
+        return now - 3600
+    if time_filter == 'today':
+        return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if time_filter == 'week':
+        return now - (7 * 24 * 3600)
+    if time_filter == 'month':
+        return now - (30 * 24 * 3600)
+    return None
+
+@profiled
+def get_access_stats(time_filter='today', group_by='hour', door=None):
+    column = STATS_GROUPS.get(group_by)
+    if column is None:
+        raise ValueError(f"Неизвестная группировка: {group_by}")
+
+    where = ' WHERE 1=1'
+    params = []
+    since = _time_filter_start(time_filter)
+    if since is not None:
+        # Корзина часа, в который попадает since, учитывается целиком
+        where += ' AND hour >= ?'
+        params.append(since - since % STATS_BUCKET_SECONDS)
+    if door:
+        where += ' AND door = ?'
+        params.append(door)
+
+    connection = sqlite3.connect(LOG_DB)
+    cursor = connection.cursor()
+    cursor.execute(f'SELECT {column}, outcome, SUM(count) FROM AccessStats{where} GROUP BY {column}, outcome ORDER BY {column}', params)
+
+    buckets = {}
+    totals = {'granted': 0, 'denied': 0, 'total': 0}
+    for key, outcome, count in cursor.fetchall():
+        bucket = buckets.setdefault(key, {'key': key, 'granted': 0, 'denied': 0, 'total': 0})
+        bucket[outcome] = bucket.get(outcome, 0) + count
+        bucket['total'] += count
+        totals[outcome] = totals.get(outcome, 0) + count
+        totals['total'] += count
+
+    connection.close()
+    return {'group_by': group_by, 'range': time_filter, 'buckets': list(buckets.values()), 'totals': totals}
+
+@profiled
 def get_events_filtered(id_filter=None, levent_filter=None, time_filter=None):
-    connection = sqlite3.connect('log.db')
+    connection = sqlite3.connect(LOG_DB)
     cursor = connection.cursor()
     
-    query = 'SELECT * FROM Event WHERE 1=1'
+    conditions = ''
     params = []
     
     if id_filter:
-        query += ' AND id LIKE ?'
+        conditions += ' AND id LIKE ?'
         params.append(f'%{id_filter}%')
     
     if levent_filter:
-        query += ' AND levent LIKE ?'
+        conditions += ' AND levent LIKE ?'
         params.append(f'%{levent_filter}%')
     
-    if time_filter:
-        now = time.time()
-        if time_filter == 'hour':
-            hour_ago = now - 3600
-            query += ' AND time >= ?'
-            params.append(hour_ago)
-        elif time_filter == 'today':
-            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
-            query += ' AND time >= ?'
-            params.append(today_start)
-        elif time_filter == 'week':
-            week_ago = now - (7 * 24 * 3600)
-            query += ' AND time >= ?'
-            params.append(week_ago)
-        elif time_filter == 'month':
-            month_ago = now - (30 * 24 * 3600)
-            query += ' AND time >= ?'
-            params.append(month_ago)
-    
+    since = _time_filter_start(time_filter)
+    if since is not None:
+        conditions += ' AND time >= ?'
+        params.append(since)
+
+    partitions = _list_partitions(cursor, start=since)
+    if not partitions:
+        connection.close()
+        return []
+
+    query = ' UNION ALL '.join(
+        f'SELECT num, device, id, levent, time FROM {name} WHERE 1=1{conditions}' for name in partitions
+    )
     query += ' ORDER BY time DESC'
     
-    cursor.execute(query, params)
+    cursor.execute(query, params * len(partitions))
     events_data = cursor.fetchall()
     
     events = []
@@ -83,5 +326,6 @@ def get_events_filtered(id_filter=None, levent_filter=None, time_filter=None):
     connection.close()
     return events
 
+@profiled
 def get_events():
     return get_events_filtered()
\ No newline at end of file
@@ -0,0 +1,334 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Изменения из других процессов (импорт из консоли, cluster.py) подхватываются полной перестройкой
+PERMISSION_MATRIX_TTL = 300
+
+MATRIX_BUILD_SECONDS = metrics.gauge('firo_permission_matrix_build_seconds', 'Время полной перестройки матрицы прав')
+MATRIX_UPDATES = metrics.counter('firo_permission_matrix_updates_total', 'Инкрементальные обновления матрицы прав', ['kind'])
+
+def _split_groups(groups):
+    return frozenset(g.strip() for g in (groups or '').split(',') if g.strip())
+
+def _bits_from_indices(indices, size):
+    buffer = bytearray((size + 7) // 8)
+    for index in indices:
+        buffer[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(buffer, 'little')
+
+def _indices_from_bits(bits):
+    indices = []
+    for offset, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        while byte:
+            low = byte & -byte
+            indices.append((offset << 3) + low.bit_length() - 1)
+            byte ^= low
+    return indices
+
+class PermissionMatrix:
+    # Эффективные права без учета расписаний: для каждой двери битовое множество
+    # пользователей (бит i - пользователь с индексом i), которым она доступна по группам
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built_at = None
+        self._reset()
+
+    def _reset(self):
+        self.user_index = {}
+        self.user_ids = []
+        self.free_indices = []
+        self.user_groups = {}
+        self.active_users = 0
+        self.group_bits = {}
+        self.door_active = {}
+        self.door_allow = {}
+        self.door_deny = {}
+        self.group_doors = {}
+        self.door_bits = {}
+
+    def _db(self):
+        from users_db import DB_NAME
+        return sqlite3.connect(DB_NAME)
+
+    def build(self):
+        started = time.perf_counter()
+        connection = self._db()
+        try:
+            users = connection.execute('SELECT id, status, groups FROM Users').fetchall()
+            doors = connection.execute('SELECT device_id, status FROM Doors').fetchall()
+            permissions = connection.execute('SELECT group_id, device_id, permission_type FROM DoorPermissions').fetchall()
+        finally:
+            connection.close()
+
+        with self._lock:
+            self._reset()
+            size = len(users)
+            group_members = {}
+            active = []
+            for index, (user_id, status, groups) in enumerate(users):
+                self.user_index[user_id] = index
+                self.user_ids.append(user_id)
+                self.user_groups[user_id] = _split_groups(groups)
+                if (status or '').lower() == 'active':
+                    active.append(index)
+                for group in self.user_groups[user_id]:
+                    group_members.setdefault(group, []).append(index)
+
+            self.active_users = _bits_from_indices(active, size)
+            self.group_bits = {group: _bits_from_indices(indices, size) for group, indices in group_members.items()}
+
+            for device_id, status in doors:
+                self.door_active[device_id] = (status or '').lower() == 'active'
+            for group_id, device_id, permission_type in permissions:
+                target = self.door_deny if permission_type == 'deny' else self.door_allow
+                target.setdefault(device_id, set()).add(group_id)
+                self.group_doors.setdefault(group_id, set()).add(device_id)
+
+            for device_id in set(self.door_allow) | set(self.door_deny) | set(self.door_active):
+                self._recompute_door(device_id)
+
+            self.built_at = time.monotonic()
+
+        elapsed = time.perf_counter() - started
+        MATRIX_BUILD_SECONDS.set(elapsed)
+        logger.info(f"Матрица прав построена за {elapsed:.3f} с: {len(users)} пользователей, {len(self.door_active)} дверей")
+
+    def _union(self, groups):
+        bits = 0
+        for group in groups:
+            bits |= self.group_bits.get(group, 0)
+        return bits
+
+    def _recompute_door(self, device_id):
+        if not self.door_active.get(device_id) or not self.door_allow.get(device_id):
+            self.door_bits.pop(device_id, None)
+            return
+        bits = self._union(self.door_allow[device_id]) & ~self._union(self.door_deny.get(device_id, ())) & self.active_users
+        self.door_bits[device_id] = bits
+
+    def _user_allowed(self, groups, active, device_id):
+        return (
+            active and self.door_active.get(device_id, False)
+            and not groups.isdisjoint(self.door_allow.get(device_id, ()))
+            and groups.isdisjoint(self.door_deny.get(device_id, ()))
+        )
+
+    def _set_bit(self, bits, index, value):
+        return bits | (1 << index) if value else bits & ~(1 << index)
+
+    def update_users(self, rows, deleted=()):
+        # rows: (id, status, groups) из Users после изменения
+        with self._lock:
+            for user_id in deleted:
+                self._update_user(user_id, None, None)
+            for user_id, status, groups in rows:
+                self._update_user(user_id, (status or '').lower() == 'active', _split_groups(groups))
+        MATRIX_UPDATES.labels('users').inc(len(rows) + len(deleted))
+
+    def _update_user(self, user_id, active, groups):
+        index = self.user_index.get(user_id)
+        if index is None:
+            if groups is None:
+                return
+            index = self.free_indices.pop() if self.free_indices else len(self.user_ids)
+            if index == len(self.user_ids):
+                self.user_ids.append(user_id)
+            else:
+                self.user_ids[index] = user_id
+            self.user_index[user_id] = index
+            old_groups = frozenset()
+        else:
+            old_groups = self.user_groups.get(user_id, frozenset())
+
+        new_groups = groups or frozenset()
+        for group in old_groups - new_groups:
+            self.group_bits[group] = self.group_bits.get(group, 0) & ~(1 << index)
+        for group in new_groups - old_groups:
+            self.group_bits[group] = self.group_bits.get(group, 0) | (1 << index)
+        self.active_users = self._set_bit(self.active_users, index, bool(active))
+
+        affected = set()
+        for group in old_groups | new_groups:
+            affected.update(self.group_doors.get(group, ()))
+        for device_id in affected:
+            allowed = groups is not None and self._user_allowed(new_groups, active, device_id)
+            bits = self.door_bits.get(device_id)
+            if bits is None:
+                if allowed:
+                    self._recompute_door(device_id)
+                continue
+            self.door_bits[device_id] = self._set_bit(bits, index, allowed)
+
+        if groups is None:
+            del self.user_index[user_id]
+            self.user_groups.pop(user_id, None)
+            self.user_ids[index] = None
+            self.free_indices.append(index)
+        else:
+            self.user_groups[user_id] = new_groups
+
+    def update_doors(self, doors, permissions):
+        # doors: {device_id: status или None если удалена}, permissions: {device_id: [(group_id, type)]}
+        with self._lock:
+            for device_id, status in doors.items():
+                if status is None:
+                    self.door_active.pop(device_id, None)
+                else:
+                    self.door_active[device_id] = status.lower() == 'active'
+            for device_id, rules in permissions.items():
+                for group in self.door_allow.pop(device_id, set()) | self.door_deny.pop(device_id, set()):
+                    self.group_doors.get(group, set()).discard(device_id)
+                for group_id, permission_type in rules:
+                    target = self.door_deny if permission_type == 'deny' else self.door_allow
+                    target.setdefault(device_id, set()).add(group_id)
+                    self.group_doors.setdefault(group_id, set()).add(device_id)
+            for device_id in set(doors) | set(permissions):
+                self._recompute_door(device_id)
+        MATRIX_UPDATES.labels('doors').inc(len(set(doors) | set(permissions)))
+
+    def preview(self, changes, limit=100):
+        # Пробное применение изменений разрешений: разница эффективного доступа до и после
+        with self._lock:
+            allow = {}
+            deny = {}
+            for change in changes:
+                action = change.get('action', 'set')
+                group_id = change.get('group_id')
+                if not group_id or action not in ('set', 'delete', 'delete_group'):
+                    raise ValueError(f"Некорректное изменение: {change}")
+                if action == 'delete_group':
+                    devices = list(self.group_doors.get(group_id, ()))
+                elif change.get('device_id'):
+                    devices = [change['device_id']]
+                else:
+                    raise ValueError(f"Не указана дверь: {change}")
+
+                for device_id in devices:
+                    if device_id not in allow:
+                        allow[device_id] = set(self.door_allow.get(device_id, ()))
+                        deny[device_id] = set(self.door_deny.get(device_id, ()))
+                    allow[device_id].discard(group_id)
+                    deny[device_id].discard(group_id)
+                    if action == 'set':
+                        target = deny if change.get('permission_type') == 'deny' else allow
+                        target[device_id].add(group_id)
+
+            doors = []
+            gained_any = lost_any = 0
+            for device_id in sorted(allow):
+                before = self.door_bits.get(device_id, 0)
+                after = 0
+                if self.door_active.get(device_id) and allow[device_id]:
+                    after = self._union(allow[device_id]) & ~self._union(deny[device_id]) & self.active_users
+                gained = after & ~before
+                lost = before & ~after
+                gained_any |= gained
+                lost_any |= lost
+                if not gained and not lost:
+                    continue
+                doors.append({
+                    'device_id': device_id,
+                    'gained': gained.bit_count(),
+                    'lost': lost.bit_count(),
+                    'gained_users': [self.user_ids[i] for i in _indices_from_bits(gained)[:limit]],
+                    'lost_users': [self.user_ids[i] for i in _indices_from_bits(lost)[:limit]]
+                })
+
+            return {
+                'doors': doors,
+                'gained_users': gained_any.bit_count(),
+                'lost_users': lost_any.bit_count()
+            }
+
+    def users_for_door(self, device_id):
+        with self._lock:
+            bits = self.door_bits.get(device_id, 0)
+            return [self.user_ids[index] for index in _indices_from_bits(bits)]
+
+    def count_for_door(self, device_id):
+        return self.door_bits.get(device_id, 0).bit_count()
+
+    def doors_for_user(self, user_id):
+        with self._lock:
+            index = self.user_index.get(user_id)
+            if index is None or not (self.active_users >> index) & 1:
+                return []
+            groups = self.user_groups.get(user_id, frozenset())
+            candidates = set()
+            for group in groups:
+                candidates.update(self.group_doors.get(group, ()))
+            return sorted(device_id for device_id in candidates if self._user_allowed(groups, True, device_id))
+
+    def can_access(self, user_id, device_id):
+        with self._lock:
+            index = self.user_index.get(user_id)
+            if index is None:
+                return False
+            return self._user_allowed(self.user_groups.get(user_id, frozenset()), (self.active_users >> index) & 1, device_id)
+
+_matrix = PermissionMatrix()
+_build_lock = threading.Lock()
+
+def get_matrix():
+    if _matrix.built_at is None or time.monotonic() - _matrix.built_at > PERMISSION_MATRIX_TTL:
+        with _build_lock:
+            if _matrix.built_at is None or time.monotonic() - _matrix.built_at > PERMISSION_MATRIX_TTL:
+                _matrix.build()
+    return _matrix
+
+def on_data_change(kind, keys):
+    # Под блокировкой перестройки: изменение, пришедшее во время полной перестройки, применяется
+    # после нее к уже новому снимку, а не затирается им
+    with _build_lock:
+        if _matrix.built_at is None:
+            return
+        if keys is None:
+            _matrix.built_at = None
+            return
+        _apply_change(kind, list(keys))
+
+def _apply_change(kind, keys):
+    # _select_in запрашивает ключи пачками по 500 - в пределах лимита параметров SQLite
+    from users_db import _select_in
+
+    connection = _matrix._db()
+    cursor = connection.cursor()
+    try:
+        if kind == 'users':
+            rows = list(_select_in(cursor, 'SELECT id, status, groups FROM Users WHERE 1=1', 'id', keys))
+            found = {row[0] for row in rows}
+            _matrix.update_users(rows, [user_id for user_id in keys if user_id not in found])
+        elif kind == 'doors':
+            statuses = dict(_select_in(cursor, 'SELECT device_id, status FROM Doors WHERE 1=1', 'device_id', keys))
+            rules = {device_id: [] for device_id in keys}
+            for group_id, device_id, permission_type in _select_in(
+                cursor, 'SELECT group_id, device_id, permission_type FROM DoorPermissions WHERE 1=1', 'device_id', keys
+            ):
+                rules[device_id].append((group_id, permission_type))
+            _matrix.update_doors({device_id: statuses.get(device_id) for device_id in keys}, rules)
+    finally:
+        connection.close()
+
+def _register():
+    from users_db import add_change_listener
+    add_change_listener(on_data_change)
+
+_register()
+
+def get_users_for_door(device_id):
+    return get_matrix().users_for_door(device_id)
+
+def get_doors_for_user(user_id):
+    return get_matrix().doors_for_user(user_id)
+
+def preview_changes(changes, limit=100):
+    return get_matrix().preview(changes, limit)
+
+def count_users_for_door(device_id):
+    return get_matrix().count_for_door(device_id)
@@ -0,0 +1,137 @@
+import threading
+import time
+from itertools import combinations
+
+import metrics
+from api_cache import get_data_version
+
+PLATE_MAX_DISTANCE = 1
+PLATE_MIN_LENGTH = 4
+# Версии данных локальны для процесса: индекс перестраивается и по времени
+PLATE_INDEX_TTL = 30
+
+PLATE_LOOKUPS = metrics.counter('firo_plate_lookups_total', 'Поиск номеров автомобилей по результату', ['result'])
+PLATE_LOOKUP_SECONDS = metrics.histogram('firo_plate_lookup_seconds', 'Время поиска номера автомобиля в индексе')
+PLATE_INDEX_SIZE = metrics.gauge('firo_plate_index_size', 'Количество номеров в индексе')
+
+# Кириллические буквы российских номеров, совпадающие по начертанию с латинскими
+CYRILLIC_TO_LATIN = str.maketrans('АВЕКМНОРСТУХ', 'ABEKMHOPCTYX')
+# Символы, которые камеры путают при распознавании, приводятся к одному виду
+CONFUSABLES = str.maketrans('OQDIL|BSZG', '0001118526')
+
+def normalize_plate(plate):
+    if not plate:
+        return ''
+    plate = str(plate).upper().translate(CYRILLIC_TO_LATIN)
+    return ''.join(char for char in plate if char.isalnum()).translate(CONFUSABLES)
+
+def _deletes(value, max_distance):
+    variants = {value}
+    for count in range(1, min(max_distance, len(value)) + 1):
+        for positions in combinations(range(len(value)), count):
+            variants.add(''.join(char for i, char in enumerate(value) if i not in positions))
+    return variants
+
+def _distance(a, b, limit):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+class PlateIndex:
+    # Индекс симметричного удаления: для каждого номера хранятся варианты с удаленными
+    # символами, поэтому поиск с допуском в N правок - это несколько обращений к словарю
+    def __init__(self, max_distance=PLATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._plates = {}
+        self._deletes = {}
+
+    def __len__(self):
+        return len(self._plates)
+
+    def add(self, plate, value):
+        key = normalize_plate(plate)
+        if len(key) < PLATE_MIN_LENGTH:
+            return
+        self._plates.setdefault(key, set()).add(value)
+        for variant in _deletes(key, self.max_distance):
+            self._deletes.setdefault(variant, set()).add(key)
+
+    def search(self, plate):
+        key = normalize_plate(plate)
+        if len(key) < PLATE_MIN_LENGTH:
+            return None, []
+        if key in self._plates:
+            return 0, sorted(self._plates[key])
+
+        candidates = set()
+        for variant in _deletes(key, self.max_distance):
+            candidates.update(self._deletes.get(variant, ()))
+
+        best = self.max_distance + 1
+        matches = set()
+        for candidate in candidates:
+            distance = _distance(key, candidate, self.max_distance)
+            if distance < best:
+                best = distance
+                matches = set(self._plates[candidate])
+            elif distance == best:
+                matches.update(self._plates[candidate])
+
+        if best > self.max_distance:
+            return None, []
+        return best, sorted(matches)
+
+_index = None
+_index_version = None
+_index_built = 0.0
+_index_lock = threading.Lock()
+
+def get_plate_index():
+    global _index, _index_version, _index_built
+    version = get_data_version('users', 'credentials')
+    if _index is not None and _index_version == version and time.monotonic() - _index_built <= PLATE_INDEX_TTL:
+        return _index
+
+    with _index_lock:
+        if _index is None or _index_version != version or time.monotonic() - _index_built > PLATE_INDEX_TTL:
+            from users_db import get_credential_values
+            index = PlateIndex()
+            for value in get_credential_values('plate'):
+                index.add(value, value)
+            _index, _index_version, _index_built = index, version, time.monotonic()
+            PLATE_INDEX_SIZE.set(len(index))
+    return _index
+
+def find_user_by_plate(plate, lookup=None):
+    # lookup: поиск пользователя по значению из индекса (пакетная проверка передает уже прочитанные)
+    if lookup is None:
+        from users_db import get_user_by_plate as lookup
+
+    started = time.perf_counter()
+    distance, values = get_plate_index().search(plate)
+
+    users = {}
+    for value in values:
+        user = lookup(value)
+        if user:
+            users.setdefault(user['id'], (user, value))
+    PLATE_LOOKUP_SECONDS.observe(time.perf_counter() - started)
+
+    match = {'recognized': plate, 'normalized': normalize_plate(plate), 'distance': distance}
+    if len(users) == 1:
+        user, value = next(iter(users.values()))
+        match['matched'] = value
+        PLATE_LOOKUPS.labels('exact' if distance == 0 else 'fuzzy').inc()
+        return user, match
+
+    match['candidates'] = len(users)
+    PLATE_LOOKUPS.labels('ambiguous' if users else 'not_found').inc()
+    return None, match
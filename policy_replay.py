@@ -0,0 +1,340 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+REPLAY_BATCH_SIZE = 10000
+REPLAY_SAMPLE_LIMIT = 100
+REPLAY_TOP_DOORS = 50
+# События идут по времени: прошедшие минуты из кеша расписаний больше не нужны
+REPLAY_SCHEDULE_CACHE_SIZE = 100000
+
+# Строка журнала из MQTTHandler._decide_access; результат в старых записях может отсутствовать
+ACCESS_EVENT = re.compile(
+    r'^Доступ (?P<outcome>РАЗРЕШЕН|ЗАПРЕЩЕН): устройство: (?P<device>.*?), '
+    r'(?:карта=(?P<card>[^,]*)(?:, PIN=(?P<pin>[^,]*))?|номер=(?P<plate>[^,]*))'
+    r'(?:, результат=(?P<result>.*))?$'
+)
+
+def _value(text):
+    return None if text in (None, '', 'None') else text
+
+def parse_access_event(message):
+    match = ACCESS_EVENT.match(message)
+    if not match:
+        return None
+    card, pin, plate = _value(match['card']), _value(match['pin']), _value(match['plate'])
+    if card:
+        credential = ('card', card)
+    elif pin:
+        credential = ('pin', pin)
+    elif plate:
+        credential = ('plate', plate)
+    else:
+        return None
+    return match['device'], credential, match['outcome'] == 'РАЗРЕШЕН', match['result']
+
+def read_access_events(log_db, since=None, until=None, batch_size=REPLAY_BATCH_SIZE):
+    # Пачки (время, устройство, (тип, значение), разрешен ли доступ в журнале) по возрастанию времени
+    import ologger
+
+    connection = sqlite3.connect(log_db)
+    try:
+        partitions = ologger._list_partitions(connection.cursor(), since, until)
+        conditions = " WHERE levent LIKE 'Доступ %'"
+        params = []
+        if since is not None:
+            conditions += ' AND time >= ?'
+            params.append(since)
+        if until is not None:
+            conditions += ' AND time < ?'
+            params.append(until)
+
+        for name in reversed(partitions):
+            cursor = connection.execute(f'SELECT time, levent FROM {name}{conditions} ORDER BY time', params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch = []
+                for timestamp, message in rows:
+                    event = parse_access_event(message)
+                    if event:
+                        batch.append((timestamp, event[0], event[1], event[2]))
+                yield len(rows), batch
+    finally:
+        connection.close()
+
+class CredentialResolver:
+    # Идентификаторы из снимка БД: журнал не хранит пользователя, только карту, PIN или номер
+    def __init__(self, db_name):
+        self._entries = {}
+        self._plates = None
+        connection = sqlite3.connect(db_name)
+        try:
+            rows = connection.execute(
+                "SELECT type, value, facility, user_id, valid_from, valid_to FROM Credentials ORDER BY facility != '', id"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        from users_db import _stored_credential_time
+
+        for credential_type, value, facility, user_id, valid_from, valid_to in rows:
+            self._entries.setdefault((credential_type, value), []).append((
+                facility, user_id,
+                _stored_credential_time(valid_from, datetime.max),
+                _stored_credential_time(valid_to, datetime.min)
+            ))
+
+    def _plate_index(self):
+        # Индекс номеров строится только если в журнале есть проезды
+        if self._plates is None:
+            from plate_index import PlateIndex
+
+            self._plates = PlateIndex()
+            for credential_type, value in self._entries:
+                if credential_type == 'plate':
+                    self._plates.add(value, value)
+        return self._plates
+
+    def _valid(self, credential_type, value, moment):
+        for facility, user_id, valid_from, valid_to in self._entries.get((credential_type, value), ()):
+            if valid_from and valid_from > moment:
+                continue
+            if valid_to and valid_to <= moment:
+                continue
+            return user_id, facility
+        return None, None
+
+    def resolve(self, credential_type, value, moment):
+        from users_db import _normalize_credential
+
+        if credential_type == 'plate':
+            users = {}
+            for plate in self._plate_index().search(value)[1]:
+                user_id, facility = self._valid('plate', plate, moment)
+                if user_id:
+                    users.setdefault(user_id, (plate, facility))
+            if len(users) != 1:
+                return None, None
+            user_id, (plate, facility) = next(iter(users.items()))
+            return user_id, {'type': 'plate', 'value': plate, 'facility': facility}
+
+        value = _normalize_credential(credential_type, value)[0]
+        user_id, facility = self._valid(credential_type, value, moment)
+        if not user_id:
+            return None, None
+        return user_id, {'type': credential_type, 'value': value, 'facility': facility}
+
+class PolicySnapshot:
+    def __init__(self, db_name=None, credentials=None):
+        from users_db import DB_NAME, load_access_policy
+
+        self.db_name = db_name or DB_NAME
+        self.policy = load_access_policy(db_name=self.db_name)
+        self.credentials = credentials or CredentialResolver(self.db_name)
+        self._schedule_cache = {}
+        self._next_rule_id = max(
+            (rule[2] for rules in self.policy['rules'].values() for rule in rules.values()), default=0
+        ) + 1
+        # Решения по нетронутым изменениями дверям и пользователям совпадают с текущей политикой
+        self.changed_doors = set()
+        self.changed_users = set()
+
+    def apply_changes(self, changes):
+        # Формат изменений разрешений как у /api/permissions/impact, плюс пользователи, двери и расписания дверей
+        import schedules
+
+        rules = self.policy['rules']
+        for change in changes:
+            action = change.get('action', 'set')
+            if action in ('set', 'delete'):
+                group_id, device_id = change.get('group_id'), change.get('device_id')
+                if not group_id or not device_id:
+                    raise ValueError(f"Некорректное изменение: {change}")
+                door_rules = rules.setdefault(device_id, {})
+                self.changed_doors.add(device_id)
+                if action == 'delete':
+                    door_rules.pop(group_id, None)
+                    continue
+                schedule = schedules.compile_schedule(schedules.validate_schedule(change.get('schedule', {})))
+                # Как set_door_permission: существующее разрешение группы обновляется на месте
+                rule_id = door_rules[group_id][2] if group_id in door_rules else self._next_rule_id
+                self._next_rule_id = max(self._next_rule_id, rule_id + 1)
+                door_rules[group_id] = (change.get('permission_type', 'allow'), schedule, rule_id)
+            elif action == 'delete_group':
+                if not change.get('group_id'):
+                    raise ValueError(f"Некорректное изменение: {change}")
+                for device_id, door_rules in rules.items():
+                    if door_rules.pop(change['group_id'], None):
+                        self.changed_doors.add(device_id)
+            elif action == 'user':
+                user = self.policy['users'].get(str(change.get('user_id', '')).lower())
+                if not user:
+                    raise ValueError(f"Пользователь не найден: {change}")
+                for field in ('groups', 'status'):
+                    if field in change:
+                        user[field] = change[field]
+                self.changed_users.add(user['id'].lower())
+            elif action == 'door':
+                door = self.policy['doors'].get(change.get('device_id'))
+                if not door:
+                    raise ValueError(f"Дверь не найдена: {change}")
+                if 'status' in change:
+                    door['status'] = change['status']
+                self.changed_doors.add(change['device_id'])
+            elif action == 'door_schedules':
+                if not change.get('device_id'):
+                    raise ValueError(f"Не указана дверь: {change}")
+                self.policy['door_schedules'][change['device_id']] = [
+                    (
+                        schedules.compile_door_hours(
+                            item['start_time_utc'], item['end_time_utc'], item.get('weekdays'),
+                            item.get('holidays', 'ignore'), item.get('timezone', schedules.DEFAULT_TIMEZONE)
+                        ),
+                        item.get('access_type', 'allow_all'), None, item.get('schedule_name', '')
+                    )
+                    for item in change.get('schedules', []) if item.get('is_active', True)
+                ]
+                self.changed_doors.add(change['device_id'])
+            else:
+                raise ValueError(f"Некорректное изменение: {change}")
+        self._schedule_cache.clear()
+
+    def affects(self, device_id, user_id):
+        return device_id in self.changed_doors or (user_id is not None and user_id.lower() in self.changed_users)
+
+    def decide(self, resolved, credential_type, device_id, moment):
+        from users_db import evaluate_policy_access
+
+        user_id, matched = resolved
+        user = self.policy['users'].get(user_id.lower()) if user_id else None
+        if user is not None:
+            user = dict(user, credential=matched)
+        if len(self._schedule_cache) > REPLAY_SCHEDULE_CACHE_SIZE:
+            self._schedule_cache.clear()
+        return evaluate_policy_access(self.policy, user, device_id, credential_type, moment, self._schedule_cache)
+
+def replay(baseline, candidate, events, sample_limit=REPLAY_SAMPLE_LIMIT):
+    started = time.perf_counter()
+    # Снимок из другой базы сравнивается целиком, снимок с изменениями - только по затронутым дверям и пользователям
+    compare_all = candidate.db_name != baseline.db_name
+    report = {
+        'events': 0,
+        'access_events': 0,
+        'baseline': Counter(),
+        'candidate': Counter(),
+        'recorded_mismatch': 0,
+        'changed': Counter(),
+        'transitions': Counter(),
+        'by_door': {},
+        'samples': []
+    }
+
+    for read, batch in events:
+        report['events'] += read
+        report['access_events'] += len(batch)
+        # Внутри пачки повторяющиеся проходы одного идентификатора в ту же минуту решаются один раз
+        decisions = {}
+        for timestamp, device_id, credential, recorded in batch:
+            moment = datetime.utcfromtimestamp(timestamp)
+            key = (credential, device_id, moment.replace(second=0, microsecond=0))
+            if key not in decisions:
+                resolved = baseline.credentials.resolve(credential[0], credential[1], moment)
+                before_decision = baseline.decide(resolved, credential[0], device_id, moment)
+                if candidate.credentials is not baseline.credentials:
+                    candidate_resolved = candidate.credentials.resolve(credential[0], credential[1], moment)
+                else:
+                    candidate_resolved = resolved
+                if not compare_all and candidate_resolved == resolved and not candidate.affects(device_id, resolved[0]):
+                    after_decision = before_decision
+                else:
+                    after_decision = candidate.decide(candidate_resolved, credential[0], device_id, moment)
+                decisions[key] = (resolved[0], before_decision, after_decision)
+            user_id, (before, before_reason), (after, after_reason) = decisions[key]
+
+            report['baseline']['granted' if before else 'denied'] += 1
+            report['candidate']['granted' if after else 'denied'] += 1
+            if before != recorded:
+                report['recorded_mismatch'] += 1
+            if before == after:
+                continue
+
+            change = 'newly_granted' if after else 'newly_denied'
+            report['changed'][change] += 1
+            report['transitions'][f"{before_reason} -> {after_reason}"] += 1
+            door = report['by_door'].setdefault(device_id, Counter())
+            door[change] += 1
+            if len(report['samples']) < sample_limit:
+                report['samples'].append({
+                    'time': timestamp,
+                    'human_time': time.ctime(timestamp),
+                    'device_id': device_id,
+                    'credential': f"{credential[0]}={credential[1]}",
+                    'user_id': user_id,
+                    'baseline': before_reason,
+                    'candidate': after_reason
+                })
+
+    elapsed = time.perf_counter() - started
+    by_door = sorted(report['by_door'].items(), key=lambda item: -sum(item[1].values()))[:REPLAY_TOP_DOORS]
+    return {
+        'events': report['events'],
+        'access_events': report['access_events'],
+        'seconds': round(elapsed, 3),
+        'events_per_second': round(report['access_events'] / elapsed, 1) if elapsed else None,
+        'baseline': dict(report['baseline']),
+        'candidate': dict(report['candidate']),
+        'recorded_mismatch': report['recorded_mismatch'],
+        'changed': {
+            'total': sum(report['changed'].values()),
+            'newly_granted': report['changed']['newly_granted'],
+            'newly_denied': report['changed']['newly_denied']
+        },
+        'transitions': dict(report['transitions'].most_common()),
+        'by_door': [{'device_id': device_id, **counts} for device_id, counts in by_door],
+        'samples': report['samples']
+    }
+
+def _parse_date(value):
+    return datetime.fromisoformat(value).timestamp()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Проверка журнала доступа FiroAccess на новой политике прав')
+    parser.add_argument('--changes', help='JSON файл со списком изменений')
+    parser.add_argument('--candidate-db', help='Копия базы FiroAccess с новой политикой')
+    parser.add_argument('--db', help='Текущая база (по умолчанию users_db.DB_NAME)')
+    parser.add_argument('--log-db', help='Журнал событий (по умолчанию ologger.LOG_DB)')
+    parser.add_argument('--days', type=float, default=30, help='Период от текущего момента, дней')
+    parser.add_argument('--since', type=_parse_date, help='Начало периода (ISO, локальное время)')
+    parser.add_argument('--until', type=_parse_date, help='Конец периода (ISO, локальное время)')
+    parser.add_argument('--samples', type=int, default=REPLAY_SAMPLE_LIMIT)
+    args = parser.parse_args(argv)
+
+    if not args.changes and not args.candidate_db:
+        parser.error('Нужен --changes или --candidate-db')
+
+    import ologger
+
+    baseline = PolicySnapshot(args.db)
+    if args.candidate_db:
+        candidate = PolicySnapshot(args.candidate_db)
+    else:
+        candidate = PolicySnapshot(args.db, baseline.credentials)
+    if args.changes:
+        with open(args.changes, encoding='utf-8') as f:
+            changes = json.load(f)
+        candidate.apply_changes(changes.get('changes', []) if isinstance(changes, dict) else changes)
+
+    since = args.since if args.since is not None else time.time() - args.days * 24 * 3600
+    events = read_access_events(args.log_db or ologger.LOG_DB, since, args.until)
+    print(json.dumps(replay(baseline, candidate, events, args.samples), ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+
+import metrics
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+try:
+    # Под eventlet профилирование уступает управление между снимками, а не останавливает сервер
+    from eventlet import sleep as _sleep
+except ImportError:
+    _sleep = time.sleep
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_SECONDS = 1.0
+MAX_PROFILE_SECONDS = 60
+MIN_INTERVAL = 0.001
+
+HTTP_REQUEST_SECONDS = metrics.histogram('firo_http_request_seconds', 'Время обработки HTTP запроса', ['endpoint', 'method'])
+FUNCTION_SECONDS = metrics.histogram('firo_function_seconds', 'Время выполнения профилируемых функций', ['function'])
+
+_profile_lock = threading.Lock()
+
+def profiled(function):
+    return metrics.timed(FUNCTION_SECONDS, f"{function.__module__}.{function.__name__}")(function)
+
+def function_summary():
+    summary = []
+    sources = ((FUNCTION_SECONDS, ''), (metrics.get_metric('firo_db_query_seconds'), 'users_db.'))
+    for histogram, prefix in sources:
+        if histogram is None:
+            continue
+        for (name,), child in list(histogram._children.items()):
+            if not child.count:
+                continue
+            name = prefix + name
+            summary.append({
+                'function': name,
+                'calls': child.count,
+                'total_seconds': round(child.sum, 6),
+                'avg_ms': round(child.sum / child.count * 1000, 3)
+            })
+    summary.sort(key=lambda item: item['total_seconds'], reverse=True)
+    return summary
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _GreenletTracker:
+    # Стеки приостановленных гринлетов eventlet не видны в sys._current_frames(): на время
+    # профилирования запоминаются все гринлеты, между которыми переключается поток
+    def __init__(self):
+        self.seen = weakref.WeakSet()
+        self.previous = None
+
+    def __enter__(self):
+        if greenlet is not None:
+            self.seen.update(obj for obj in gc.get_objects() if isinstance(obj, greenlet.greenlet) and obj)
+            self.previous = greenlet.settrace(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        if greenlet is not None:
+            greenlet.settrace(self.previous)
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            self.seen.update(args)
+        if self.previous is not None:
+            self.previous(event, args)
+
+    def frames(self):
+        if greenlet is None:
+            return
+        current = greenlet.getcurrent()
+        for glet in list(self.seen):
+            if glet is not current and glet.gr_frame is not None:
+                yield type(glet).__name__, glet.gr_frame
+
+def _stack(frame, root):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ';'.join(reversed(labels))
+
+def sample_stacks(seconds, interval=0.005):
+    seconds = min(max(float(seconds), 0.1), MAX_PROFILE_SECONDS)
+    interval = max(float(interval), MIN_INTERVAL)
+
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Профилирование уже выполняется")
+
+    try:
+        own_id = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+
+        with _GreenletTracker() as greenlets:
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    # В потоке профилировщика выполняется он сам, остальные гринлеты потока ниже
+                    if thread_id != own_id:
+                        stacks[_stack(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+                for name, frame in greenlets.frames():
+                    stacks[_stack(frame, name)] += 1
+
+                samples += 1
+                _sleep(interval)
+
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return '\n'.join(lines) + '\n', samples
+    finally:
+        _profile_lock.release()
+
+def init_app(app):
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g.profiler_started = time.perf_counter()
+
+    @app.after_request
+    def _record_timing(response):
+        started = getattr(g, 'profiler_started', None)
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(endpoint, request.method).observe(elapsed)
+        response.headers['Server-Timing'] = f"app;dur={elapsed * 1000:.1f}"
+
+        if elapsed > SLOW_REQUEST_SECONDS:
+            logger.warning(f"Медленный запрос {request.method} {request.path}: {elapsed:.3f} с")
+        return response
@@ -0,0 +1,136 @@
+import logging
+import threading
+from collections import deque
+
+import socketio
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# События для браузеров публикуются из любых потоков (MQTT, планировщик, сценарии),
+# а отправляются одной фоновой задачей Socket.IO-сервера
+EVENT_QUEUE_SIZE = 10000
+EVENT_FLUSH_INTERVAL = 0.05
+EVENT_BATCH_SIZE = 500
+# Очередь сообщений Socket.IO между процессами HTTP и обработчиками MQTT: None - один процесс,
+# redis://, amqp:// (kombu) или local:// - замена брокера в пределах процесса для тестов
+SOCKETIO_MESSAGE_QUEUE = None
+
+EVENTS_PUBLISHED = metrics.counter('firo_realtime_events_total', 'События Socket.IO, переданные в очередь отправки', ['event'])
+EVENTS_DROPPED = metrics.counter('firo_realtime_events_dropped_total', 'События Socket.IO, вытесненные из переполненной очереди')
+EVENTS_PENDING = metrics.gauge('firo_realtime_events_pending', 'События Socket.IO, ожидающие отправки')
+
+class EventBus:
+    def __init__(self, size=EVENT_QUEUE_SIZE):
+        # append и popleft у deque атомарны: производители не берут блокировок
+        # и не переключаются в цикл событий eventlet
+        self._queue = deque(maxlen=size)
+        self._server = None
+        self._running = False
+
+    def publish(self, event, data, room=None, namespace='/'):
+        if len(self._queue) == self._queue.maxlen:
+            EVENTS_DROPPED.inc()
+        self._queue.append((event, data, room, namespace))
+        EVENTS_PUBLISHED.labels(event).inc()
+
+    def pending(self):
+        return len(self._queue)
+
+    def drain(self, limit=EVENT_BATCH_SIZE):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.popleft())
+            except IndexError:
+                break
+        EVENTS_PENDING.set(len(self._queue))
+        return batch
+
+    def flush(self, server=None):
+        server = server or self._server
+        if server is None:
+            return 0
+        sent = 0
+        while True:
+            batch = self.drain()
+            for event, data, room, namespace in batch:
+                try:
+                    server.emit(event, data, to=room, namespace=namespace)
+                except Exception as e:
+                    logger.error(f"Ошибка отправки события {event}: {e}")
+            sent += len(batch)
+            if len(batch) < EVENT_BATCH_SIZE:
+                return sent
+            # Между пачками управление отдается обработчикам HTTP и Socket.IO
+            server.sleep(0)
+
+    def start(self, server):
+        # Вызывается из потока сервера: фоновая задача должна работать в его цикле событий
+        if self._running:
+            return
+        self._server = server
+        self._running = True
+        server.start_background_task(self._run)
+
+    def _run(self):
+        while self._running:
+            self._server.sleep(EVENT_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка очереди событий Socket.IO: {e}")
+
+    def stop(self):
+        self._running = False
+        self.flush()
+
+class LocalQueueManager(socketio.PubSubManager):
+    # Серверы Socket.IO одного процесса обмениваются событиями так же, как через брокер
+    name = 'local'
+    _subscribers = {}
+    _subscribers_lock = threading.Lock()
+
+    def _publish(self, data):
+        with self._subscribers_lock:
+            queues = list(self._subscribers.get(self.channel, ()))
+        for queue in queues:
+            queue.put(data)
+
+    def _listen(self):
+        queue = self.server.eio.create_queue()
+        with self._subscribers_lock:
+            self._subscribers.setdefault(self.channel, []).append(queue)
+        while True:
+            yield queue.get()
+
+def socketio_options(url=None, write_only=False):
+    url = url or SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalQueueManager(channel='flask-socketio', write_only=write_only)}
+    return {'message_queue': url}
+
+def connect_queue(url=None):
+    # Процесс без Socket.IO-сервера (обработчик MQTT) отправляет события через очередь сообщений
+    from flask_socketio import SocketIO
+    options = socketio_options(url, write_only=True)
+    if not options:
+        raise ValueError("Не задана очередь сообщений Socket.IO")
+    emitter = SocketIO()
+    emitter.init_app(None, async_mode='threading', **options)
+    bus.start(emitter)
+    return emitter
+
+bus = EventBus()
+
+def publish(event, data, room=None, namespace='/'):
+    bus.publish(event, data, room, namespace)
+
+def start(server):
+    bus.start(server)
+
+def stop():
+    bus.stop()
@@ -6,6 +6,8 @@ import logging
 from mqtt_client import get_mqtt_handler
 import subprocess
 import os
+from profiler import profiled
+import realtime
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -32,6 +34,7 @@ def setup_scenarios_db():
     connection.commit()
     connection.close()
 
+@profiled
 def get_scenarios():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -56,6 +59,7 @@ def get_scenarios():
     connection.close()
     return scenarios
 
+@profiled
 def add_scenario(name, description, trigger_type, trigger_value, action_type, action_value, enabled=True):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -68,6 +72,7 @@ def add_scenario(name, description, trigger_type, trigger_value, action_type, ac
     connection.commit()
     connection.close()
 
+@profiled
 def update_scenario(scenario_id, **kwargs):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -84,6 +89,7 @@ def update_scenario(scenario_id, **kwargs):
     connection.commit()
     connection.close()
 
+@profiled
 def delete_scenario(scenario_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -92,6 +98,7 @@ def delete_scenario(scenario_id):
     connection.commit()
     connection.close()
 
+@profiled
 def check_card_scenario(card_number, user_name):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -117,6 +124,7 @@ def check_card_scenario(card_number, user_name):
     
     return len(rows) > 0
 
+@profiled
 def execute_scenario_action(scenario, context_data):
     try:
         logger.info(f"START SCENARIO {scenario['name']}")
@@ -145,22 +153,20 @@ def execute_scenario_action(scenario, context_data):
                 logger.info(f"Door opened {action_value}")
                 
         elif action_type == 'send_notification':
-            try:
-                from web_Server import socketio
-                message = action_value
-                socketio.emit('scenario_notification', {
-                    'message': message,
-                    'timestamp': datetime.now().isoformat()
-                })
-                logger.info(f"Notification sent {message}")
-            except:
-                logger.error("SocketIO error")
+            # Сценарии выполняются в потоке MQTT: событие уходит через очередь веб-сервера
+            message = action_value
+            realtime.publish('scenario_notification', {
+                'message': message,
+                'timestamp': datetime.now().isoformat()
+            })
+            logger.info(f"Notification queued {message}")
         
         logger.info(f"END SCENARIO {scenario['name']}")
         
     except Exception as e:
         logger.error(f"Scenario error {str(e)}")
 
+@profiled
 def check_door_trigger(device_id, event_type):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -1,47 +1,37 @@
 import threading
 import time
-from datetime import datetime, timedelta
-import sqlite3
+from datetime import datetime
 from mqtt_client import get_mqtt_handler
 import logging
-
-from pathlib import Path
+import metrics
+import schedules
 
 logger = logging.getLogger(__name__)
-current_file = Path(__file__)
-parent_dir = current_file.parent.parent
-target_file = parent_dir / 'firo_access.db'
-DB_NAME = target_file
+
+# В cluster.py расписания применяет только один процесс HTTP, иначе команды дверям дублируются
+SCHEDULER_ENABLED = True
+
+SCHEDULER_LAG = metrics.gauge('firo_scheduler_lag_seconds', 'Отставание цикла планировщика от расчетного времени')
+SCHEDULER_CHECK_SECONDS = metrics.histogram('firo_scheduler_check_seconds', 'Время проверки расписаний')
+SCHEDULER_ACTIVE = metrics.gauge('firo_scheduler_active_schedules', 'Количество активных расписаний')
+
 class DoorScheduleScheduler:
     def __init__(self):
         self.mqtt = get_mqtt_handler()
         self.active_schedules = {}
         self.running = True
         self.check_interval = 60
+        SCHEDULER_ACTIVE.set_function(lambda: len(self.active_schedules))
         
     def check_and_apply_schedules(self):
         try:
-            connection = sqlite3.connect(DB_NAME)
-            cursor = connection.cursor()
-            
             current_utc = datetime.utcnow()
-            current_time = current_utc.strftime('%H:%M')
-            current_weekday = current_utc.weekday()
+            door_hours = schedules.get_door_hours_map()
             
-            cursor.execute('SELECT DISTINCT door_id FROM DoorAccessSchedules WHERE is_active = 1')
-            doors = cursor.fetchall()
-            
-            for (door_id,) in doors:
-                cursor.execute('''
-                SELECT id, schedule_name, start_time_utc, end_time_utc, weekdays
-                FROM DoorAccessSchedules 
-                WHERE door_id = ? 
-                AND is_active = 1
-                AND ? BETWEEN start_time_utc AND end_time_utc
-                AND substr(weekdays, ?, 1) = '1'
-                ''', (door_id, current_time, current_weekday + 1))
-                
-                active_schedule = cursor.fetchone()
+            for door_id in set(door_hours) | set(self.active_schedules):
+                active_schedule = next(
+                    (entry for entry in door_hours.get(door_id, ()) if entry[0].allows(current_utc)), None
+                )
                 
                 if active_schedule:
                     if door_id not in self.active_schedules:
@@ -52,8 +42,6 @@ class DoorScheduleScheduler:
                         logger.info(f"Расписание деактивировано для {door_id}")
                         self.deactivate_schedule_for_door(door_id)
             
-            connection.close()
-            
         except Exception as e:
             logger.error(f"Ошибка проверки расписаний: {str(e)}")
     
@@ -63,28 +51,23 @@ class DoorScheduleScheduler:
                 self.mqtt.open_door_sh(door_id)
                 logger.info(f"open_door_sh для {door_id}")
             
-            end_time_str = schedule[3]
-            current_date = datetime.utcnow().date()
-            
-            end_hour, end_minute = map(int, end_time_str.split(':'))
-            end_datetime = datetime(current_date.year, current_date.month, current_date.day,
-                                   end_hour, end_minute)
-            
-            if end_datetime < datetime.utcnow():
-                end_datetime += timedelta(days=1)
+            # Окончание берется из скомпилированного расписания, в том числе для окон через полночь
+            end_datetime = schedule[0].next_change(datetime.utcnow())
             
-            thread = threading.Timer(
-                (end_datetime - datetime.utcnow()).total_seconds(),
-                self.schedule_end_callback,
-                args=[door_id]
-            )
-            thread.daemon = True
-            thread.start()
+            thread = None
+            if end_datetime:
+                thread = threading.Timer(
+                    (end_datetime - datetime.utcnow()).total_seconds(),
+                    self.schedule_end_callback,
+                    args=[door_id]
+                )
+                thread.daemon = True
+                thread.start()
             
             self.active_schedules[door_id] = {
                 'thread': thread,
                 'end_time': end_datetime,
-                'schedule_name': schedule[1]
+                'schedule_name': schedule[3]
             }
             
         except Exception as e:
@@ -97,8 +80,9 @@ class DoorScheduleScheduler:
                     self.mqtt.close_door_sh(door_id)
                     logger.info(f"close_door_sh для {door_id}")
                 
-                if self.active_schedules[door_id]['thread'].is_alive():
-                    self.active_schedules[door_id]['thread'].cancel()
+                thread = self.active_schedules[door_id]['thread']
+                if thread and thread.is_alive():
+                    thread.cancel()
                 
                 del self.active_schedules[door_id]
                 
@@ -111,12 +95,16 @@ class DoorScheduleScheduler:
     
     def start(self):
         def scheduler_loop():
+            expected = time.monotonic()
             while self.running:
+                SCHEDULER_LAG.set(max(0.0, time.monotonic() - expected))
                 try:
-                    self.check_and_apply_schedules()
+                    with SCHEDULER_CHECK_SECONDS.time():
+                        self.check_and_apply_schedules()
                 except Exception as e:
                     logger.error(f"Ошибка цикла планировщика: {str(e)}")
                 
+                expected = time.monotonic() + self.check_interval
                 time.sleep(self.check_interval)
         
         scheduler_thread = threading.Thread(target=scheduler_loop)
@@ -134,6 +122,9 @@ schedule_scheduler = None
 
 def start_schedule_scheduler():
     global schedule_scheduler
+    if not SCHEDULER_ENABLED:
+        logger.info("Планировщик расписаний работает в другом процессе")
+        return None
     if schedule_scheduler is None:
         schedule_scheduler = DoorScheduleScheduler()
         schedule_scheduler.start()
@@ -0,0 +1,436 @@
+import bisect
+import json
+import logging
+import threading
+import time
+import weakref
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import pytz
+
+import metrics
+from api_cache import get_data_version
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+SCHEDULE_CACHE_SIZE = 4096
+# Версии данных локальны для процесса: праздники и расписания дверей перечитываются и по времени
+HOLIDAYS_TTL = 60
+DOOR_HOURS_TTL = 30
+HOLIDAY_MODES = ('ignore', 'closed', 'open')
+DEFAULT_TIMEZONE = 'UTC'
+# Расписания в местном времени заранее переводятся в UTC на столько недель вперед
+TRANSITION_WEEKS = 8
+TRANSITION_REFRESH_INTERVAL = 3600
+
+TRANSITION_REFRESH_SECONDS = metrics.histogram('firo_schedule_transitions_refresh_seconds', 'Время пересчета таблиц переходов расписаний в UTC')
+TRANSITION_FALLBACKS = metrics.counter('firo_schedule_transitions_fallback_total', 'Проверки расписаний вне рассчитанной таблицы переходов')
+
+_EPOCH = datetime(1970, 1, 1)
+
+def parse_time(value):
+    try:
+        hours, minutes = str(value).strip().split(':')
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Неверный формат времени. Должно быть HH:MM, получено: {value}")
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        raise ValueError(f"Неверный формат времени. Должно быть HH:MM, получено: {value}")
+    return hours * 60 + minutes
+
+def normalize_weekdays(value):
+    # Строка из 7 символов с понедельника ('1111100') или список номеров дней (0 - понедельник)
+    if value is None:
+        return '1111111'
+    if isinstance(value, str):
+        if len(value) != 7 or set(value) - {'0', '1'}:
+            raise ValueError(f"Неверные дни недели: {value}")
+        return value
+    days = {int(day) for day in value}
+    if days - set(range(7)):
+        raise ValueError(f"Неверные дни недели: {value}")
+    return ''.join('1' if day in days else '0' for day in range(7))
+
+def _merge(spans):
+    # Интервалы [начало, конец) в плоский отсортированный список границ для bisect
+    bounds = []
+    for start, end in sorted(spans):
+        if bounds and start <= bounds[-1]:
+            bounds[-1] = max(bounds[-1], end)
+        else:
+            bounds.extend((start, end))
+    return bounds
+
+def _interval(item):
+    if not isinstance(item, dict):
+        raise ValueError(f"Неверный интервал расписания: {item}")
+    # Конечная минута входит в интервал, как и раньше при сравнении BETWEEN
+    return parse_time(item.get('start', '00:00')), parse_time(item.get('end', '23:59')) + 1
+
+def _week_spans(items):
+    spans = []
+    for item in items:
+        start, end = _interval(item)
+        weekdays = normalize_weekdays(item.get('days'))
+        for day in range(7):
+            if weekdays[day] != '1':
+                continue
+            offset = day * MINUTES_PER_DAY
+            # Окно через полночь (22:00-06:00) продолжается в следующие сутки
+            finish = offset + end if end > start else offset + MINUTES_PER_DAY + end
+            if finish > MINUTES_PER_WEEK:
+                spans.append((offset + start, MINUTES_PER_WEEK))
+                spans.append((0, finish - MINUTES_PER_WEEK))
+            else:
+                spans.append((offset + start, finish))
+    return spans
+
+def _day_bounds(items):
+    spans = []
+    for item in items:
+        start, end = _interval(item)
+        # Исключения задаются в пределах даты: окно через полночь обрезается
+        spans.append((start, end if end > start else MINUTES_PER_DAY))
+    return _merge(spans)
+
+class CompiledSchedule:
+    __slots__ = ('always', 'week', 'holidays', 'exceptions')
+
+    def __init__(self, always=False, week=(), holidays=None, exceptions=None):
+        self.always = always
+        self.week = list(week)
+        self.holidays = holidays
+        self.exceptions = exceptions or {}
+
+    def _bounds(self, moment):
+        # Границы для даты момента: исключение, праздник или недельное расписание
+        if self.exceptions or self.holidays is not None:
+            day = moment.date()
+            override = self.exceptions.get(day.isoformat())
+            if override is None and self.holidays is not None and day in get_holidays():
+                override = self.holidays
+            if override is not None:
+                return override, moment.hour * 60 + moment.minute, MINUTES_PER_DAY
+        return self.week, moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute, MINUTES_PER_WEEK
+
+    def allows(self, moment):
+        if self.always:
+            return True
+        bounds, minute, _ = self._bounds(moment)
+        return bisect.bisect_right(bounds, minute) % 2 == 1
+
+    def next_change(self, moment):
+        # Ближайший момент смены состояния; None - расписание не меняется
+        if self.always:
+            return None
+        bounds, minute, period = self._bounds(moment)
+        if not bounds or bounds == [0, period]:
+            if period == MINUTES_PER_WEEK:
+                return None
+            delta = period - minute
+        else:
+            index = bisect.bisect_right(bounds, minute)
+            if index < len(bounds):
+                delta = bounds[index] - minute
+                # Интервал, переходящий через конец недели, продолжается с начала следующей
+                if bounds[index] == period and bounds[0] == 0 and period == MINUTES_PER_WEEK:
+                    delta = bounds[1] + period - minute
+            elif period == MINUTES_PER_WEEK:
+                delta = bounds[0] + period - minute
+            else:
+                delta = period - minute
+        return moment.replace(second=0, microsecond=0) + timedelta(minutes=delta)
+
+    def day_bounds(self, day):
+        # Интервалы местной даты в минутах от ее начала, включая продолжение ночного окна
+        if self.always:
+            return [0, MINUTES_PER_DAY]
+        override = self.exceptions.get(day.isoformat())
+        if override is None and self.holidays is not None and day in get_holidays():
+            override = self.holidays
+        if override is not None:
+            return override
+        offset = day.weekday() * MINUTES_PER_DAY
+        bounds = []
+        index = bisect.bisect_right(self.week, offset)
+        if index % 2 == 1:
+            bounds.append(0)
+        for bound in self.week[index:]:
+            if bound >= offset + MINUTES_PER_DAY:
+                break
+            bounds.append(bound - offset)
+        if len(bounds) % 2 == 1:
+            bounds.append(MINUTES_PER_DAY)
+        return bounds
+
+ALWAYS = CompiledSchedule(always=True)
+NEVER = CompiledSchedule()
+
+def get_timezone(name):
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Неизвестный часовой пояс: {name}")
+
+def _epoch_minute(moment):
+    return int((moment - _EPOCH).total_seconds()) // 60
+
+class LocalSchedule:
+    # Расписание в местном времени: границы интервалов на TRANSITION_WEEKS вперед заранее
+    # переведены в минуты UTC, поэтому проверка - тот же двоичный поиск без расчетов часового пояса
+    __slots__ = ('local', 'timezone', '_table', '_holidays_used', '__weakref__')
+
+    def __init__(self, local, timezone):
+        self.local = local
+        self.timezone = timezone
+        self._table = ([], 0, 0)
+        self._holidays_used = None
+        self.rebuild()
+        _local_schedules.add(self)
+
+    def rebuild(self, now=None):
+        now = now or datetime.utcnow()
+        self._holidays_used = get_holidays() if self.local.holidays is not None else None
+        first = pytz.utc.localize(now).astimezone(self.timezone).date() - timedelta(days=1)
+        days = TRANSITION_WEEKS * 7 + 2
+
+        spans = []
+        for offset in range(days):
+            day = first + timedelta(days=offset)
+            bounds = self.local.day_bounds(day)
+            start_of_day = datetime(day.year, day.month, day.day)
+            for index in range(0, len(bounds), 2):
+                spans.append((
+                    self._utc_minute(start_of_day, bounds[index]),
+                    self._utc_minute(start_of_day, bounds[index + 1], first=False)
+                ))
+
+        valid_from = self._utc_minute(datetime(first.year, first.month, first.day), 0)
+        last = first + timedelta(days=days)
+        valid_until = self._utc_minute(datetime(last.year, last.month, last.day), 0)
+        self._table = (_merge(spans), valid_from, valid_until)
+
+    def _to_utc(self, local, first=True):
+        # Несуществующее при переводе часов время сдвигается вперед. Из повторяющегося часа
+        # начало интервала берется по первому проходу, конец - по второму, чтобы интервал
+        # покрывал все моменты, когда на часах его время
+        try:
+            aware = self.timezone.localize(local, is_dst=None)
+        except pytz.NonExistentTimeError:
+            aware = self.timezone.localize(local, is_dst=False)
+        except pytz.AmbiguousTimeError:
+            aware = self.timezone.localize(local, is_dst=first)
+        return aware.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def _utc_minute(self, start_of_day, minute, first=True):
+        return _epoch_minute(self._to_utc(start_of_day + timedelta(minutes=minute), first))
+
+    def _current_table(self):
+        if self._holidays_used is not None:
+            holidays = get_holidays()
+            if holidays is not self._holidays_used and holidays != self._holidays_used:
+                self.rebuild()
+            else:
+                self._holidays_used = holidays
+        return self._table
+
+    def allows(self, moment):
+        bounds, valid_from, valid_until = self._current_table()
+        minute = _epoch_minute(moment)
+        if valid_from <= minute < valid_until:
+            return bisect.bisect_right(bounds, minute) % 2 == 1
+        # Вне таблицы (журнал прошлых событий) время переводится в местное напрямую
+        TRANSITION_FALLBACKS.inc()
+        return self.local.allows(pytz.utc.localize(moment).astimezone(self.timezone).replace(tzinfo=None))
+
+    def next_change(self, moment):
+        bounds, valid_from, valid_until = self._current_table()
+        minute = _epoch_minute(moment)
+        if not valid_from <= minute < valid_until:
+            TRANSITION_FALLBACKS.inc()
+            local = self.local.next_change(pytz.utc.localize(moment).astimezone(self.timezone).replace(tzinfo=None))
+            if local is None:
+                return None
+            return self._to_utc(local)
+        index = bisect.bisect_right(bounds, minute)
+        if index < len(bounds):
+            return _EPOCH + timedelta(minutes=bounds[index])
+        # Изменений в пределах таблицы нет: повторная проверка после ее окончания
+        return None if self.local.always or not bounds else _EPOCH + timedelta(minutes=valid_until)
+
+    def transitions(self, moment=None, limit=20):
+        bounds, _, _ = self._current_table()
+        minute = _epoch_minute(moment or datetime.utcnow())
+        index = bisect.bisect_right(bounds, minute)
+        return [
+            {'time': (_EPOCH + timedelta(minutes=bound)).isoformat() + 'Z', 'open': (index + offset) % 2 == 0}
+            for offset, bound in enumerate(bounds[index:index + limit])
+        ]
+
+_local_schedules = weakref.WeakSet()
+
+def _localize(compiled, timezone_name):
+    timezone = get_timezone(timezone_name)
+    if compiled.always or timezone.zone == 'UTC':
+        return compiled
+    return LocalSchedule(compiled, timezone)
+
+def refresh_transitions():
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    schedules = list(_local_schedules)
+    for schedule in schedules:
+        schedule.rebuild(now)
+    TRANSITION_REFRESH_SECONDS.observe(time.perf_counter() - started)
+    return len(schedules)
+
+_refresh_stop = threading.Event()
+_refresh_thread = None
+
+def start_transition_refresh():
+    global _refresh_thread
+    if _refresh_thread is not None:
+        return
+
+    def refresh_loop():
+        while not _refresh_stop.wait(TRANSITION_REFRESH_INTERVAL):
+            try:
+                count = refresh_transitions()
+                logger.info(f"Таблицы переходов расписаний пересчитаны: {count}")
+            except Exception as e:
+                logger.error(f"Ошибка пересчета таблиц переходов расписаний: {e}")
+
+    _refresh_stop.clear()
+    _refresh_thread = threading.Thread(target=refresh_loop, name='schedule-transitions', daemon=True)
+    _refresh_thread.start()
+
+def stop_transition_refresh():
+    global _refresh_thread
+    _refresh_stop.set()
+    _refresh_thread = None
+
+def _is_true(value):
+    return (isinstance(value, bool) and value) or (isinstance(value, str) and value.lower() == 'true')
+
+def build_schedule(schedule):
+    # {} и {"always": true} - всегда; {"time_range": {...}} - ежедневно; {"intervals": [...]} с
+    # "days", а также "holidays" ("closed", "open" или интервалы), "exceptions" по датам и "timezone"
+    if not schedule:
+        return ALWAYS
+    if not isinstance(schedule, dict):
+        raise ValueError(f"Неверный формат расписания: {schedule}")
+    if _is_true(schedule.get('always')):
+        return ALWAYS
+
+    items = []
+    if 'time_range' in schedule:
+        items.append(dict(schedule['time_range'], days='1111111'))
+    items.extend(schedule.get('intervals', []))
+
+    holidays = schedule.get('holidays', 'ignore')
+    if holidays == 'ignore':
+        holiday_bounds = None
+    elif holidays == 'closed':
+        holiday_bounds = []
+    elif holidays == 'open':
+        holiday_bounds = [0, MINUTES_PER_DAY]
+    elif isinstance(holidays, list):
+        holiday_bounds = _day_bounds(holidays)
+    else:
+        raise ValueError(f"Неверный режим праздников: {holidays}")
+
+    exceptions = {}
+    for day, day_items in (schedule.get('exceptions') or {}).items():
+        exceptions[_parse_date(day)] = _day_bounds(day_items or [])
+
+    compiled = CompiledSchedule(False, _merge(_week_spans(items)), holiday_bounds, exceptions)
+    return _localize(compiled, schedule.get('timezone'))
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ValueError(f"Неверная дата: {value}")
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _compile_text(text):
+    try:
+        schedule = json.loads(text) if text else {}
+    except (TypeError, ValueError):
+        schedule = {}
+    try:
+        return build_schedule(schedule)
+    except (TypeError, ValueError) as e:
+        # Сохраненное некорректное расписание не дает доступа, как и раньше
+        logger.warning(f"Некорректное расписание {text}: {e}")
+        return NEVER
+
+def compile_schedule(schedule):
+    if isinstance(schedule, (CompiledSchedule, LocalSchedule)):
+        return schedule
+    if schedule is None or isinstance(schedule, str):
+        return _compile_text(schedule or '')
+    return build_schedule(schedule)
+
+def validate_schedule(schedule):
+    if isinstance(schedule, str):
+        try:
+            schedule = json.loads(schedule) if schedule.strip() else {}
+        except ValueError:
+            raise ValueError("Расписание должно быть в формате JSON")
+    try:
+        build_schedule(schedule)
+    except (AttributeError, TypeError) as e:
+        raise ValueError(f"Неверный формат расписания: {e}")
+    return schedule
+
+def compile_door_hours(start, end, weekdays, holidays='ignore', timezone=DEFAULT_TIMEZONE):
+    schedule = {'intervals': [{'start': start, 'end': end, 'days': weekdays or '1111111'}]}
+    if holidays and holidays != 'ignore':
+        schedule['holidays'] = holidays
+    if timezone and timezone != DEFAULT_TIMEZONE:
+        schedule['timezone'] = timezone
+    return compile_schedule(json.dumps(schedule, sort_keys=True))
+
+_holidays = frozenset()
+_holidays_version = None
+_holidays_loaded = 0.0
+_door_hours = {}
+_door_hours_version = None
+_door_hours_loaded = 0.0
+# Раздельные блокировки: сборка расписаний дверей в местном времени читает праздники
+_holidays_lock = threading.Lock()
+_door_hours_lock = threading.Lock()
+
+def get_holidays():
+    global _holidays, _holidays_version, _holidays_loaded
+    version = get_data_version('holidays')
+    if _holidays_version != version or time.monotonic() - _holidays_loaded > HOLIDAYS_TTL:
+        with _holidays_lock:
+            if _holidays_version != version or time.monotonic() - _holidays_loaded > HOLIDAYS_TTL:
+                from users_db import get_holiday_dates
+                _holidays = frozenset(date.fromisoformat(day) for day in get_holiday_dates())
+                _holidays_version, _holidays_loaded = version, time.monotonic()
+    return _holidays
+
+def get_door_hours_map():
+    # {door_id: [(расписание, access_type, id, название)]} активных расписаний дверей
+    global _door_hours, _door_hours_version, _door_hours_loaded
+    version = get_data_version('schedules')
+    if _door_hours_version != version or time.monotonic() - _door_hours_loaded > DOOR_HOURS_TTL:
+        with _door_hours_lock:
+            if _door_hours_version != version or time.monotonic() - _door_hours_loaded > DOOR_HOURS_TTL:
+                from users_db import get_active_door_schedules
+                door_hours = {}
+                for schedule_id, door_id, name, start, end, weekdays, access_type, holidays, tz_name in get_active_door_schedules():
+                    door_hours.setdefault(door_id, []).append(
+                        (compile_door_hours(start, end, weekdays, holidays, tz_name), access_type, schedule_id, name)
+                    )
+                _door_hours, _door_hours_version, _door_hours_loaded = door_hours, version, time.monotonic()
+    return _door_hours
+
+def get_door_hours(door_id):
+    return get_door_hours_map().get(door_id, ())
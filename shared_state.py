@@ -0,0 +1,238 @@
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+STATE_STORE_URL = 'memory://'
+REDIS_PREFIX = 'firo:state:'
+
+_store = None
+_store_lock = threading.Lock()
+
+class LocalStateStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).get(key)
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = json.loads(json.dumps(value))
+
+    def delete(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, None) is not None
+
+    def items(self, namespace):
+        with self._lock:
+            return json.loads(json.dumps(self._data.get(namespace, {})))
+
+    def merge(self, namespace, key, values):
+        with self._lock:
+            current = self._data.setdefault(namespace, {}).get(key) or {}
+            current = dict(current, **json.loads(json.dumps(values)))
+            self._data[namespace][key] = current
+            return dict(current)
+
+    def update(self, namespace, key, func):
+        with self._lock:
+            current = self._data.get(namespace, {}).get(key)
+            value = func(json.loads(json.dumps(current)))
+            if value is None:
+                self._data.get(namespace, {}).pop(key, None)
+            else:
+                self._data.setdefault(namespace, {})[key] = json.loads(json.dumps(value))
+            return value
+
+class SQLiteStateStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute('''
+        CREATE TABLE IF NOT EXISTS SharedState (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID
+        ''')
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace, key):
+        row = self._connection().execute(
+            'SELECT value FROM SharedState WHERE namespace = ? AND key = ?', (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value):
+        self._connection().execute(
+            'INSERT INTO SharedState (namespace, key, value) VALUES (?, ?, ?) '
+            'ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value',
+            (namespace, key, json.dumps(value, ensure_ascii=False))
+        )
+
+    def delete(self, namespace, key):
+        cursor = self._connection().execute(
+            'DELETE FROM SharedState WHERE namespace = ? AND key = ?', (namespace, key)
+        )
+        return cursor.rowcount > 0
+
+    def items(self, namespace):
+        rows = self._connection().execute(
+            'SELECT key, value FROM SharedState WHERE namespace = ?', (namespace,)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def merge(self, namespace, key, values):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            current = self.get(namespace, key) or {}
+            current.update(values)
+            self.set(namespace, key, current)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return current
+
+    def update(self, namespace, key, func):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            value = func(self.get(namespace, key))
+            if value is None:
+                self.delete(namespace, key)
+            else:
+                self.set(namespace, key, value)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+class RedisStateStore:
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("Для redis:// хранилища требуется пакет redis")
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, namespace):
+        return f"{REDIS_PREFIX}{namespace}"
+
+    def get(self, namespace, key):
+        value = self.client.hget(self._key(namespace), key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, namespace, key, value):
+        self.client.hset(self._key(namespace), key, json.dumps(value, ensure_ascii=False))
+
+    def delete(self, namespace, key):
+        return bool(self.client.hdel(self._key(namespace), key))
+
+    def items(self, namespace):
+        return {key.decode('utf-8'): json.loads(value) for key, value in self.client.hgetall(self._key(namespace)).items()}
+
+    def merge(self, namespace, key, values):
+        hash_key = self._key(namespace)
+        result = {}
+
+        def update(pipe):
+            value = pipe.hget(hash_key, key)
+            current = json.loads(value) if value is not None else {}
+            current.update(values)
+            pipe.multi()
+            pipe.hset(hash_key, key, json.dumps(current, ensure_ascii=False))
+            result.update(current)
+
+        self.client.transaction(update, hash_key)
+        return result
+
+    def update(self, namespace, key, func):
+        # func может быть вызвана повторно, если ключ изменился во время транзакции
+        hash_key = self._key(namespace)
+
+        def update(pipe):
+            value = pipe.hget(hash_key, key)
+            value = func(json.loads(value) if value is not None else None)
+            pipe.multi()
+            if value is None:
+                pipe.hdel(hash_key, key)
+            else:
+                pipe.hset(hash_key, key, json.dumps(value, ensure_ascii=False))
+            return value
+
+        return self.client.transaction(update, hash_key, value_from_callable=True)
+
+def create_store(url):
+    if url.startswith('memory://'):
+        return LocalStateStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStateStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStateStore(url)
+    raise ValueError(f"Неизвестное хранилище состояния: {url}")
+
+def configure(url):
+    global _store
+    with _store_lock:
+        _store = create_store(url)
+    return _store
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store(STATE_STORE_URL)
+    return _store
+
+class SharedDict(MutableMapping):
+    def __init__(self, namespace, defaults=None):
+        self.namespace = namespace
+        self.defaults = dict(defaults or {})
+
+    def __getitem__(self, key):
+        value = get_store().get(self.namespace, key)
+        if value is None:
+            if key in self.defaults:
+                return self.defaults[key]
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        get_store().set(self.namespace, key, value)
+
+    def __delitem__(self, key):
+        if not get_store().delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.snapshot())
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def snapshot(self):
+        return dict(self.defaults, **get_store().items(self.namespace))
+
+    def merge(self, key, values):
+        return get_store().merge(self.namespace, key, values)
@@ -0,0 +1,216 @@
+// Загрузка устройств
+function loadDevices() {
+    fetch('/api/devices')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                document.getElementById('device-count').textContent = data.count;
+
+                const container = document.getElementById('devices-container');
+                container.innerHTML = '';
+
+                if (data.count === 0) {
+                    container.innerHTML = '<p class="text-center">Нет подключенных устройств</p>';
+                    return;
+                }
+
+                let html = '<div class="list-group">';
+                for (const [deviceId, deviceInfo] of Object.entries(data.devices)) {
+                    const isOnline = deviceInfo.status === 'online';
+                    html += `
+                        <div class="list-group-item">
+                            <div class="d-flex justify-content-between align-items-center">
+                                <div>
+                                    <h6 class="mb-1">
+                                        <i class="fas fa-door-closed"></i> ${deviceId}
+                                        <span class="badge ${isOnline ? 'bg-success' : 'bg-danger'}">
+                                            ${isOnline ? 'Онлайн' : 'Офлайн'}
+                                        </span>
+                                    </h6>
+                                    <small class="text-muted">
+                                        IP: ${deviceInfo.ip || 'Неизвестно'} | 
+                                        Последний контакт: ${new Date(deviceInfo.last_seen).toLocaleString()}
+                                    </small>
+                                </div>
+                                <div>
+                                    <button class="btn btn-sm btn-success" onclick="openDoor('${deviceId}')" ${!isOnline ? 'disabled' : ''}>
+                                        <i class="fas fa-door-open"></i>
+                                    </button>
+                                    <button class="btn btn-sm btn-danger" onclick="closeDoor('${deviceId}')" ${!isOnline ? 'disabled' : ''}>
+                                        <i class="fas fa-door-closed"></i>
+                                    </button>
+                                </div>
+                            </div>
+                        </div>
+                    `;
+                }
+                html += '</div>';
+                container.innerHTML = html;
+            }
+        });
+}
+
+// Функции управления
+function openDoor(deviceId) {
+    fetch('/api/open_door', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({device_id: deviceId})
+    })
+    .then(response => response.json())
+    .then(data => {
+        alert(data.message);
+    });
+}
+
+function closeDoor(deviceId) {
+    fetch('/api/close_door', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({device_id: deviceId})
+    })
+    .then(response => response.json())
+    .then(data => {
+        alert(data.message);
+    });
+}
+
+function openAllDoors() {
+    if (confirm('Открыть все двери?')) {
+        fetch('/api/devices')
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    for (const deviceId in data.devices) {
+                        if (data.devices[deviceId].status === 'online') {
+                            openDoor(deviceId);
+                        }
+                    }
+                }
+            });
+    }
+}
+
+function closeAllDoors() {
+    if (confirm('Закрыть все двери?')) {
+        fetch('/api/devices')
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    for (const deviceId in data.devices) {
+                        if (data.devices[deviceId].status === 'online') {
+                            closeDoor(deviceId);
+                        }
+                    }
+                }
+            });
+    }
+}
+
+function activateEvacuation() {
+    if (confirm('АКТИВИРОВАТЬ РЕЖИМ ЭВАКУАЦИИ?\nВсе двери будут открыты.')) {
+        const password = prompt('Введите пароль для подтверждения:');
+        if (password) {
+            fetch('/api/emergency/evacuation', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    confirm: true,
+                    password: password
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert(data.message);
+                location.reload();
+            });
+        }
+    }
+}
+
+function activateLockdown() {
+    if (confirm('АКТИВИРОВАТЬ РЕЖИМ ЛОКДАУНА?\nВсе двери будут заблокированы.')) {
+        const password = prompt('Введите пароль для подтверждения:');
+        if (password) {
+            fetch('/api/emergency/lockdown', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    confirm: true,
+                    password: password
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert(data.message);
+                location.reload();
+            });
+        }
+    }
+}
+
+// Присутствие в зонах для переклички при эвакуации
+let rollCallZone = null;
+
+function loadOccupancy() {
+    fetch('/api/occupancy')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+
+            document.getElementById('occupancy-total').textContent = data.occupancy.total;
+            const container = document.getElementById('occupancy-zones');
+            const zones = Object.entries(data.occupancy.zones);
+
+            if (zones.length === 0) {
+                container.innerHTML = '<p class="text-center">В зонах никого нет</p>';
+                return;
+            }
+
+            container.innerHTML = zones.map(([zone, count]) => `
+                <div class="col-md-3 mb-2">
+                    <button class="btn btn-outline-dark w-100 ${zone === rollCallZone ? 'active' : ''}" onclick="showRollCall('${zone}')">
+                        <i class="fas fa-map-marker-alt"></i> ${zone}
+                        <span class="badge bg-warning text-dark">${count}</span>
+                    </button>
+                </div>
+            `).join('');
+
+            if (rollCallZone) showRollCall(rollCallZone);
+        });
+}
+
+function showRollCall(zone) {
+    rollCallZone = zone;
+    fetch(`/api/occupancy/roll_call?zone=${encodeURIComponent(zone)}`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+
+            const rows = data.people.map(person => `
+                <tr>
+                    <td>${person.name || person.user_id}</td>
+                    <td>${person.user_id}</td>
+                    <td>${person.device_id}</td>
+                    <td>${new Date(person.entered_at * 1000).toLocaleString()}</td>
+                </tr>
+            `).join('');
+
+            document.getElementById('roll-call').innerHTML = `
+                <h6>Зона ${zone}: ${data.count}</h6>
+                <table class="table table-sm">
+                    <thead><tr><th>Имя</th><th>ID</th><th>Вход через</th><th>Время</th></tr></thead>
+                    <tbody>${rows}</tbody>
+                </table>
+            `;
+        });
+}
+
+// Инициализация
+document.addEventListener('DOMContentLoaded', function() {
+    loadDevices();
+    loadOccupancy();
+    // Обновлять каждые 10 секунд
+    setInterval(loadDevices, 10000);
+    setInterval(loadOccupancy, 5000);
+});
@@ -0,0 +1,624 @@
+// Автоматически определяем часовой пояс браузера при загрузке страницы
+document.addEventListener('DOMContentLoaded', function () {
+    const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    document.getElementById('user-timezone').value = timezone;
+    console.log('Определен часовой пояс:', timezone);
+});
+
+let doors = [];
+let groups = [];
+let users = [];
+let permissions = [];
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[ch]);
+}
+
+// Показать вкладку
+function showTab(tabId) {
+    // Скрыть все вкладки
+    document.querySelectorAll('.tab-content').forEach(tab => {
+        tab.classList.remove('active');
+    });
+
+    // Показать выбранную вкладку
+    document.getElementById(tabId).classList.add('active');
+
+    // Обновить активную кнопку вкладки
+    document.querySelectorAll('.tab').forEach(btn => {
+        btn.classList.remove('active');
+    });
+    event.target.classList.add('active');
+
+    // Загрузить данные для вкладки
+    if (tabId === 'doors-tab') {
+        loadDoors();
+    } else if (tabId === 'permissions-tab') {
+        loadPermissions();
+    } else if (tabId === 'test-tab') {
+        loadTestData();
+    }
+}
+
+// Загрузить список дверей
+async function loadDoors() {
+    try {
+        const response = await fetch('/api/doors');
+        const data = await response.json();
+
+        if (data.success) {
+            doors = data.doors;
+            renderDoorsTable();
+        } else {
+            showNotification('Ошибка загрузки дверей: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка загрузки дверей', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Отрисовать таблицу дверей
+function renderDoorsTable() {
+    const tbody = document.getElementById('doors-list');
+
+    if (doors.length === 0) {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="7" class="text-center py-4">
+                    <i class="fas fa-door-closed fa-2x text-muted mb-3"></i>
+                    <p class="text-muted">Нет зарегистрированных дверей</p>
+                </td>
+            </tr>
+        `;
+        return;
+    }
+
+    let html = '';
+    doors.forEach(door => {
+        const lastSeen = door.last_seen ? new Date(door.last_seen).toLocaleString('ru-RU') : 'Никогда';
+        const isAuto = door.auto_created;
+        const statusClass = door.status === 'active' ? 'status-active' : 'status-inactive';
+        const autoClass = isAuto ? 'status-auto' : '';
+
+        html += `
+            <tr>
+                <td><strong>${door.device_id}</strong></td>
+                <td>${door.name}</td>
+                <td>${door.location || '-'}</td>
+                <td>
+                    <span class="status-badge ${statusClass}">${door.status === 'active' ? 'Активна' : 'Неактивна'}</span>
+                    ${isAuto ? '<span class="status-badge status-auto ml-1">Авто</span>' : ''}
+                </td>
+                <td>${lastSeen}</td>
+                <td>${isAuto ? 'Автоматическая' : 'Ручная'}</td>
+                <td>
+                    <button class="btn-action btn-edit" onclick="editDoor('${door.device_id}')" title="Редактировать">
+                        <i class="fas fa-edit"></i>
+                    </button>
+                    <button class="btn-action btn-permission" onclick="managePermissions('${door.device_id}')" title="Управление доступом">
+                        <i class="fas fa-key"></i>
+                    </button>
+                    <button class="btn-action btn-edit" onclick="showDoorUsers('${door.device_id}')" title="Кто может открыть">
+                        <i class="fas fa-users"></i>
+                    </button>
+                    ${isAuto ? `
+                        <button class="btn-action btn-delete" onclick="deleteDoor('${door.device_id}')" title="Удалить">
+                            <i class="fas fa-trash"></i>
+                        </button>
+                    ` : ''}
+                </td>
+            </tr>
+        `;
+    });
+
+    tbody.innerHTML = html;
+}
+
+// Загрузить разрешения
+async function loadPermissions() {
+    try {
+        const response = await fetch('/api/door/permissions');
+        const data = await response.json();
+
+        if (data.success) {
+            permissions = data.permissions;
+            renderPermissionsTable();
+        } else {
+            showNotification('Ошибка загрузки разрешений: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка загрузки разрешений', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Отрисовать таблицу разрешений
+function renderPermissionsTable() {
+    const tbody = document.getElementById('permissions-list');
+
+    if (permissions.length === 0) {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="6" class="text-center py-4">
+                    <i class="fas fa-key fa-2x text-muted mb-3"></i>
+                    <p class="text-muted">Нет настроенных разрешений</p>
+                </td>
+            </tr>
+        `;
+        return;
+    }
+
+    let html = '';
+    permissions.forEach(perm => {
+        const createdDate = new Date(perm.created_at).toLocaleString('ru-RU');
+        const typeClass = perm.permission_type === 'allow' ? 'status-active' : 'status-inactive';
+
+        html += `
+            <tr>
+                <td><strong>${perm.group_name}</strong><br><small>${perm.group_id}</small></td>
+                <td>${perm.door_name}<br><small>${perm.device_id}</small></td>
+                <td><span class="status-badge ${typeClass}">${perm.permission_type === 'allow' ? 'Разрешить' : 'Запретить'}</span></td>
+                <td><small>${JSON.stringify(perm.schedule)}</small></td>
+                <td>${createdDate}</td>
+                <td>
+                    <button class="btn-action btn-delete" onclick="deletePermission(${perm.id})" title="Удалить">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </td>
+            </tr>
+        `;
+    });
+
+    tbody.innerHTML = html;
+}
+
+// Поиск пользователей для тестирования (первые 50 совпадений)
+async function searchTestUsers(query) {
+    const params = new URLSearchParams({ limit: 50, fields: 'id,name' });
+    if (query) params.set('q', query);
+
+    const usersResponse = await fetch(`/api/users/directory?${params}`);
+    const usersData = await usersResponse.json();
+
+    if (usersData.success) {
+        users = usersData.users;
+        const userSelect = document.getElementById('test-user');
+        const options = ['<option value="">Выберите пользователя</option>'];
+        users.forEach(user => {
+            const option = document.createElement('option');
+            option.value = user.id;
+            option.textContent = `${user.name} (${user.id})`;
+            options.push(option.outerHTML);
+        });
+        userSelect.innerHTML = options.join('');
+    }
+}
+
+let testUserSearchTimer = null;
+document.addEventListener('DOMContentLoaded', () => {
+    document.getElementById('test-user-search').addEventListener('input', function () {
+        clearTimeout(testUserSearchTimer);
+        testUserSearchTimer = setTimeout(() => searchTestUsers(this.value.trim()), 250);
+    });
+});
+
+// Загрузить данные для тестирования
+async function loadTestData() {
+    try {
+        // Загрузить пользователей
+        await searchTestUsers('');
+
+        // Загрузить двери
+        const doorsResponse = await fetch('/api/doors');
+        const doorsData = await doorsResponse.json();
+
+        if (doorsData.success) {
+            const doorSelect = document.getElementById('test-door');
+            doorSelect.innerHTML = '<option value="">Выберите дверь</option>';
+            doorsData.doors.forEach(door => {
+                if (door.status === 'active') {
+                    doorSelect.innerHTML += `<option value="${door.device_id}">${door.name} (${door.device_id})</option>`;
+                }
+            });
+        }
+
+    } catch (error) {
+        showNotification('Ошибка загрузки тестовых данных', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Показать модальное окно добавления двери
+function showAddDoorModal() {
+    document.getElementById('door-modal-title').textContent = 'Добавить дверь';
+    document.getElementById('door-form').reset();
+    document.getElementById('door-modal').style.display = 'flex';
+}
+
+// Показать модальное окно редактирования двери
+async function editDoor(deviceId) {
+    try {
+        const response = await fetch(`/api/door/${deviceId}`);
+        const data = await response.json();
+
+        if (data.success) {
+            const door = data.door;
+            document.getElementById('door-modal-title').textContent = 'Редактировать дверь';
+            document.getElementById('door-device-id').value = door.device_id;
+            document.getElementById('door-device-id').readOnly = true;
+            document.getElementById('door-name').value = door.name;
+            document.getElementById('door-location').value = door.location || '';
+            document.getElementById('door-description').value = door.description || '';
+            document.getElementById('door-status').value = door.status;
+            document.getElementById('door-modal').style.display = 'flex';
+        } else {
+            showNotification('Ошибка загрузки данных двери', 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка загрузки данных двери', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Скрыть модальное окно двери
+function hideDoorModal() {
+    document.getElementById('door-modal').style.display = 'none';
+    document.getElementById('door-device-id').readOnly = false;
+}
+
+// Обработка формы двери
+document.getElementById('door-form').addEventListener('submit', async function (e) {
+    e.preventDefault();
+
+    const isEdit = document.getElementById('door-device-id').readOnly;
+    const deviceId = document.getElementById('door-device-id').value;
+
+    const doorData = {
+        device_id: deviceId,
+        name: document.getElementById('door-name').value,
+        location: document.getElementById('door-location').value,
+        description: document.getElementById('door-description').value,
+        status: document.getElementById('door-status').value
+    };
+
+    try {
+        let response;
+        if (isEdit) {
+            response = await fetch(`/api/door/${deviceId}`, {
+                method: 'PUT',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(doorData)
+            });
+        } else {
+            response = await fetch('/api/door', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(doorData)
+            });
+        }
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            hideDoorModal();
+            loadDoors();
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка сохранения двери', 'error');
+        console.error('Ошибка:', error);
+    }
+});
+
+// Удалить дверь
+async function deleteDoor(deviceId) {
+    if (!confirm(`Вы уверены, что хотите удалить дверь ${deviceId}? Все связанные разрешения также будут удалены.`)) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/door/${deviceId}`, {
+            method: 'DELETE'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            loadDoors();
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка удаления двери', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Показать модальное окно добавления разрешения
+async function showAddPermissionModal() {
+    // Загрузить группы
+    try {
+        const groupsResponse = await fetch('/api/groups');
+        const groupsData = await groupsResponse.json();
+
+        if (groupsData.success) {
+            groups = groupsData.groups;
+            const groupSelect = document.getElementById('permission-group');
+            groupSelect.innerHTML = '<option value="">Выберите группу</option>';
+            groups.forEach(group => {
+                if (group.status === 'active') {
+                    groupSelect.innerHTML += `<option value="${group.id}">${group.name} (${group.id})</option>`;
+                }
+            });
+        }
+
+        // Загрузить двери
+        const doorsResponse = await fetch('/api/doors');
+        const doorsData = await doorsResponse.json();
+
+        if (doorsData.success) {
+            const doorSelect = document.getElementById('permission-door');
+            doorSelect.innerHTML = '<option value="">Выберите дверь</option>';
+            doorsData.doors.forEach(door => {
+                if (door.status === 'active') {
+                    doorSelect.innerHTML += `<option value="${door.device_id}">${door.name} (${door.device_id})</option>`;
+                }
+            });
+        }
+
+        document.getElementById('permission-modal').style.display = 'flex';
+
+    } catch (error) {
+        showNotification('Ошибка загрузки данных для разрешения', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Скрыть модальное окно разрешения
+function hidePermissionModal() {
+    document.getElementById('permission-modal').style.display = 'none';
+}
+
+// Обработка формы разрешения
+document.getElementById('permission-form').addEventListener('submit', async function (e) {
+    e.preventDefault();
+
+    // Получаем значения из формы
+    const groupId = document.getElementById('permission-group').value;
+    const deviceId = document.getElementById('permission-door').value;
+    const permissionType = document.getElementById('permission-type').value;
+
+    // Получаем время расписания (если поля существуют)
+    let scheduleValue = document.getElementById('permission-schedule').value;
+
+    // Если есть поля для времени - используем их
+    const startTimeInput = document.getElementById('schedule-start');
+    const endTimeInput = document.getElementById('schedule-end');
+
+    if (startTimeInput && endTimeInput) {
+        const startTime = startTimeInput.value || '00:00';
+        const endTime = endTimeInput.value || '23:59';
+
+        // Создаем расписание с временным диапазоном
+        const schedule = {
+            time_range: {
+                start: startTime,
+                end: endTime
+            }
+        };
+        scheduleValue = JSON.stringify(schedule);
+    }
+
+    // Подготавливаем данные для отправки
+    const permissionData = {
+        group_id: groupId,
+        device_id: deviceId,
+        permission_type: permissionType,
+        schedule: scheduleValue
+    };
+
+    try {
+        // Сначала показать, кто получит или потеряет доступ
+        const preview = await fetch('/api/door/permission?dry_run=1&limit=0', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(permissionData)
+        }).then(response => response.json());
+
+        if (preview.success && !confirm(`Доступ получат: ${preview.impact.gained_users}, потеряют: ${preview.impact.lost_users}. Сохранить разрешение?`)) {
+            return;
+        }
+
+        const response = await fetch('/api/door/permission', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(permissionData)
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            hidePermissionModal();
+            loadPermissions();
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка сохранения разрешения', 'error');
+        console.error('Ошибка:', error);
+    }
+});
+
+// Удалить разрешение
+async function deletePermission(permissionId) {
+    let impact = '';
+    try {
+        const preview = await fetch(`/api/door/permission/${permissionId}?dry_run=1&limit=0`, {
+            method: 'DELETE'
+        }).then(response => response.json());
+        if (preview.success) {
+            impact = `\nДоступ потеряют: ${preview.impact.lost_users}, получат: ${preview.impact.gained_users}`;
+        }
+    } catch (error) {
+        console.error('Ошибка:', error);
+    }
+
+    if (!confirm('Вы уверены, что хотите удалить это разрешение?' + impact)) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/door/permission/${permissionId}`, {
+            method: 'DELETE'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            loadPermissions();
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка удаления разрешения', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Управление разрешениями для двери
+function managePermissions(deviceId) {
+    // Переключиться на вкладку разрешений и показать фильтр
+    showTab('permissions-tab');
+    // Можно добавить фильтрацию по deviceId
+}
+
+// Кто может открыть дверь (по правам групп, без учета расписаний)
+async function showDoorUsers(deviceId) {
+    try {
+        const response = await fetch(`/api/door/${encodeURIComponent(deviceId)}/users?limit=500`);
+        const data = await response.json();
+
+        if (!data.success) {
+            showNotification('Ошибка: ' + data.message, 'error');
+            return;
+        }
+
+        document.getElementById('door-users-title').textContent = `Кто может открыть ${deviceId}: ${data.count}`;
+        document.getElementById('door-users-list').innerHTML = data.users.length ? `
+            <ul class="list-unstyled">
+                ${data.users.map(user => `<li><strong>${escapeHtml(user.id)}</strong> ${escapeHtml(user.name)}</li>`).join('')}
+            </ul>
+            ${data.count > data.users.length ? `<p class="text-muted">Показаны первые ${data.users.length}</p>` : ''}
+        ` : '<p class="text-muted">Нет пользователей с доступом</p>';
+
+        document.getElementById('door-users-modal').style.display = 'flex';
+    } catch (error) {
+        showNotification('Ошибка загрузки пользователей', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+function hideDoorUsersModal() {
+    document.getElementById('door-users-modal').style.display = 'none';
+}
+
+// Тестирование доступа
+async function testAccess() {
+    const userId = document.getElementById('test-user').value;
+    const deviceId = document.getElementById('test-door').value;
+    const accessType = document.getElementById('test-access-type').value;
+
+    if (!userId || !deviceId) {
+        showNotification('Выберите пользователя и дверь', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/test/door/access', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                user_id: userId,
+                device_id: deviceId,
+                access_type: accessType
+            })
+        });
+
+        const data = await response.json();
+
+        const resultDiv = document.getElementById('test-result');
+        const contentDiv = document.getElementById('test-result-content');
+
+        if (data.success) {
+            resultDiv.style.display = 'block';
+            resultDiv.style.backgroundColor = '#e8f5e9';
+            contentDiv.innerHTML = `
+                <div class="alert alert-success">
+                    <i class="fas fa-check-circle"></i>
+                    <strong>Доступ РАЗРЕШЕН</strong><br>
+                    ${data.message}
+                    ${data.user ? `<br>Пользователь: ${data.user.name}` : ''}
+                </div>
+            `;
+        } else {
+            resultDiv.style.display = 'block';
+            resultDiv.style.backgroundColor = '#ffebee';
+            contentDiv.innerHTML = `
+                <div class="alert alert-danger">
+                    <i class="fas fa-times-circle"></i>
+                    <strong>Доступ ЗАПРЕЩЕН</strong><br>
+                    ${data.message}
+                </div>
+            `;
+        }
+    } catch (error) {
+        showNotification('Ошибка тестирования доступа', 'error');
+        console.error('Ошибка:', error);
+    }
+}
+
+// Показать уведомление
+function showNotification(message, type = 'info') {
+    const container = document.getElementById('notifications-container');
+    const notification = document.createElement('div');
+    notification.className = `notification notification-${type}`;
+
+    const icon = type === 'success' ? 'fa-check-circle' :
+        type === 'error' ? 'fa-times-circle' : 'fa-info-circle';
+
+    notification.innerHTML = `
+        <i class="fas ${icon}"></i>
+        <span>${message}</span>
+    `;
+
+    container.appendChild(notification);
+
+    // Автоматическое удаление через 5 секунд
+    setTimeout(() => {
+        notification.classList.add('notification-hide');
+        setTimeout(() => notification.remove(), 300);
+    }, 5000);
+}
+
+// Инициализация при загрузке страницы
+document.addEventListener('DOMContentLoaded', function () {
+    loadDoors();
+});
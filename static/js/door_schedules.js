@@ -0,0 +1,353 @@
+// Загружаем список дверей
+async function loadDoors() {
+    try {
+        const response = await fetch('/api/doors');
+        const data = await response.json();
+
+        const select = document.getElementById('selected-door');
+        select.innerHTML = '<option value="">-- Выберите дверь --</option>';
+
+        data.doors.forEach(door => {
+            if (door.status === 'active') {
+                select.innerHTML += `<option value="${door.device_id}">${door.name} (${door.device_id})</option>`;
+            }
+        });
+
+        showNotification('Список дверей загружен', 'success');
+    } catch (error) {
+        console.error('Ошибка загрузки дверей:', error);
+        showNotification('Ошибка загрузки списка дверей', 'error');
+    }
+}
+
+// Загружаем расписания для выбранной двери
+async function loadDoorSchedules() {
+    const doorId = document.getElementById('selected-door').value;
+    const schedulesPanel = document.getElementById('schedules-panel');
+
+    if (!doorId) {
+        schedulesPanel.style.display = 'none';
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/door/${doorId}/schedules`);
+        const data = await response.json();
+
+        console.log('API response:', data); // Отладка
+
+        const schedulesList = document.getElementById('schedules-list');
+
+        // Проверяем, что данные есть в правильном формате
+        // API может возвращать либо data.schedules, либо просто массив
+        const schedules = data.schedules || data;
+
+        if (schedules && schedules.length > 0) {
+            let html = '<div class="schedules-container">';
+
+            schedules.forEach(schedule => {
+                console.log('Processing schedule:', schedule); // Отладка
+
+                // В БД дни недели хранятся с понедельника
+                const days = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'];
+                let weekdaysHtml = '<div class="weekdays">';
+
+                // Обрабатываем weekdays (строка "1111111")
+                if (schedule.weekdays && typeof schedule.weekdays === 'string') {
+                    for (let i = 0; i < 7; i++) {
+                        const isActive = schedule.weekdays[i] === '1';
+                        weekdaysHtml += `
+                    <div class="weekday ${isActive ? 'active' : 'inactive'}">
+                        ${days[i]}
+                    </div>
+                `;
+                    }
+                } else {
+                    // Если weekdays нет, показываем все дни как неактивные
+                    for (let i = 0; i < 7; i++) {
+                        weekdaysHtml += `
+                    <div class="weekday inactive">
+                        ${days[i]}
+                    </div>
+                `;
+                    }
+                }
+
+                weekdaysHtml += '</div>';
+
+                // Используем правильные имена полей из API
+                html += `
+            <div class="schedule-card">
+                <div class="schedule-header">
+                    <div class="schedule-title">
+                        <i class="fas fa-clock"></i>
+                        ${schedule.name || schedule.schedule_name || 'Без названия'}
+                    </div>
+                    <div class="schedule-time">
+                        ${schedule.start || schedule.start_time_utc || '--:--'} - ${schedule.end || schedule.end_time_utc || '--:--'}
+                        <small>${schedule.timezone || 'UTC'}</small>
+                    </div>
+                </div>
+
+                <div class="schedule-details">
+                    <div class="schedule-info">
+                        <div class="schedule-info-item">
+                            <span class="schedule-info-label">Тип доступа:</span>
+                            <span class="schedule-info-value">
+                                ${(schedule.type === 'allow_all' || schedule.access_type === 'allow_all') ? 'Разрешить всем' : 'По расписанию'}
+                            </span>
+                        </div>
+                        <div class="schedule-info-item">
+                            <span class="schedule-info-label">Праздники:</span>
+                            <span class="schedule-info-value">
+                                ${schedule.holidays === 'closed' ? 'Не действует' : schedule.holidays === 'open' ? 'Весь день' : 'Как в обычный день'}
+                            </span>
+                        </div>
+                        <div class="schedule-info-item">
+                            <span class="schedule-info-label">Статус:</span>
+                            <span class="schedule-info-value">
+                                <span style="color: ${schedule.is_active ? 'var(--success-color)' : 'var(--warning-color)'}; font-weight: 500;">
+                                    <i class="fas ${schedule.is_active ? 'fa-check-circle' : 'fa-pause-circle'}"></i>
+                                    ${schedule.is_active ? 'Активно' : 'Неактивно'}
+                                </span>
+                            </span>
+                        </div>
+                    </div>
+                    ${weekdaysHtml}
+                </div>
+
+                <div class="schedule-actions">
+                    <button class="btn btn-danger btn-sm" onclick="deleteSchedule('${schedule.id}', '${doorId}')">
+                        <i class="fas fa-trash"></i> Удалить
+                    </button>
+                </div>
+            </div>
+        `;
+            });
+
+            html += '</div>';
+            schedulesList.innerHTML = html;
+            schedulesPanel.style.display = 'block';
+        } else {
+            schedulesList.innerHTML = `
+        <div style="text-align: center; padding: 40px;">
+            <i class="fas fa-calendar-times fa-3x" style="color: var(--text-secondary); margin-bottom: 15px;"></i>
+            <p style="color: var(--text-secondary);">Нет активных расписаний для этой двери</p>
+        </div>
+    `;
+            schedulesPanel.style.display = 'block';
+        }
+
+    } catch (error) {
+        console.error('Ошибка загрузки расписаний:', error);
+        showNotification('Ошибка загрузки расписаний', 'error');
+        const schedulesList = document.getElementById('schedules-list');
+        schedulesList.innerHTML = `
+    <div style="text-align: center; padding: 40px;">
+        <i class="fas fa-exclamation-triangle fa-3x" style="color: var(--danger-color); margin-bottom: 15px;"></i>
+        <p style="color: var(--danger-color);">Ошибка загрузки расписаний</p>
+    </div>
+`;
+        schedulesPanel.style.display = 'block';
+    }
+}
+
+// Добавить расписание
+async function addSchedule() {
+    const doorId = document.getElementById('selected-door').value;
+    const name = document.getElementById('schedule-name').value;
+    const start = document.getElementById('start-time').value;
+    const end = document.getElementById('end-time').value;
+
+    if (!doorId) {
+        showNotification('Выберите дверь', 'error');
+        return;
+    }
+
+    if (!name.trim()) {
+        showNotification('Введите название расписания', 'error');
+        return;
+    }
+
+    // Получаем выбранные дни недели
+    const weekdayCheckboxes = document.querySelectorAll('.weekday-checkbox:checked');
+    const weekdays = Array.from(weekdayCheckboxes).map(cb => cb.value);
+
+    if (weekdays.length === 0) {
+        showNotification('Выберите хотя бы один день недели', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/door/schedule', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                door_id: doorId,
+                schedule_name: name,
+                start_time_utc: start,
+                end_time_utc: end,
+                weekdays: weekdays,
+                access_type: 'allow_all',
+                holidays: document.getElementById('schedule-holidays').value,
+                timezone: document.getElementById('schedule-timezone').value.trim() || 'UTC'
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Расписание успешно добавлено', 'success');
+
+            // Очищаем форму
+            document.getElementById('schedule-name').value = '';
+            document.getElementById('start-time').value = '06:00';
+            document.getElementById('end-time').value = '15:00';
+
+            // Загружаем обновленный список расписаний
+            loadDoorSchedules();
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка добавления расписания:', error);
+        showNotification('Ошибка добавления расписания', 'error');
+    }
+}
+
+// Удалить расписание
+// Удалить расписание
+async function deleteSchedule(scheduleId, doorId) {
+    if (!confirm('Вы уверены, что хотите удалить это расписание?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/door/schedule/${scheduleId}`, {
+            method: 'DELETE'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Расписание удалено', 'success');
+            loadDoorSchedules(); // Перезагружаем список расписаний
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка удаления расписания:', error);
+        showNotification('Ошибка удаления расписания', 'error');
+    }
+}
+
+// Праздничные дни
+async function loadHolidays() {
+    try {
+        const response = await fetch('/api/holidays');
+        const data = await response.json();
+        const list = document.getElementById('holidays-list');
+
+        if (!data.holidays || data.holidays.length === 0) {
+            list.innerHTML = '<p style="color: var(--text-secondary);">Праздничные дни не заданы</p>';
+            return;
+        }
+
+        list.innerHTML = data.holidays.map(holiday => `
+            <div class="schedule-info-item">
+                <span class="schedule-info-label">${holiday.date}</span>
+                <span class="schedule-info-value">${holiday.name || ''}</span>
+                <button class="btn btn-danger btn-sm" onclick="deleteHoliday('${holiday.date}')">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </div>
+        `).join('');
+    } catch (error) {
+        console.error('Ошибка загрузки праздничных дней:', error);
+        showNotification('Ошибка загрузки праздничных дней', 'error');
+    }
+}
+
+async function addHoliday() {
+    const date = document.getElementById('holiday-date').value;
+    const name = document.getElementById('holiday-name').value;
+
+    if (!date) {
+        showNotification('Выберите дату', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/holidays', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ date: date, name: name })
+        });
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            document.getElementById('holiday-name').value = '';
+            loadHolidays();
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка добавления праздничного дня:', error);
+        showNotification('Ошибка добавления праздничного дня', 'error');
+    }
+}
+
+async function deleteHoliday(date) {
+    try {
+        const response = await fetch(`/api/holidays/${date}`, { method: 'DELETE' });
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(data.message, 'success');
+            loadHolidays();
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка удаления праздничного дня:', error);
+        showNotification('Ошибка удаления праздничного дня', 'error');
+    }
+}
+
+// Показать уведомление
+function showNotification(message, type = 'info') {
+    const notifications = document.getElementById('notifications');
+    const alert = document.createElement('div');
+    alert.className = `alert alert-${type}`;
+
+    const icon = type === 'success' ? 'fa-check-circle' :
+        type === 'error' ? 'fa-exclamation-circle' : 'fa-info-circle';
+
+    alert.innerHTML = `
+        <i class="fas ${icon}"></i>
+        <span>${message}</span>
+    `;
+
+    notifications.appendChild(alert);
+
+    // Автоматическое удаление через 5 секунд
+    setTimeout(() => {
+        alert.style.animation = 'slideIn 0.3s ease reverse';
+        setTimeout(() => alert.remove(), 300);
+    }, 5000);
+}
+
+// Инициализация при загрузке страницы
+document.addEventListener('DOMContentLoaded', function () {
+    loadDoors();
+    loadHolidays();
+
+    // Часовой пояс по умолчанию - пояс браузера
+    document.getElementById('schedule-timezone').value = Intl.DateTimeFormat().resolvedOptions().timeZone || 'UTC';
+
+    // Обработка Enter в поле названия
+    document.getElementById('schedule-name').addEventListener('keypress', function (e) {
+        if (e.key === 'Enter') addSchedule();
+    });
+});
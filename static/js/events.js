@@ -0,0 +1,19 @@
+function resetFilters() {
+    document.getElementById('filterForm').reset();
+    document.getElementById('filterForm').submit();
+}
+
+function removeFilter(filterName) {
+    const form = document.getElementById('filterForm');
+    const url = new URL(window.location.href);
+    url.searchParams.delete(filterName);
+    window.location.href = url.toString();
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    const urlParams = new URLSearchParams(window.location.search);
+
+    if (urlParams.toString()) {
+        history.replaceState(null, '', window.location.pathname + '?' + urlParams.toString());
+    }
+});
@@ -0,0 +1,503 @@
+function manualOpenSchedule() {
+    const doorId = document.getElementById('manual-door-select').value;
+    if (doorId) {
+        openDoorScheduleMode(doorId);
+    } else {
+        showNotification('Выберите дверь', 'error');
+    }
+}
+
+function manualCloseSchedule() {
+    const doorId = document.getElementById('manual-door-select').value;
+    if (doorId) {
+        closeDoorScheduleMode(doorId);
+    } else {
+        showNotification('Выберите дверь', 'error');
+    }
+}
+
+function loadDoorsForManualControl() {
+    fetch('/api/doors')
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                const select = document.getElementById('manual-door-select');
+                select.innerHTML = '<option value="">-- Выберите дверь --</option>';
+
+                data.doors.forEach(door => {
+                    if (door.status === 'active') {
+                        select.innerHTML += `<option value="${door.device_id}">${door.name} (${door.device_id})</option>`;
+                    }
+                });
+            }
+        });
+}
+
+async function openDoorScheduleMode(doorId) {
+    try {
+        const response = await fetch(`/api/door/${doorId}/open_sh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' }
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Дверь ${doorId} открыта в режиме расписания`, 'success');
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка открытия в режиме расписания:', error);
+        showNotification('Ошибка открытия двери', 'error');
+    }
+}
+
+async function closeDoorScheduleMode(doorId) {
+    try {
+        const response = await fetch(`/api/door/${doorId}/close_sh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' }
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Дверь ${doorId} закрыта в режиме расписания`, 'success');
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка закрытия в режиме расписания:', error);
+        showNotification('Ошибка закрытия двери', 'error');
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    loadDoorsForManualControl();
+});
+
+let devices = {};
+let socket = null;
+
+function connectWebSocket() {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const wsUrl = `${protocol}//${window.location.host}/socket.io/?EIO=4&transport=websocket`;
+
+    try {
+        socket = new WebSocket(wsUrl);
+
+        socket.onopen = function () {
+            console.log('WebSocket подключен');
+            showNotification('Подключено к серверу в реальном времени', 'success');
+            updateConnectionStatus('Подключено');
+        };
+
+        socket.onmessage = function (event) {
+            try {
+                const data = JSON.parse(event.data);
+                handleWebSocketMessage(data);
+            } catch (e) {
+                console.log('Сообщение от сервера:', event.data);
+            }
+        };
+
+        socket.onclose = function () {
+            console.log('WebSocket отключен');
+            showNotification('Потеряно соединение с сервером', 'error');
+            updateConnectionStatus('Отключено');
+            setTimeout(connectWebSocket, 5000);
+        };
+
+        socket.onerror = function (error) {
+            console.error('WebSocket ошибка:', error);
+        };
+
+    } catch (e) {
+        console.error('Ошибка подключения WebSocket:', e);
+        setInterval(loadDevices, 5000);
+    }
+}
+
+function handleWebSocketMessage(data) {
+    if (data.type === 'device_update') {
+        updateDevice(data.device);
+    } else if (data.type === 'access_event') {
+        showNotification(`Доступ: ${data.message}`, data.success ? 'success' : 'error');
+        updateStats();
+    } else if (data.type === 'new_event') {
+        showNotification(`Событие: ${data.event_type}`, 'info');
+        updateStats();
+    }
+}
+
+async function loadDevices() {
+    try {
+        const response = await fetch('/api/devices');
+        const data = await response.json();
+
+        if (data.success) {
+            devices = data.devices;
+            renderDevices();
+            updateStats();
+        }
+    } catch (error) {
+        console.error('Ошибка загрузки устройств:', error);
+        showNotification('Ошибка загрузки устройств', 'error');
+    }
+}
+
+function renderDevices() {
+    const container = document.getElementById('devices-container');
+
+    if (Object.keys(devices).length === 0) {
+        container.innerHTML = `
+            <div class="text-center py-5">
+                <i class="fas fa-door-closed fa-3x text-muted mb-3"></i>
+                <p class="text-muted">Нет подключенных устройств</p>
+            </div>
+        `;
+        return;
+    }
+
+    let html = '<div class="devices-container">';
+
+    for (const [deviceId, deviceInfo] of Object.entries(devices)) {
+        const isOnline = deviceInfo.status === 'online';
+        const lastSeen = new Date(deviceInfo.last_seen).toLocaleString('ru-RU');
+
+        html += `
+            <div class="device-card ${isOnline ? 'online' : 'offline'}">
+                <div class="device-header">
+                    <div class="device-title">
+                        <i class="fas fa-door-closed"></i>
+                        ${deviceId}
+                    </div>
+                    <div class="device-status ${isOnline ? 'online' : 'offline'}">
+                        <i class="fas fa-circle"></i>
+                        ${isOnline ? 'Онлайн' : 'Офлайн'}
+                    </div>
+                </div>
+
+                <div class="device-details">
+                    <div class="device-info">
+                        <div class="device-info-item">
+                            <span class="device-info-label">IP адрес:</span>
+                            <span class="device-info-value">${deviceInfo.ip || 'Неизвестно'}</span>
+                        </div>
+                        <div class="device-info-item">
+                            <span class="device-info-label">Последний контакт:</span>
+                            <span class="device-info-value">${lastSeen}</span>
+                        </div>
+                        <div class="device-info-item">
+                            <span class="device-info-label">Статус:</span>
+                            <span class="device-info-value">
+                                <span class="badge ${isOnline ? 'bg-success' : 'bg-danger'}">
+                                    ${isOnline ? 'Активен' : 'Неактивен'}
+                                </span>
+                            </span>
+                        </div>
+                    </div>
+                </div>
+
+                <div class="device-actions">
+                    <h6>Управление замком</h6>
+                    <hr>
+                    <button class="device-btn btn-open" onclick="openDoor('${deviceId}')" 
+                            ${!isOnline ? 'disabled' : ''}>
+                        <i class="fas fa-door-open"></i>
+                        Открыть (для входа)
+                    </button>
+                    <h6>Ручное управление расписанием</h6>
+                    <button class="device-btn btn-open" onclick="openDoorScheduleMode('${deviceId}')">
+                        ${!isOnline ? 'disabled' : ''}
+                        <i class="fas fa-door-open"></i> Открыть
+                    </button>
+                    <button class="device-btn btn-close" onclick="closeDoorScheduleMode('${deviceId}')">
+                        ${!isOnline ? 'disabled' : ''}
+                        <i class="fas fa-door-closed"></i> Закрыть
+                    </button>
+
+
+                    <button class="device-btn btn-info" onclick="rebootDevice('${deviceId}')"
+                            ${!isOnline ? 'disabled' : ''}>
+                        <i class="fas fa-redo"></i>
+                        Перезагрузить
+                    </button>
+                </div>
+            </div>
+        `;
+    }
+
+    html += '</div>';
+    container.innerHTML = html;
+
+    updateTestDeviceList();
+}
+
+function updateStats() {
+    const onlineCount = Object.values(devices).filter(d => d.status === 'online').length;
+    const openDoors = Object.values(devices).filter(d => d.door_state === 'open').length;
+
+    document.getElementById('online-count').textContent = onlineCount;
+    document.getElementById('open-doors').textContent = openDoors;
+}
+
+async function loadAccessStats() {
+    try {
+        const response = await fetch('/api/stats/access?range=today&group_by=hour');
+        if (!response.ok) return;
+        const stats = await response.json();
+
+        document.getElementById('today-access').textContent = stats.totals.granted;
+        document.getElementById('alerts-count').textContent = stats.totals.denied;
+        renderAccessChart(stats.buckets);
+    } catch (error) {
+        console.error('Ошибка загрузки статистики:', error);
+    }
+}
+
+function renderAccessChart(buckets) {
+    const container = document.getElementById('access-chart');
+    if (!buckets.length) {
+        container.innerHTML = '<p class="text-muted">Нет данных</p>';
+        return;
+    }
+
+    const byHour = {};
+    buckets.forEach(bucket => {
+        byHour[new Date(bucket.key * 1000).getHours()] = bucket;
+    });
+    const max = Math.max(...buckets.map(bucket => bucket.total));
+
+    let html = '';
+    for (let hour = 0; hour < 24; hour++) {
+        const bucket = byHour[hour] || { granted: 0, denied: 0, total: 0 };
+        const granted = bucket.granted / max * 100;
+        const denied = bucket.denied / max * 100;
+        html += `
+            <div class="access-bar" title="${hour}:00 — разрешено: ${bucket.granted}, запрещено: ${bucket.denied}">
+                <div class="access-bar-stack">
+                    <div class="access-bar-denied" style="height: ${denied}%"></div>
+                    <div class="access-bar-granted" style="height: ${granted}%"></div>
+                </div>
+                <span class="access-bar-label">${hour}</span>
+            </div>
+        `;
+    }
+    container.innerHTML = html;
+}
+
+function updateConnectionStatus(status) {
+    const indicator = document.querySelector('.status-indicator');
+    const statusText = document.getElementById('connection-status');
+
+    statusText.textContent = status;
+
+    if (status === 'Подключено') {
+        indicator.style.backgroundColor = '#4caf50';
+    } else {
+        indicator.style.backgroundColor = '#f44336';
+        indicator.style.animation = 'none';
+    }
+}
+
+async function openDoor(deviceId) {
+    try {
+        showNotification(`Открытие двери ${deviceId}...`, 'info');
+
+        const response = await fetch('/api/open_door', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ device_id: deviceId })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Дверь ${deviceId} открыта`, 'success');
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка при открытии двери', 'error');
+    }
+}
+
+async function closeDoor(deviceId) {
+    try {
+        const response = await fetch('/api/close_door', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ device_id: deviceId })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Дверь ${deviceId} закрыта`, 'success');
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка при закрытии двери', 'error');
+    }
+}
+
+async function rebootDevice(deviceId) {
+    if (!confirm(`Вы уверены, что хотите перезагрузить устройство ${deviceId}?`)) {
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/reboot_device', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ device_id: deviceId })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Устройство ${deviceId} перезагружается`, 'info');
+        } else {
+            showNotification(`Ошибка: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка при перезагрузке устройства', 'error');
+    }
+}
+
+function openAllDoors() {
+    if (!confirm('Открыть все двери?')) return;
+
+    Object.keys(devices).forEach(deviceId => {
+        if (devices[deviceId].status === 'online') {
+            openDoor(deviceId);
+        }
+    });
+}
+
+function closeAllDoors() {
+    if (!confirm('Закрыть все двери?')) return;
+
+    Object.keys(devices).forEach(deviceId => {
+        if (devices[deviceId].status === 'online') {
+            closeDoor(deviceId);
+        }
+    });
+}
+
+function refreshDevices() {
+    loadDevices();
+    showNotification('Список устройств обновлен', 'info');
+}
+
+function showTestAccess() {
+    document.getElementById('test-access-panel').style.display = 'block';
+    updateTestDeviceList();
+}
+
+function hideTestAccess() {
+    document.getElementById('test-access-panel').style.display = 'none';
+}
+
+function updateTestDeviceList() {
+    const select = document.getElementById('test-device');
+    select.innerHTML = '<option value="">Выберите устройство</option>';
+
+    Object.keys(devices).forEach(deviceId => {
+        if (devices[deviceId].status === 'online') {
+            select.innerHTML += `<option value="${deviceId}">${deviceId}</option>`;
+        }
+    });
+}
+
+async function testAccess() {
+    const cardNumber = document.getElementById('test-card-number').value;
+    const pinCode = document.getElementById('test-pin-code').value;
+    const deviceId = document.getElementById('test-device').value;
+
+    if (!cardNumber && !pinCode) {
+        showNotification('Введите номер карты или PIN код', 'error');
+        return;
+    }
+
+    if (!deviceId) {
+        showNotification('Выберите устройство', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/test_access', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                card_number: cardNumber,
+                pin_code: pinCode,
+                device_id: deviceId
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification(`Доступ разрешен: ${data.message}`, 'success');
+        } else {
+            showNotification(`Доступ запрещен: ${data.message}`, 'error');
+        }
+    } catch (error) {
+        showNotification('Ошибка проверки доступа', 'error');
+    }
+}
+
+function showNotification(message, type = 'info') {
+    const notifications = document.getElementById('notifications');
+    const alert = document.createElement('div');
+    alert.className = `alert alert-${type}`;
+
+    const icon = type === 'success' ? 'fa-check-circle' :
+        type === 'error' ? 'fa-exclamation-circle' : 'fa-info-circle';
+
+    alert.innerHTML = `
+        <i class="fas ${icon}"></i>
+        <span>${message}</span>
+    `;
+
+    notifications.appendChild(alert);
+
+    setTimeout(() => {
+        alert.style.animation = 'slideIn 0.3s ease reverse';
+        setTimeout(() => alert.remove(), 300);
+    }, 5000);
+}
+
+function updateDevice(device) {
+    devices[device.device_id] = device;
+    renderDevices();
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    connectWebSocket();
+    loadDevices();
+    loadAccessStats();
+
+    setInterval(loadDevices, 30000);
+    setInterval(loadAccessStats, 30000);
+
+    document.getElementById('test-card-number').addEventListener('keypress', function (e) {
+        if (e.key === 'Enter') testAccess();
+    });
+
+    document.getElementById('test-pin-code').addEventListener('keypress', function (e) {
+        if (e.key === 'Enter') testAccess();
+    });
+});
@@ -0,0 +1,357 @@
+let currentEditingUser = null;
+
+const USERS_PAGE_SIZE = 100;
+const USER_FIELDS = 'name,id,status,role,pin,cardcode,liplate';
+const deleteUserUrl = document.getElementById('users-table').dataset.deleteUrl;
+let usersCursor = null;
+let usersQuery = '';
+let usersLoading = false;
+let usersDone = false;
+let usersRequest = 0;
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[ch]);
+}
+
+function renderUserRow(user) {
+    const statusLabels = { active: 'Активен', inactive: 'Неактивен' };
+    const roleLabels = { admin: 'Администратор', user: 'Пользователь', superuser: 'Суперпользователь' };
+    const badges = [];
+
+    if (user.pin && String(user.pin) !== '0') {
+        badges.push(`<span class="access-type-badge badge-pin" title="Пин-код"><i class="fas fa-lock"></i> PIN: ${escapeHtml(user.pin)}</span>`);
+    }
+    if (user.cardcode) {
+        badges.push('<span class="access-type-badge" title="Карта"><i class="fas fa-credit-card"></i> Карта</span>');
+    }
+    if (user.liplate) {
+        badges.push(`<span class="access-type-badge badge-car" title="Автомобильный номер"><i class="fas fa-car"></i> ${escapeHtml(user.liplate)}</span>`);
+    }
+    if (!badges.length) {
+        badges.push('<span style="color: #999; font-size: 0.85rem;">Нет данных</span>');
+    }
+
+    const id = escapeHtml(user.id);
+    const name = escapeHtml(user.name);
+    const deleteUrl = deleteUserUrl.replace('__id__', encodeURIComponent(user.id));
+
+    return `
+        <tr>
+            <td class="user-name">${name}</td>
+            <td><span class="user-id">${id}</span></td>
+            <td>
+                <span class="status status-${escapeHtml(user.status)}">${statusLabels[user.status] || ''}</span>
+                <br>
+                <span class="role">${roleLabels[user.role] || ''}</span>
+            </td>
+            <td><div style="display: flex; flex-wrap: wrap; gap: 4px;">${badges.join('')}</div></td>
+            <td>
+                <div class="action-buttons">
+                    <button class="btn btn-edit" data-user-id="${id}" onclick="editUser(this.dataset.userId)">
+                        <i class="fas fa-edit"></i>
+                        Изменить
+                    </button>
+                    <a href="${deleteUrl}" class="btn btn-delete"
+                        onclick="return confirm('Вы уверены, что хотите удалить пользователя ' + this.closest('tr').querySelector('.user-name').textContent + '?')">
+                        <i class="fas fa-trash"></i>
+                        Удалить
+                    </a>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+async function loadUsers(reset = false) {
+    if (reset) {
+        usersCursor = null;
+        usersDone = false;
+        usersLoading = false;
+        document.getElementById('users-tbody').innerHTML = '';
+    }
+    if (usersLoading || usersDone) {
+        return;
+    }
+
+    usersLoading = true;
+    const requestId = ++usersRequest;
+    const sentinel = document.getElementById('users-sentinel');
+    sentinel.textContent = 'Загрузка...';
+
+    const params = new URLSearchParams({ limit: USERS_PAGE_SIZE, fields: USER_FIELDS });
+    if (usersQuery) params.set('q', usersQuery);
+    if (usersCursor) params.set('cursor', usersCursor);
+
+    try {
+        const response = await fetch(`/api/users/directory?${params}`);
+        const result = await response.json();
+        if (requestId !== usersRequest) {
+            return;
+        }
+        if (!result.success) {
+            throw new Error(result.message);
+        }
+
+        const tbody = document.getElementById('users-tbody');
+        tbody.insertAdjacentHTML('beforeend', result.users.map(renderUserRow).join(''));
+        usersCursor = result.next_cursor;
+        usersDone = !usersCursor;
+
+        document.getElementById('users-empty').style.display = tbody.children.length ? 'none' : 'block';
+        document.getElementById('users-table').style.display = tbody.children.length ? '' : 'none';
+        sentinel.textContent = usersDone ? '' : 'Прокрутите ниже для загрузки';
+    } catch (error) {
+        console.error('Ошибка загрузки пользователей:', error);
+        sentinel.textContent = 'Ошибка загрузки пользователей';
+    } finally {
+        if (requestId === usersRequest) {
+            usersLoading = false;
+        }
+    }
+}
+
+function switchTab(tabName) {
+    document.querySelectorAll('.tab').forEach(tab => tab.classList.remove('active'));
+    document.querySelectorAll('.tab-content').forEach(content => content.classList.remove('active'));
+
+    if (tabName === 'people') {
+        document.querySelector('.tab:nth-child(1)').classList.add('active');
+        document.getElementById('people-tab').classList.add('active');
+    } else if (tabName === 'groups') {
+        document.querySelector('.tab:nth-child(2)').classList.add('active');
+        document.getElementById('groups-tab').classList.add('active');
+    }
+}
+
+function selectCardType(type) {
+    document.querySelectorAll('.card-type-btn').forEach(btn => btn.classList.remove('active'));
+    document.getElementById(`card-type-${type}`).classList.add('active');
+    document.getElementById('card_type').value = type;
+
+    const cardCodeField = document.getElementById('card-code-field');
+    const cardHint = document.getElementById('card-hint');
+
+    if (type === 'none') {
+        cardCodeField.style.display = 'none';
+        document.getElementById('cardcode').value = '';
+    } else {
+        cardCodeField.style.display = 'block';
+        if (type === 'ibutton') {
+            cardHint.textContent = 'Код iButton (например: 01A23B45C6)';
+            document.getElementById('cardcode').placeholder = 'Введите код iButton';
+        } else if (type === 'rfid') {
+            cardHint.textContent = 'Код RFID/NFC карты (например: 1234567890ABCDEF)';
+            document.getElementById('cardcode').placeholder = 'Введите код RFID/NFC';
+        }
+    }
+}
+
+function selectEditCardType(type) {
+    document.querySelectorAll('.card-type-btn').forEach(btn => btn.classList.remove('active'));
+    document.getElementById(`edit-card-type-${type}`).classList.add('active');
+    document.getElementById('edit_card_type').value = type;
+
+    const cardCodeField = document.getElementById('edit-card-code-field');
+    const cardHint = document.getElementById('edit-card-hint');
+
+    if (type === 'none') {
+        cardCodeField.style.display = 'none';
+        document.getElementById('edit_cardcode').value = '';
+    } else {
+        cardCodeField.style.display = 'block';
+        if (type === 'ibutton') {
+            cardHint.textContent = 'Код iButton (например: 01A23B45C6)';
+            document.getElementById('edit_cardcode').placeholder = 'Введите код iButton';
+        } else if (type === 'rfid') {
+            cardHint.textContent = 'Код RFID/NFC карты (например: 1234567890ABCDEF)';
+            document.getElementById('edit_cardcode').placeholder = 'Введите код RFID/NFC';
+        }
+    }
+}
+
+function editUser(userId) {
+    currentEditingUser = userId;
+
+    document.getElementById('editUserModal').style.display = 'block';
+
+    document.getElementById('edit_user_id').value = userId;
+    document.getElementById('edit_name').value = 'Загрузка...';
+
+    fetch(`/api/user/${userId}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Ошибка загрузки данных');
+            }
+            return response.json();
+        })
+        .then(result => {
+            console.log('Ответ сервера:', result);
+
+            if (result.success && result.user) {
+                const user = result.user;
+
+                document.getElementById('edit_name').value = user.name || '';
+                document.getElementById('edit_groups').value = user.groups || '';
+                document.getElementById('edit_role').value = user.role || 'user';
+                document.getElementById('edit_status').value = user.status || 'active';
+                document.getElementById('edit_pin').value = user.pin || '';
+                document.getElementById('edit_cardcode').value = user.cardcode || '';
+                document.getElementById('edit_liplate').value = user.liplate || '';
+                document.getElementById('edit_creds').value = user.creds || '';
+
+                const cardType = user.card_type || (user.cardcode ? 'ibutton' : 'none');
+                selectEditCardType(cardType);
+
+                console.log('Данные пользователя загружены:', user);
+            } else {
+                console.error('Некорректная структура ответа:', result);
+                alert('Некорректный ответ от сервера');
+                document.getElementById('edit_name').value = 'Ошибка данных';
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка загрузки данных:', error);
+            alert('Не удалось загрузить данные пользователя. Проверьте консоль для подробностей.');
+            document.getElementById('edit_name').value = 'Ошибка загрузки';
+        });
+}
+
+function editGroup(groupId) {
+    alert('Редактирование групп пока не реализовано');
+}
+
+function closeEditModal() {
+    document.getElementById('editUserModal').style.display = 'none';
+    currentEditingUser = null;
+    document.getElementById('editUserForm').reset();
+}
+
+document.getElementById('editUserForm').addEventListener('submit', function (e) {
+    e.preventDefault();
+
+    if (!currentEditingUser) {
+        alert('Нет активного пользователя для редактирования');
+        return;
+    }
+
+    const formData = new FormData(this);
+    const data = {
+        name: formData.get('edit_name'),
+        groups: formData.get('edit_groups'),
+        role: formData.get('edit_role'),
+        status: formData.get('edit_status'),
+        pin: formData.get('edit_pin'),
+        cardcode: formData.get('edit_cardcode'),
+        liplate: formData.get('edit_liplate'),
+        creds: formData.get('edit_creds'),
+        card_type: formData.get('edit_card_type')
+    };
+
+    fetch(`/update_user/${currentEditingUser}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(data)
+    })
+        .then(response => response.json())
+        .then(result => {
+            if (result.success) {
+                alert('Пользователь успешно обновлен');
+                closeEditModal();
+                loadUsers(true);
+            } else {
+                alert('Ошибка: ' + result.message);
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка:', error);
+            alert('Ошибка сети при обновлении пользователя');
+        });
+});
+
+window.onclick = function (event) {
+    const modal = document.getElementById('editUserModal');
+    if (event.target === modal) {
+        closeEditModal();
+    }
+};
+
+document.addEventListener('keydown', function (event) {
+    if (event.key === 'Escape') {
+        closeEditModal();
+    }
+});
+
+async function confirmDeleteGroup(event, groupId, groupName) {
+    event.preventDefault();
+    const href = event.currentTarget.href;
+
+    let impact = '';
+    try {
+        const response = await fetch(`/api/groups/${encodeURIComponent(groupId)}/delete_impact?limit=0`);
+        const data = await response.json();
+        if (data.success) {
+            impact = `\nРазрешения группы будут удалены. Доступ потеряют: ${data.impact.lost_users} (дверей: ${data.impact.doors.length})`;
+        }
+    } catch (error) {
+        console.error('Ошибка:', error);
+    }
+
+    if (confirm(`Вы уверены, что хотите удалить группу ${groupName}?${impact}`)) {
+        window.location.href = href;
+    }
+    return false;
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    selectCardType('ibutton');
+    selectEditCardType('none');
+
+    let searchTimer = null;
+    document.getElementById('user-search').addEventListener('input', function () {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            usersQuery = this.value.trim();
+            loadUsers(true);
+        }, 250);
+    });
+
+    new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadUsers();
+        }
+    }).observe(document.getElementById('users-sentinel'));
+
+    loadUsers(true);
+
+    const flashMessages = document.querySelectorAll('.flash');
+    flashMessages.forEach(message => {
+        setTimeout(() => {
+            message.style.opacity = '0';
+            message.style.transition = 'opacity 0.5s ease';
+            setTimeout(() => message.remove(), 500);
+        }, 5000);
+    });
+
+    const deleteButtons = document.querySelectorAll('#groups-tab .btn-delete');
+    deleteButtons.forEach(button => {
+        button.addEventListener('click', function (e) {
+            const itemName = this.closest('tr').querySelector('.user-name, .group-name').textContent;
+            if (!confirm(`Вы уверены, что хотите удалить "${itemName}"?`)) {
+                e.preventDefault();
+            }
+        });
+    });
+
+    document.getElementById('addUserForm').addEventListener('submit', function (e) {
+        const pinInput = document.getElementById('pin');
+        if (pinInput.value && pinInput.value.length > 8) {
+            alert('Пин-код не может быть длиннее 8 символов');
+            e.preventDefault();
+            return false;
+        }
+    });
+});
@@ -0,0 +1,208 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const triggerTypeSelect = document.getElementById('trigger-type');
+    const actionTypeSelect = document.getElementById('action-type');
+
+    function updateTriggerVisibility() {
+        const triggerValue = triggerTypeSelect.value;
+
+        document.getElementById('trigger-card-container').style.display = 'none';
+        document.getElementById('trigger-door-container').style.display = 'none';
+        document.getElementById('trigger-time-container').style.display = 'none';
+
+        if (triggerValue === 'card_scanned') {
+            document.getElementById('trigger-card-container').style.display = 'block';
+        } else if (triggerValue === 'door_opened') {
+            document.getElementById('trigger-door-container').style.display = 'block';
+        } else if (triggerValue === 'time_schedule') {
+            document.getElementById('trigger-time-container').style.display = 'block';
+        }
+    }
+
+    function updateActionVisibility() {
+        const actionValue = actionTypeSelect.value;
+
+        document.getElementById('action-webhook-container').style.display = 'none';
+        document.getElementById('action-door-container').style.display = 'none';
+        document.getElementById('action-notification-container').style.display = 'none';
+
+        if (actionValue === 'webhook') {
+            document.getElementById('action-webhook-container').style.display = 'block';
+        } else if (actionValue === 'open_door') {
+            document.getElementById('action-door-container').style.display = 'block';
+        } else if (actionValue === 'send_notification') {
+            document.getElementById('action-notification-container').style.display = 'block';
+        }
+    }
+
+    triggerTypeSelect.addEventListener('change', updateTriggerVisibility);
+    actionTypeSelect.addEventListener('change', updateActionVisibility);
+
+    updateTriggerVisibility();
+    updateActionVisibility();
+
+    document.querySelectorAll('.toggle-btn').forEach(btn => {
+        btn.addEventListener('click', async function() {
+            const scenarioId = this.getAttribute('data-id');
+            await toggleScenario(scenarioId);
+        });
+    });
+
+    document.querySelectorAll('.delete-btn').forEach(btn => {
+        btn.addEventListener('click', async function() {
+            const scenarioId = this.getAttribute('data-id');
+            await deleteScenario(scenarioId);
+        });
+    });
+
+    document.querySelectorAll('.test-btn').forEach(btn => {
+        btn.addEventListener('click', async function() {
+            const scenarioId = this.getAttribute('data-id');
+            await testScenario(scenarioId);
+        });
+    });
+});
+
+async function addScenario() {
+    const name = document.getElementById('scenario-name').value;
+    const description = document.getElementById('scenario-description').value;
+    const enabled = document.getElementById('scenario-enabled').checked;
+    const triggerType = document.getElementById('trigger-type').value;
+    const actionType = document.getElementById('action-type').value;
+
+    let triggerValue = '';
+    if (triggerType === 'card_scanned') {
+        triggerValue = document.getElementById('trigger-card-user').value;
+    } else if (triggerType === 'door_opened') {
+        triggerValue = document.getElementById('trigger-door').value;
+    } else if (triggerType === 'time_schedule') {
+        triggerValue = document.getElementById('trigger-time').value;
+    }
+
+    let actionValue = '';
+    if (actionType === 'webhook') {
+        actionValue = document.getElementById('action-webhook').value;
+    } else if (actionType === 'open_door') {
+        actionValue = document.getElementById('action-door').value;
+    } else if (actionType === 'send_notification') {
+        actionValue = document.getElementById('action-notification').value;
+    }
+
+    if (!name || !triggerValue || !actionValue) {
+        showNotification('Заполните все обязательные поля', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/scenario', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                name: name,
+                description: description,
+                trigger_type: triggerType,
+                trigger_value: triggerValue,
+                action_type: actionType,
+                action_value: actionValue,
+                enabled: enabled
+            })
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Сценарий успешно создан', 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка создания сценария:', error);
+        showNotification('Ошибка создания сценария', 'error');
+    }
+}
+
+async function toggleScenario(scenarioId) {
+    try {
+        const response = await fetch(`/api/scenario/${scenarioId}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({enabled: null})
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Статус сценария изменен', 'success');
+            setTimeout(() => location.reload(), 500);
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка переключения сценария:', error);
+        showNotification('Ошибка переключения сценария', 'error');
+    }
+}
+
+async function deleteScenario(scenarioId) {
+    if (!confirm('Вы уверены, что хотите удалить этот сценарий?')) return;
+
+    try {
+        const response = await fetch(`/api/scenario/${scenarioId}`, {
+            method: 'DELETE'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Сценарий удален', 'success');
+            setTimeout(() => location.reload(), 500);
+        } else {
+            showNotification('Ошибка: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка удаления сценария:', error);
+        showNotification('Ошибка удаления сценария', 'error');
+    }
+}
+
+async function testScenario(scenarioId) {
+    showNotification('Тестирование сценария...', 'info');
+
+    try {
+        const response = await fetch(`/api/scenario/${scenarioId}/test`, {
+            method: 'POST'
+        });
+
+        const data = await response.json();
+
+        if (data.success) {
+            showNotification('Сценарий успешно протестирован: ' + data.message, 'success');
+        } else {
+            showNotification('Ошибка тестирования: ' + data.message, 'error');
+        }
+    } catch (error) {
+        console.error('Ошибка тестирования сценария:', error);
+        showNotification('Ошибка тестирования сценария', 'error');
+    }
+}
+
+function showNotification(message, type = 'info') {
+    const notifications = document.getElementById('notifications');
+    const alert = document.createElement('div');
+    alert.className = `alert alert-${type}`;
+
+    const icon = type === 'success' ? 'fa-check-circle' :
+                type === 'error' ? 'fa-exclamation-circle' : 'fa-info-circle';
+
+    alert.innerHTML = `
+        <i class="fas ${icon}"></i>
+        <span>${message}</span>
+    `;
+
+    notifications.appendChild(alert);
+
+    setTimeout(() => {
+        alert.style.animation = 'slideIn 0.3s ease reverse';
+        setTimeout(() => alert.remove(), 300);
+    }, 5000);
+}
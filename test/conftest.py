@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_cache
+import ologger
+import permission_matrix
+import users_db
+
+DATA_TABLES = ('users', 'groups', 'doors', 'permissions', 'credentials', 'schedules', 'holidays')
+
+@pytest.fixture
+def user_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(users_db, 'DB_NAME', str(tmp_path / 'firo_access.db'))
+    # Кеши привязаны к версиям данных процесса: новая база не должна получить чужие записи
+    api_cache.bump_data_version(*DATA_TABLES)
+    api_cache.clear()
+    permission_matrix._matrix.built_at = None
+    users_db.setupUserDB()
+    yield users_db
+    permission_matrix._matrix.built_at = None
+
+@pytest.fixture
+def event_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(ologger, 'LOG_DB', str(tmp_path / 'log.db'))
+    monkeypatch.setattr(ologger, '_known_partitions', set())
+    ologger.setupLogger()
+    return ologger
@@ -0,0 +1,71 @@
+def _setup_office(user_db):
+    user_db.add_group('Сотрудники', 'staff')
+    user_db.add_group('Уволенные', 'blocked')
+    user_db.add_user('Иван', 'u1', groups='staff', cardcode='100')
+    user_db.add_user('Петр', 'u2', groups='staff,blocked', cardcode='200')
+    user_db.add_door('door-1', 'Вход')
+    user_db.set_door_permission('staff', 'door-1', 'allow', {'time_range': {'start': '08:00', 'end': '20:00'}})
+    user_db.set_door_permission('blocked', 'door-1', 'deny')
+
+def test_batch_matches_single_checks(user_db):
+    _setup_office(user_db)
+    checks = [
+        {'user_id': 'u1', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'user_id': 'u1', 'device_id': 'door-1', 'timestamp': '2026-03-02T21:00:00Z'},
+        {'user_id': 'u2', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'card_number': '100', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'user_id': 'missing', 'device_id': 'door-1'},
+    ]
+    results = user_db.evaluate_access_batch(checks)
+
+    assert [(r['success'], r['reason']) for r in results] == [
+        (True, "Доступ разрешен"),
+        (False, "Доступ запрещен (не в разрешенное время)"),
+        (False, "Доступ запрещен (явный запрет)"),
+        (True, "Доступ разрешен"),
+        (False, "Пользователь не найден"),
+    ]
+    assert results[3]['user_id'] == 'u1'
+
+def test_batch_schedule_cache_depends_on_date(user_db):
+    _setup_office(user_db)
+    user_db.add_door_schedule('door-1', 'Рабочие часы', '08:00', '20:00', '1111111', 'allow_all', 'closed')
+    user_db.add_holiday('2026-12-25')
+    # Обе даты - пятница, 10:00: свободный проход только в обычный день
+    holiday = {'user_id': 'nobody', 'device_id': 'door-1', 'timestamp': '2026-12-25T10:00:00Z'}
+    workday = dict(holiday, timestamp='2026-12-18T10:00:00Z')
+
+    for checks in ([holiday, workday], [workday, holiday]):
+        results = {r['timestamp']: r['reason'] for r in user_db.evaluate_access_batch(checks)}
+        assert results['2026-12-18T10:00:00'] == "Свободный доступ (рабочие часы)"
+        assert results['2026-12-25T10:00:00'] == "Пользователь не найден"
+
+def test_batch_resolves_credentials_with_grouped_queries(user_db, monkeypatch):
+    _setup_office(user_db)
+    user_db.add_user('Анна', 'u3', groups='staff', pin=4321)
+    user_db.add_credential('u3', 'plate', 'A123BC77')
+    user_db.add_credential('u1', 'card', '300', valid_from='2026-03-01 00:00:00', valid_to='2026-03-31 00:00:00')
+    checks = [
+        {'card_number': '100', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'card_number': '200', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'card_number': '999', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'pin_code': '04321', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'plate': 'а 123 вс 77', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        # Срок действия идентификатора проверяется на момент проверки, а не на текущее время
+        {'card_number': '300', 'device_id': 'door-1', 'timestamp': '2026-03-02T10:00:00Z'},
+        {'card_number': '300', 'device_id': 'door-1', 'timestamp': '2026-04-02T10:00:00Z'},
+    ]
+
+    statements = []
+    connect = user_db.sqlite3.connect
+    def traced_connect(*args, **kwargs):
+        connection = connect(*args, **kwargs)
+        connection.set_trace_callback(statements.append)
+        return connection
+    monkeypatch.setattr(user_db.sqlite3, 'connect', traced_connect)
+    results = user_db.evaluate_access_batch(checks)
+    monkeypatch.undo()
+
+    assert [r['user_id'] for r in results] == ['u1', 'u2', None, 'u3', 'u3', 'u1', None]
+    assert [r['success'] for r in results] == [True, False, False, True, True, True, False]
+    assert len([s for s in statements if 'JOIN Users' in s]) == 3
@@ -0,0 +1,45 @@
+from flask import Flask
+
+import api_cache
+
+app = Flask(__name__)
+calls = []
+
+@app.route('/items')
+def items():
+    def build():
+        calls.append(1)
+        return {'items': [1, 2, 3], 'version': len(calls)}
+    return api_cache.cached_json_response(('test_items',), build)
+
+def test_cached_response_and_etag():
+    api_cache.clear()
+    calls.clear()
+    client = app.test_client()
+
+    first = client.get('/items')
+    second = client.get('/items')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert len(calls) == 1
+
+    etag = first.headers['ETag']
+    assert client.get('/items', headers={'If-None-Match': etag}).status_code == 304
+
+    api_cache.bump_data_version('test_items')
+    changed = client.get('/items', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(calls) == 2
+
+def test_last_seen_does_not_invalidate_doors(user_db):
+    user_db.add_door('door-1', 'Вход')
+    version = api_cache.get_data_version('doors')
+
+    user_db.update_device_last_seen('door-1')
+    user_db.register_device('door-1')
+    assert api_cache.get_data_version('doors') == version
+    assert user_db.get_door_by_device_id('door-1')['last_seen']
+
+    user_db.update_door('door-1', name='Главный вход')
+    assert api_cache.get_data_version('doors') != version
@@ -0,0 +1,126 @@
+import sqlite3
+import threading
+
+import pytest
+
+import api_cache
+
+def _setup(user_db):
+    user_db.add_group('Сотрудники', 'staff')
+    user_db.add_user('Иван', 'u1', groups='staff', cardcode='100')
+    user_db.add_door('door-1', 'Вход')
+    user_db.set_door_permission('staff', 'door-1', 'allow')
+
+def test_additional_card_with_facility(user_db):
+    _setup(user_db)
+    user_db.add_credential('u1', 'card', '555', facility='7')
+    user_db.add_credential('u1', 'card', '777')
+
+    user = user_db.get_user_by_card('555', '7')
+    assert user['id'] == 'u1'
+    assert user['credential'] == {'type': 'card', 'value': '555', 'facility': '7'}
+    assert user_db.get_user_by_card('555', '8') is None
+    # Карта без кода объекта подходит для любого кода
+    assert user_db.get_user_by_card('777', '8')['id'] == 'u1'
+    assert user_db.get_user_by_card('100')['id'] == 'u1'
+
+def test_credential_validity_window(user_db):
+    _setup(user_db)
+    user_db.add_credential('u1', 'card', '300', valid_to='2000-01-01 00:00:00')
+    user_db.add_credential('u1', 'card', '400', valid_from='2999-01-01 00:00:00')
+
+    assert user_db.get_user_by_card('300') is None
+    assert user_db.get_user_by_card('400') is None
+
+def test_duplicate_credential_rejected(user_db):
+    _setup(user_db)
+    user_db.add_user('Петр', 'u2')
+    user_db.add_credential('u1', 'card', '555')
+
+    with pytest.raises(ValueError):
+        user_db.add_credential('u2', 'card', '555')
+
+def test_pin_credential_grants_access(user_db):
+    _setup(user_db)
+    user_db.add_credential('u1', 'pin', '4321')
+
+    user = user_db.get_user_by_pin('4321')
+    assert user['pin'] in (0, '0', None, '')
+    assert user_db.check_user_access(user, 'door-1', 'pin') == (True, "Доступ разрешен")
+    assert user_db.evaluate_access_batch([{'pin_code': '4321', 'device_id': 'door-1'}])[0]['success']
+
+def test_validity_bounds_are_normalized(user_db):
+    _setup(user_db)
+    user_db.add_credential('u1', 'card', '300', valid_to='2000-01-01T00:00')
+    # Граница с часовым поясом переводится в UTC
+    user_db.add_credential('u1', 'card', '400', valid_from='2999-01-01T03:00:00+03:00')
+
+    assert user_db.get_user_by_card('300') is None
+    assert user_db.get_user_by_card('400') is None
+    stored = {c['value']: (c['valid_from'], c['valid_to']) for c in user_db.get_user_credentials('u1')}
+    assert stored['300'] == (None, '2000-01-01 00:00:00')
+    assert stored['400'] == ('2999-01-01 00:00:00', None)
+
+    with pytest.raises(ValueError):
+        user_db.add_credential('u1', 'card', '500', valid_to='завтра')
+
+def test_legacy_validity_format_is_migrated(user_db):
+    _setup(user_db)
+    connection = sqlite3.connect(user_db.DB_NAME)
+    connection.execute("INSERT INTO Credentials (type, value, user_id, valid_to) VALUES ('card', '600', 'u1', '2000-01-01T10:00')")
+    connection.commit()
+    connection.close()
+
+    # Старая запись с 'T' не продлевает действие идентификатора и до, и после миграции
+    assert user_db.get_user_by_card('600') is None
+    user_db.setupUserDB()
+    assert [c['valid_to'] for c in user_db.get_user_credentials('u1') if c['value'] == '600'] == ['2000-01-01 10:00:00']
+
+def test_credential_cache_is_thread_safe(user_db, monkeypatch):
+    _setup(user_db)
+    monkeypatch.setattr(user_db, 'CREDENTIAL_CACHE_SIZE', 4)
+    errors = []
+
+    def lookups():
+        try:
+            for index in range(300):
+                user_db.get_user_by_card(str(100 + index % 8))
+                if index % 50 == 0:
+                    api_cache.bump_data_version('credentials')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+def test_legacy_duplicates_are_reported_and_editable(user_db, capsys):
+    connection = sqlite3.connect(user_db.DB_NAME)
+    connection.execute('DROP TABLE Credentials')
+    for trigger in ('credentials_users_insert', 'credentials_users_update', 'credentials_users_delete'):
+        connection.execute(f'DROP TRIGGER {trigger}')
+    connection.execute("INSERT INTO Users (name, id, cardcode, pin, created_at) VALUES ('Иван', 'u1', '100', 1234, '2020-01-01')")
+    connection.execute("INSERT INTO Users (name, id, cardcode, pin, created_at) VALUES ('Петр', 'u2', '100', 1234, '2021-01-01')")
+    connection.commit()
+    connection.close()
+
+    user_db.setupUserDB()
+    output = capsys.readouterr().out
+    assert 'u2: card 100 принадлежит u1' in output
+    assert 'u2: pin 1234 принадлежит u1' in output
+    assert len(user_db.get_credential_conflicts()) == 2
+
+    # Форма редактирования присылает все поля: сохранение без изменения идентификаторов проходит
+    user_db.update_user('u2', name='Петр Петров', cardcode='100', pin='1234', liplate='')
+    assert user_db.get_user_by_id('u2')['name'] == 'Петр Петров'
+    # Изменение одного поля не проверяет заново остальные
+    user_db.update_user('u2', cardcode='200', pin='1234', liplate='')
+    assert user_db.get_user_by_card('200')['id'] == 'u2'
+    # Новое значение по-прежнему проверяется на уникальность
+    user_db.update_user('u1', pin='5555')
+    with pytest.raises(ValueError):
+        user_db.update_user('u2', pin='5555', cardcode='200', liplate='')
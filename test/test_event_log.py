@@ -0,0 +1,72 @@
+import sqlite3
+import time
+from datetime import datetime
+
+import ologger
+
+JANUARY = datetime(2024, 1, 15, 12).timestamp()
+FEBRUARY = datetime(2024, 2, 10, 9).timestamp()
+
+def _legacy_log(path):
+    connection = sqlite3.connect(path)
+    connection.execute('''
+    CREATE TABLE Event (
+    num INTEGER PRIMARY KEY AUTOINCREMENT,
+    device TEXT NOT NULL,
+    id TEXT NOT NULL,
+    levent TEXT NOT NULL,
+    time REAL NOT NULL
+    )
+    ''')
+    connection.executemany('INSERT INTO Event (device, id, levent, time) VALUES (?, ?, ?, ?)', [
+        ('door-1', 'door-1', 'январь', JANUARY),
+        ('door-1', 'door-1', 'февраль', FEBRUARY),
+        ('door-2', 'door-2', 'февраль 2', FEBRUARY + 60),
+    ])
+    connection.commit()
+    connection.close()
+
+def test_legacy_events_routed_to_month_partitions(tmp_path, monkeypatch):
+    path = str(tmp_path / 'log.db')
+    monkeypatch.setattr(ologger, 'LOG_DB', path)
+    monkeypatch.setattr(ologger, 'RETENTION_MONTHS', 0)
+    monkeypatch.setattr(ologger, '_known_partitions', set())
+    _legacy_log(path)
+
+    ologger.setupLogger()
+    ologger.newLog('сейчас', 'door-1', 'door-1')
+
+    connection = sqlite3.connect(path)
+    partitions = ologger._list_partitions(connection.cursor())
+    assert 'Event_202401' in partitions and 'Event_202402' in partitions
+    assert connection.execute('SELECT levent FROM Event_202402 ORDER BY num').fetchall() == [('февраль',), ('февраль 2',)]
+    # Представление Event объединяет все разделы
+    assert connection.execute('SELECT COUNT(*) FROM Event').fetchone()[0] == 4
+    connection.close()
+
+    events = ologger.get_events()
+    assert [event['levent'] for event in events] == ['сейчас', 'февраль 2', 'февраль', 'январь']
+    # Номера событий не повторяются после переноса
+    assert events[0]['num'] == 4
+    assert [event['levent'] for event in ologger.get_events_filtered(id_filter='door-2')] == ['февраль 2']
+    assert [event['levent'] for event in ologger.get_events_filtered(time_filter='hour')] == ['сейчас']
+
+def test_retention_archives_expired_partitions(tmp_path, monkeypatch):
+    path = str(tmp_path / 'log.db')
+    monkeypatch.setattr(ologger, 'LOG_DB', path)
+    monkeypatch.setattr(ologger, 'RETENTION_MONTHS', 0)
+    monkeypatch.setattr(ologger, 'ARCHIVE_DIR', tmp_path / 'archive')
+    monkeypatch.setattr(ologger, '_known_partitions', set())
+    _legacy_log(path)
+    ologger.setupLogger()
+
+    expired = ologger.apply_retention(retention_months=1, archive=True, now=FEBRUARY)
+
+    assert expired == ['Event_202401']
+    assert [event['levent'] for event in ologger.get_events()] == ['февраль 2', 'февраль']
+    archive = sqlite3.connect(str(tmp_path / 'archive' / 'Event_202401.db'))
+    assert archive.execute('SELECT levent FROM Event_202401').fetchall() == [('январь',)]
+    archive.close()
+
+    assert ologger.apply_retention(retention_months=1, archive=False, now=time.time())
+    assert ologger.get_events() == []
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+import mqtt_client
+
+def test_messages_of_one_device_keep_order():
+    handled = {}
+    lock = threading.Lock()
+
+    def handler(topic, payload):
+        data = json.loads(payload)
+        # Медленный первый запрос: при обработке не по порядку событие обогнало бы его
+        if data['seq'] == 0:
+            time.sleep(0.05)
+        with lock:
+            handled.setdefault(data['device_id'], []).append(data['seq'])
+
+    core = mqtt_client.IngestionCore(handler, queue_size=1000, db_workers=4)
+    core.start()
+    try:
+        for seq in range(20):
+            for device in ('door-1', 'door-2', 'door-3'):
+                assert core.submit('access/events', json.dumps({'device_id': device, 'seq': seq}).encode())
+    finally:
+        core.stop()
+
+    assert handled == {device: list(range(20)) for device in ('door-1', 'door-2', 'door-3')}
+    assert not core.running
+    assert core.lanes == {}
+
+def test_devices_are_processed_in_parallel():
+    barrier = threading.Barrier(2, timeout=2)
+    passed = []
+
+    def handler(topic, payload):
+        barrier.wait()
+        passed.append(payload)
+
+    core = mqtt_client.IngestionCore(handler, db_workers=2)
+    core.start()
+    try:
+        # Две двери обрабатываются одновременно: обработчики дожидаются друг друга на барьере
+        core.submit('access/requests', b'{"device_id": "door-1"}')
+        core.submit('access/requests', b'{"device_id": "door-2"}')
+    finally:
+        core.stop()
+
+    assert len(passed) == 2
+
+def test_stop_cancels_queued_messages():
+    release = threading.Event()
+    handled = []
+
+    def handler(topic, payload):
+        release.wait(2)
+        handled.append(payload)
+
+    core = mqtt_client.IngestionCore(handler, queue_size=10, db_workers=1)
+    core.start()
+    for seq in range(5):
+        core.submit('access/events', json.dumps({'device_id': 'door-1', 'seq': seq}).encode())
+    dropped = mqtt_client.INGEST_DROPPED.labels('shutdown').get()
+
+    stopper = threading.Thread(target=core.stop, kwargs={'drain_timeout': 0.05})
+    stopper.start()
+    time.sleep(0.2)
+    release.set()
+    stopper.join(5)
+
+    # Обработка первого сообщения завершается, остальные отменяются вместе с задачей устройства
+    assert not stopper.is_alive()
+    assert len(handled) == 1
+    assert mqtt_client.INGEST_DROPPED.labels('shutdown').get() - dropped == 4
+    assert not core.submit('access/events', b'{"device_id": "door-1"}')
+
+def test_full_queue_applies_backpressure(monkeypatch):
+    monkeypatch.setattr(mqtt_client, 'INGEST_SUBMIT_TIMEOUT', 0.05)
+    release = threading.Event()
+    core = mqtt_client.IngestionCore(lambda topic, payload: release.wait(2), queue_size=2, db_workers=1)
+    core.start()
+    try:
+        assert core.submit('access/events', b'{"device_id": "door-1"}')
+        assert core.submit('access/events', b'{"device_id": "door-2"}')
+        assert not core.submit('access/events', b'{"device_id": "door-3"}')
+    finally:
+        release.set()
+        core.stop()
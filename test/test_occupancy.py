@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+import occupancy
+import shared_state
+
+@pytest.fixture
+def doors(user_db):
+    user_db.add_door('in-a', 'Вход в A')
+    user_db.add_door('out-a', 'Выход из A')
+    user_db.update_door('in-a', zone_from='', zone_to='A', anti_passback=1)
+    user_db.update_door('out-a', zone_from='A', zone_to='', anti_passback=1)
+    return user_db
+
+@pytest.fixture(params=['local', 'shared'])
+def tracker(request, doors, tmp_path):
+    if request.param == 'local':
+        tracker = occupancy.ZoneTracker()
+    else:
+        tracker = occupancy.SharedZoneTracker(shared_state.SQLiteStateStore(str(tmp_path / 'state.db')))
+    yield tracker
+    tracker.stop()
+
+def test_anti_passback(tracker):
+    assert tracker.check_and_record('u1', 'in-a', 'Иван') is None
+    assert tracker.check_and_record('u1', 'in-a', 'Иван') == "Доступ запрещен (повторный вход в зону A, anti-passback)"
+    assert tracker.occupancy() == {'zones': {'A': 1}, 'total': 1}
+    assert [person['user_id'] for person in tracker.roll_call('A')] == ['u1']
+
+    assert tracker.check_and_record('u1', 'out-a') is None
+    assert tracker.check_and_record('u1', 'out-a') == "Доступ запрещен (повторный выход, anti-passback)"
+    assert tracker.zone_of('u1') == occupancy.OUTSIDE
+    assert tracker.occupancy()['total'] == 0
+
+def test_unknown_location_and_reset(tracker):
+    # Первый проход без известного местоположения разрешается в любую сторону
+    assert tracker.check_and_record('u1', 'out-a') is None
+    assert tracker.check_and_record('u2', 'in-a') is None
+    assert tracker.check_and_record('u3', 'in-a') is None
+
+    assert tracker.reset(zone='A') == 2
+    assert tracker.zone_of('u2') is None
+    assert tracker.check_and_record('u2', 'in-a') is None
+    assert tracker.reset(user_id='u2') == 1
+
+def test_concurrent_passages_single_winner(tracker):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def passage():
+        barrier.wait()
+        results.append(tracker.check_and_record('u1', 'in-a'))
+
+    threads = [threading.Thread(target=passage) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(None) == 1
+
+def test_shared_presence_between_processes(doors, tmp_path):
+    # Два обработчика cluster.py с общим хранилищем видят проходы друг друга
+    path = str(tmp_path / 'state.db')
+    first = occupancy.SharedZoneTracker(shared_state.SQLiteStateStore(path))
+    second = occupancy.SharedZoneTracker(shared_state.SQLiteStateStore(path))
+
+    assert first.check_and_record('u1', 'in-a') is None
+    assert second.check_and_record('u1', 'in-a') is not None
+    assert second.occupancy() == {'zones': {'A': 1}, 'total': 1}
+
+def test_local_presence_is_persisted(doors):
+    tracker = occupancy.ZoneTracker()
+    tracker.check_and_record('u1', 'in-a', 'Иван')
+    tracker.stop()
+
+    restored = occupancy.ZoneTracker()
+    assert restored.zone_of('u1') == 'A'
+    assert restored.check_and_record('u1', 'in-a') is not None
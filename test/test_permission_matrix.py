@@ -0,0 +1,135 @@
+import io
+import sqlite3
+import threading
+
+import permission_matrix
+
+DOORS = ('door-1', 'door-2', 'door-3')
+
+def _snapshot(matrix):
+    return {device_id: sorted(matrix.users_for_door(device_id)) for device_id in DOORS}
+
+def _fresh():
+    matrix = permission_matrix.PermissionMatrix()
+    matrix.build()
+    return _snapshot(matrix)
+
+def _setup(user_db):
+    for group in ('staff', 'guests', 'blocked'):
+        user_db.add_group(group, group)
+    for device_id in DOORS:
+        user_db.add_door(device_id, device_id)
+    user_db.add_user('Иван', 'u1', groups='staff')
+    user_db.add_user('Петр', 'u2', groups='staff,blocked')
+    user_db.add_user('Анна', 'u3', groups='guests')
+    user_db.set_door_permission('staff', 'door-1', 'allow')
+    user_db.set_door_permission('blocked', 'door-1', 'deny')
+    user_db.set_door_permission('guests', 'door-2', 'allow')
+    user_db.set_door_permission('staff', 'door-2', 'allow')
+
+def test_bit_helpers_round_trip():
+    indices = [0, 7, 8, 63, 64, 1000]
+    assert permission_matrix._indices_from_bits(permission_matrix._bits_from_indices(indices, 1001)) == indices
+    assert permission_matrix._indices_from_bits(0) == []
+
+def test_incremental_updates_match_full_build(user_db):
+    _setup(user_db)
+    matrix = permission_matrix.get_matrix()
+    assert _snapshot(matrix) == {'door-1': ['u1'], 'door-2': ['u1', 'u2', 'u3'], 'door-3': []}
+
+    user_db.update_user('u2', groups='staff')
+    user_db.update_user('u1', status='inactive')
+    user_db.delete_user('u3')
+    # Новый пользователь занимает освободившийся индекс удаленного
+    user_db.add_user('Олег', 'u4', groups='guests,staff')
+    user_db.set_door_permission('guests', 'door-3', 'allow')
+    user_db.set_door_permission('guests', 'door-1', 'deny')
+    user_db.update_door('door-2', status='inactive')
+
+    assert permission_matrix.get_matrix() is matrix
+    assert _snapshot(matrix) == _fresh()
+    assert _snapshot(matrix) == {'door-1': ['u2'], 'door-2': [], 'door-3': ['u4']}
+    assert matrix.doors_for_user('u4') == ['door-3']
+    assert matrix.can_access('u2', 'door-1')
+    assert not matrix.can_access('u1', 'door-1')
+    assert matrix.count_for_door('door-1') == 1
+
+def test_preview_does_not_change_matrix(user_db):
+    _setup(user_db)
+    matrix = permission_matrix.get_matrix()
+    before = _snapshot(matrix)
+
+    preview = matrix.preview([
+        {'group_id': 'guests', 'device_id': 'door-1', 'permission_type': 'allow'},
+        {'group_id': 'staff', 'action': 'delete_group'},
+    ])
+
+    doors = {door['device_id']: door for door in preview['doors']}
+    assert doors['door-1']['gained_users'] == ['u3']
+    assert doors['door-1']['lost_users'] == ['u1']
+    assert sorted(doors['door-2']['lost_users']) == ['u1', 'u2']
+    assert preview['gained_users'] == 1
+    assert preview['lost_users'] == 2
+    assert _snapshot(matrix) == before
+
+def _limited_db(matrix, monkeypatch):
+    # Лимит параметров SQLite в старых сборках - 999
+    connect = matrix._db
+
+    def limited():
+        connection = connect()
+        connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        return connection
+
+    monkeypatch.setattr(matrix, '_db', limited)
+
+def test_large_batch_update(user_db, monkeypatch):
+    import user_import
+
+    _setup(user_db)
+    matrix = permission_matrix.get_matrix()
+    _limited_db(matrix, monkeypatch)
+    rows = ''.join(f'Сотрудник {index},s{index},active,staff\n' for index in range(1500))
+    report = user_import.import_users(io.StringIO('name,id,status,groups\n' + rows), 'csv', chunk_size=1500)
+
+    assert report['imported'] == 1500
+    assert matrix.count_for_door('door-1') == 1501
+    assert _snapshot(matrix) == _fresh()
+
+class _PausedConnection:
+    # Соединение перестройки: после чтения снимка закрытие ждет, пока придет изменение
+    def __init__(self, connection, snapshot_taken, release):
+        self.connection = connection
+        self.snapshot_taken = snapshot_taken
+        self.release = release
+
+    def execute(self, *args):
+        return self.connection.execute(*args)
+
+    def close(self):
+        self.connection.close()
+        self.snapshot_taken.set()
+        self.release.wait(5)
+
+def test_update_during_rebuild_is_not_lost(user_db, monkeypatch):
+    _setup(user_db)
+    matrix = permission_matrix.get_matrix()
+    assert matrix.can_access('u1', 'door-1')
+
+    snapshot_taken = threading.Event()
+    release = threading.Event()
+    connect = matrix._db
+    connections = iter([lambda: _PausedConnection(connect(), snapshot_taken, release)])
+    monkeypatch.setattr(matrix, '_db', lambda: next(connections, connect)())
+
+    matrix.built_at -= permission_matrix.PERMISSION_MATRIX_TTL + 1
+    rebuild = threading.Thread(target=permission_matrix.get_matrix)
+    rebuild.start()
+    assert snapshot_taken.wait(5)
+
+    threading.Timer(0.2, release.set).start()
+    user_db.update_user('u1', status='inactive')
+    rebuild.join(5)
+
+    assert not matrix.can_access('u1', 'door-1')
+    assert 'u1' not in matrix.users_for_door('door-1')
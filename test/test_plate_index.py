@@ -0,0 +1,49 @@
+import plate_index
+
+def test_normalize_plate():
+    # Кириллица и латиница одного начертания, пробелы и путаемые символы дают один ключ
+    assert plate_index.normalize_plate('а 123 вс 77') == plate_index.normalize_plate('A123BC77')
+    assert plate_index.normalize_plate('O12') == '012'
+    assert plate_index.normalize_plate(None) == ''
+
+def test_search_with_one_error():
+    index = plate_index.PlateIndex()
+    index.add('A123BC77', 'A123BC77')
+    index.add('K456MH99', 'K456MH99')
+
+    assert index.search('a123bc77') == (0, ['A123BC77'])
+    assert index.search('A128BC77') == (1, ['A123BC77'])
+    assert index.search('A123BC7') == (1, ['A123BC77'])
+    assert index.search('A12BC7') == (None, [])
+    # Слишком короткие номера не ищутся и не индексируются
+    assert index.search('A12') == (None, [])
+    index.add('K12', 'K12')
+    assert len(index) == 2
+
+def test_ambiguous_match_prefers_nearest():
+    index = plate_index.PlateIndex()
+    index.add('A123BC77', 'first')
+    index.add('A124BC77', 'second')
+
+    assert index.search('A125BC77') == (1, ['first', 'second'])
+    assert index.search('A124BC77') == (0, ['second'])
+
+def test_find_user_by_plate(user_db):
+    user_db.add_user('Иван', 'u1')
+    user_db.add_user('Петр', 'u2')
+    user_db.add_credential('u1', 'plate', 'A123BC77')
+    user_db.add_credential('u2', 'plate', 'A124BC77')
+
+    user, match = plate_index.find_user_by_plate('а 123 вс 77')
+    assert user['id'] == 'u1'
+    assert match['distance'] == 0
+
+    user, match = plate_index.find_user_by_plate('A125BC77')
+    assert user is None
+    assert match['candidates'] == 2
+
+    user_db.add_user('Анна', 'u3')
+    user_db.add_credential('u3', 'plate', 'X999XX99')
+    user, match = plate_index.find_user_by_plate('X990XX99')
+    assert user['id'] == 'u3'
+    assert match['matched'] == 'X999XX99'
@@ -0,0 +1,39 @@
+import threading
+
+import eventlet
+
+import profiler
+
+def _waiting_request(counter):
+    while True:
+        counter.append(1)
+        eventlet.sleep(0.001)
+
+def test_profile_yields_and_sees_greenlets():
+    counter = []
+    worker = eventlet.spawn(_waiting_request, counter)
+    try:
+        stacks, samples = profiler.sample_stacks(0.2, 0.005)
+    finally:
+        worker.kill()
+
+    # Во время профилирования другие гринлеты продолжают работу, их стеки попадают в отчет
+    assert samples > 10
+    assert len(counter) > 10
+    assert '_waiting_request (test_profiler.py' in stacks
+
+def test_profile_sees_threads():
+    stop = threading.Event()
+
+    def _blocked_thread():
+        stop.wait(5)
+
+    thread = threading.Thread(target=_blocked_thread, name='blocked-worker')
+    thread.start()
+    try:
+        stacks, _ = profiler.sample_stacks(0.1)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert any(line.startswith('blocked-worker;') and '_blocked_thread' in line for line in stacks.splitlines())
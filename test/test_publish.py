@@ -0,0 +1,22 @@
+import mqtt_client
+
+def test_publish_while_disconnected_is_queued(event_log):
+    handler = mqtt_client.MQTTHandler()
+    handler.outbound.clear()
+
+    assert handler.open_door('door-1') == mqtt_client.PUBLISH_QUEUED
+    assert [topic for topic, _, _ in handler.outbound] == ['access/commands']
+    # Ошибка сериализации по-прежнему возвращает False
+    assert handler.publish('access/commands', {'bad': object()}) is False
+
+def test_denial_metric_uses_reason_codes(user_db, event_log):
+    user_db.add_group('Сотрудники', 'staff')
+    user_db.add_user('Иван', 'u1', groups='staff', cardcode='100')
+    user_db.add_door('door-1', 'Вход')
+    handler = mqtt_client.MQTTHandler()
+
+    handler._decide_access({'device_id': 'door-1'}, lambda: (user_db.get_user_by_card('100'), 'card', {}), 'карта 100')
+
+    assert ('denied', 'no_permission') in mqtt_client.ACCESS_DECISIONS._children
+    codes = set(user_db.ACCESS_REASON_CODES.values()) | {'other', 'error', 'db_unavailable', 'anti_passback', 'user_inactive', 'user_not_found', 'plate_ambiguous'}
+    assert {reason for _, reason in mqtt_client.ACCESS_DECISIONS._children} <= codes
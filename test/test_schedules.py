@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+import schedules
+
+def _window(start, end, days='1111111', **extra):
+    return schedules.build_schedule(dict({'intervals': [{'start': start, 'end': end, 'days': days}]}, **extra))
+
+def test_overnight_window_continues_next_day():
+    # Пятница 22:00 - суббота 06:00 (6 марта 2026 - пятница)
+    schedule = _window('22:00', '06:00', '0000100')
+
+    assert not schedule.allows(datetime(2026, 3, 6, 21, 59))
+    assert schedule.allows(datetime(2026, 3, 6, 23, 30))
+    assert schedule.allows(datetime(2026, 3, 7, 6, 0))
+    assert not schedule.allows(datetime(2026, 3, 7, 6, 1))
+    assert not schedule.allows(datetime(2026, 3, 5, 23, 30))
+    assert schedule.next_change(datetime(2026, 3, 6, 23, 30, 15)) == datetime(2026, 3, 7, 6, 1)
+
+def test_overnight_window_wraps_end_of_week():
+    # Воскресенье 22:00 - понедельник 06:00
+    schedule = _window('22:00', '06:00', '0000001')
+
+    assert schedule.allows(datetime(2026, 3, 8, 23, 0))
+    assert schedule.allows(datetime(2026, 3, 9, 3, 0))
+    assert not schedule.allows(datetime(2026, 3, 9, 7, 0))
+    assert schedule.next_change(datetime(2026, 3, 8, 23, 0)) == datetime(2026, 3, 9, 6, 1)
+    assert schedule.next_change(datetime(2026, 3, 9, 7, 0)) == datetime(2026, 3, 15, 22, 0)
+
+def test_holidays_and_exceptions(user_db):
+    user_db.add_holiday('2026-03-09')
+    closed = _window('08:00', '18:00', holidays='closed')
+    open_all_day = _window('08:00', '18:00', holidays='open')
+    short_day = _window('08:00', '18:00', holidays=[{'start': '10:00', 'end': '12:00'}],
+                        exceptions={'2026-03-10': [{'start': '20:00', 'end': '02:00'}]})
+
+    holiday = datetime(2026, 3, 9, 9, 0)
+    assert _window('08:00', '18:00').allows(holiday)
+    assert not closed.allows(holiday)
+    assert closed.next_change(holiday) == datetime(2026, 3, 10, 0, 0)
+    assert open_all_day.allows(datetime(2026, 3, 9, 3, 0))
+    assert not short_day.allows(holiday)
+    assert short_day.allows(datetime(2026, 3, 9, 11, 0))
+
+    # Исключение заменяет расписание даты, окно через полночь обрезается концом суток
+    assert not short_day.allows(datetime(2026, 3, 10, 9, 0))
+    assert short_day.allows(datetime(2026, 3, 10, 23, 59))
+    assert not short_day.allows(datetime(2026, 3, 11, 1, 0))
+    assert short_day.allows(datetime(2026, 3, 11, 9, 0))
+
+def test_compile_schedule_text():
+    assert schedules.compile_schedule('') is schedules.ALWAYS
+    assert schedules.compile_schedule('{"always": "true"}') is schedules.ALWAYS
+    assert schedules.compile_schedule('{"time_range": {"start": "25:00"}}') is schedules.NEVER
+    assert schedules.compile_schedule('{"time_range": {"start": "08:00", "end": "09:00"}}').allows(datetime(2026, 3, 6, 8, 30))
+    with pytest.raises(ValueError):
+        schedules.validate_schedule('{"holidays": "sometimes"}')
+
+def test_local_time_across_dst_transitions():
+    # Берлин: 29 марта 2026 часы переводятся вперед, 25 октября - назад
+    night = _window('01:00', '04:00', timezone='Europe/Berlin')
+    night.rebuild(datetime(2026, 3, 25))
+    assert not night.allows(datetime(2026, 3, 28, 23, 59))
+    assert night.allows(datetime(2026, 3, 29, 0, 0))
+    assert night.allows(datetime(2026, 3, 29, 2, 0))
+    assert not night.allows(datetime(2026, 3, 29, 2, 1))
+    assert night.next_change(datetime(2026, 3, 29, 1, 0)) == datetime(2026, 3, 29, 2, 1)
+
+    # Окно в повторяющемся часе действует при обоих его проходах
+    repeated = _window('02:00', '02:30', timezone='Europe/Berlin')
+    repeated.rebuild(datetime(2026, 10, 20))
+    assert not repeated.allows(datetime(2026, 10, 24, 23, 59))
+    assert repeated.allows(datetime(2026, 10, 25, 0, 0))
+    assert repeated.allows(datetime(2026, 10, 25, 1, 30))
+    assert not repeated.allows(datetime(2026, 10, 25, 1, 31))
+
+    # Вне рассчитанной таблицы время переводится в местное напрямую
+    assert night.allows(datetime(2020, 1, 1, 0, 30))
+    assert not night.allows(datetime(2020, 1, 1, 3, 30))
@@ -0,0 +1,67 @@
+import multiprocessing
+
+import pytest
+
+import mqtt_client
+import shared_state
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return shared_state.create_store('memory://')
+    return shared_state.create_store(f'sqlite:///{tmp_path / "state.db"}')
+
+def test_store_operations(store):
+    store.set('devices', 'door-1', {'status': 'online'})
+    assert store.merge('devices', 'door-1', {'ip': '10.0.0.5'}) == {'status': 'online', 'ip': '10.0.0.5'}
+    assert store.update('devices', 'door-2', lambda value: {'count': (value or {}).get('count', 0) + 1}) == {'count': 1}
+    assert store.items('devices') == {'door-1': {'status': 'online', 'ip': '10.0.0.5'}, 'door-2': {'count': 1}}
+
+    # update, вернувшая None, удаляет ключ
+    assert store.update('devices', 'door-2', lambda value: None) is None
+    assert store.get('devices', 'door-2') is None
+    assert store.delete('devices', 'door-1')
+    assert not store.delete('devices', 'door-1')
+
+def test_shared_dict_defaults(monkeypatch):
+    monkeypatch.setattr(shared_state, '_store', shared_state.LocalStateStore())
+    states = shared_state.SharedDict('emergency', {'lockdown': False})
+
+    assert states['lockdown'] is False
+    states['lockdown'] = True
+    assert states.snapshot() == {'lockdown': True}
+    with pytest.raises(KeyError):
+        del states['evacuation']
+
+def _increment(path, count):
+    store = shared_state.SQLiteStateStore(path)
+    for _ in range(count):
+        store.update('counters', 'hits', lambda value: (value or 0) + 1)
+
+def test_sqlite_update_is_atomic_across_processes(tmp_path):
+    path = str(tmp_path / 'state.db')
+    shared_state.SQLiteStateStore(path)
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_increment, args=(path, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert shared_state.SQLiteStateStore(path).get('counters', 'hits') == 200
+
+class _RecordingClient:
+    def __init__(self):
+        self.topics = []
+
+    def subscribe(self, topic, qos=0):
+        self.topics.append(topic)
+
+def test_shared_subscription_routing(event_log):
+    client = _RecordingClient()
+    mqtt_client.MQTTHandler(shared_group='workers')._on_connect(client, None, {}, 0)
+    assert client.topics and all(topic.startswith('$share/workers/access/') for topic in client.topics)
+
+    client = _RecordingClient()
+    mqtt_client.MQTTHandler()._on_connect(client, None, {}, 0)
+    assert 'access/requests' in client.topics
@@ -0,0 +1,44 @@
+import io
+import json
+
+import user_import
+
+CSV_HEADER = 'name,id,status,groups,pin,cardcode,liplate,role\n'
+
+def test_csv_import_reports_source_lines(user_db):
+    user_db.add_user('Старый', 'old', cardcode='900')
+    data = CSV_HEADER + (
+        'Иван,u1,active,"staff,guests",1234,100,а123вс,user\n'
+        ',u2,active,,,,,user\n'
+        'Петр,u3,active,staff,,100,,user\n'
+        'Анна,u4,active,staff,,900,,user\n'
+    )
+
+    report = user_import.import_users(io.StringIO(data), 'csv', chunk_size=2)
+
+    assert report['total'] == 4
+    assert report['imported'] == 1
+    assert report['groups_created'] == 2
+    assert [(error['line'], error['id']) for error in report['errors']] == [(3, 'u2'), (4, 'u3'), (5, 'u4')]
+    assert 'old' in report['errors'][2]['error']
+    assert user_db.get_user_by_card('100')['id'] == 'u1'
+
+def test_ndjson_import_dry_run(user_db):
+    lines = [
+        json.dumps({'name': 'Иван', 'id': 'u1', 'groups': ['staff', 'staff']}),
+        '',
+        '{broken',
+        json.dumps({'name': 'Петр', 'id': 'u2', 'status': 'fired'}),
+    ]
+
+    report = user_import.import_users(io.StringIO('\n'.join(lines)), 'ndjson', dry_run=True)
+
+    assert report['imported'] == 1
+    assert [error['line'] for error in report['errors']] == [3, 4]
+    assert user_db.get_user_by_id('u1') is None
+
+def test_export_round_trip(user_db):
+    user_db.add_user('Иван', 'u1', groups='staff', cardcode='100')
+    exported = ''.join(user_import.export_users('ndjson'))
+
+    assert [json.loads(line)['id'] for line in exported.splitlines()] == ['u1']
@@ -0,0 +1,304 @@
+import argparse
+import base64
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+RECORD_TOPICS = 'access/#'
+FLUSH_INTERVAL = 1.0
+
+class TrafficRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+        self.count = 0
+        self._lock = threading.Lock()
+        self._flushed = time.monotonic()
+
+    def record(self, topic, payload, timestamp=None):
+        entry = {'t': timestamp if timestamp is not None else time.time(), 'topic': topic}
+        try:
+            entry['payload'] = payload.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['payload_b64'] = base64.b64encode(payload).decode('ascii')
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            if self.file.closed:
+                return
+            self.file.write(line)
+            self.count += 1
+            if time.monotonic() - self._flushed >= FLUSH_INTERVAL:
+                self.file.flush()
+                self._flushed = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+def read_capture(path, topics=None):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if topics and entry['topic'] not in topics:
+                continue
+            if 'payload_b64' in entry:
+                payload = base64.b64decode(entry['payload_b64'])
+            else:
+                payload = entry['payload'].encode('utf-8')
+            yield entry['t'], entry['topic'], payload
+
+class _Message:
+    __slots__ = ('topic', 'payload')
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class _PublishResult:
+    rc = 0
+
+class _LocalClient:
+    def __init__(self, on_publish):
+        self.on_publish = on_publish
+
+    def publish(self, topic, payload, qos=0):
+        self.on_publish(topic, payload)
+        return _PublishResult()
+
+    def subscribe(self, topic, qos=0):
+        pass
+
+class LatencyTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_request = {}
+        self._by_device = defaultdict(deque)
+        self.latencies = []
+        self.granted = 0
+        self.denied = 0
+
+    def sent(self, payload):
+        try:
+            data = json.loads(payload)
+        except (ValueError, UnicodeDecodeError):
+            return
+        now = time.perf_counter()
+        with self._lock:
+            if data.get('request_id') is not None:
+                self._by_request[str(data['request_id'])] = now
+            else:
+                self._by_device[data.get('device_id')].append(now)
+
+    def answered(self, payload):
+        data = json.loads(payload)
+        now = time.perf_counter()
+        with self._lock:
+            started = None
+            if data.get('request_id') is not None:
+                started = self._by_request.pop(str(data['request_id']), None)
+            elif self._by_device[data.get('device_id')]:
+                started = self._by_device[data.get('device_id')].popleft()
+            if started is None:
+                return
+            self.latencies.append(now - started)
+            if data.get('success'):
+                self.granted += 1
+            else:
+                self.denied += 1
+
+    def pending(self):
+        with self._lock:
+            return len(self._by_request) + sum(len(queue) for queue in self._by_device.values())
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+def _feed(messages, speed, deliver, tracker):
+    count = 0
+    max_lag = 0.0
+    first = None
+    started = time.perf_counter()
+
+    for timestamp, topic, payload in messages:
+        if first is None:
+            first = timestamp
+        if speed:
+            due = started + (timestamp - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+        if topic in ('access/requests', 'access/plate_requests'):
+            tracker.sent(payload)
+        deliver(topic, payload)
+        count += 1
+
+    return count, max_lag
+
+def _wait_answers(tracker, timeout):
+    deadline = time.monotonic() + timeout
+    while tracker.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def replay_to_handler(path, speed=1.0, timeout=30):
+    import mqtt_client
+    import ologger
+    from users_db import setupUserDB
+    from scenarios_db import setup_scenarios_db
+
+    setupUserDB()
+    ologger.setupLogger()
+    setup_scenarios_db()
+
+    tracker = LatencyTracker()
+
+    def on_publish(topic, payload):
+        if topic == 'access/responses':
+            tracker.answered(payload)
+
+    handler = mqtt_client.MQTTHandler()
+    handler.client = _LocalClient(on_publish)
+    handler.is_connected = True
+    handler.connected.set()
+    handler.ingest.start()
+
+    # Ответы сервера уже есть в записи: воспроизводим только входящий трафик устройств
+    messages = (m for m in read_capture(path) if not _is_server_response(m[1], m[2]))
+    started = time.perf_counter()
+    try:
+        count, max_lag = _feed(messages, speed, lambda topic, payload: handler._on_message(None, None, _Message(topic, payload)), tracker)
+        _wait_answers(tracker, timeout)
+    finally:
+        handler.ingest.stop()
+    return _report(count, time.perf_counter() - started, max_lag, tracker)
+
+def replay_to_broker(path, host, port, speed=1.0, timeout=30):
+    import paho.mqtt.client as mqtt
+
+    tracker = LatencyTracker()
+    connected = threading.Event()
+    client = mqtt.Client(client_id=f"firoaccess_replay-{int(time.time())}")
+    client.on_connect = lambda c, userdata, flags, rc: (c.subscribe('access/responses', qos=1), connected.set())
+    client.on_message = lambda c, userdata, msg: tracker.answered(msg.payload)
+    client.connect(host, port, 60)
+    client.loop_start()
+    if not connected.wait(10):
+        raise RuntimeError(f"Не удалось подключиться к MQTT {host}:{port}")
+
+    messages = (m for m in read_capture(path) if not _is_server_response(m[1], m[2]))
+    started = time.perf_counter()
+    try:
+        count, max_lag = _feed(messages, speed, lambda topic, payload: client.publish(topic, payload, qos=1), tracker)
+        _wait_answers(tracker, timeout)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+    return _report(count, time.perf_counter() - started, max_lag, tracker)
+
+def _is_server_response(topic, payload):
+    if topic == 'access/commands':
+        return True
+    if topic != 'access/responses':
+        return False
+    try:
+        return 'command' not in json.loads(payload)
+    except ValueError:
+        return False
+
+def _report(count, elapsed, max_lag, tracker):
+    latencies = sorted(tracker.latencies)
+    decisions = len(latencies)
+    return {
+        'messages': count,
+        'decisions': decisions,
+        'granted': tracker.granted,
+        'denied': tracker.denied,
+        'unanswered': tracker.pending(),
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(count / elapsed, 1) if elapsed else None,
+        'decisions_per_second': round(decisions / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p95': round(_percentile(latencies, 95) * 1000, 3) if latencies else None,
+            'p99': round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+            'max': round(latencies[-1] * 1000, 3) if latencies else None,
+            'mean': round(statistics.mean(latencies) * 1000, 3) if latencies else None
+        },
+        'max_schedule_lag_seconds': round(max_lag, 3)
+    }
+
+def record_from_broker(path, host, port, duration=None):
+    import paho.mqtt.client as mqtt
+
+    recorder = TrafficRecorder(path)
+    client = mqtt.Client(client_id=f"firoaccess_recorder-{int(time.time())}")
+    client.on_connect = lambda c, userdata, flags, rc: c.subscribe(RECORD_TOPICS, qos=1)
+    client.on_message = lambda c, userdata, msg: recorder.record(msg.topic, msg.payload)
+    client.connect(host, port, 60)
+    client.loop_start()
+    try:
+        if duration:
+            time.sleep(duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        recorder.close()
+    return recorder.count
+
+def _parse_speed(value):
+    if value in ('max', '0'):
+        return 0
+    return float(value.rstrip('x'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Запись и воспроизведение MQTT трафика FiroAccess')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='Записать трафик access/# с брокера')
+    record.add_argument('capture')
+    record.add_argument('--host', default='127.0.0.1')
+    record.add_argument('--port', type=int, default=1883)
+    record.add_argument('--duration', type=float)
+
+    replay = subparsers.add_parser('replay', help='Воспроизвести запись')
+    replay.add_argument('capture')
+    replay.add_argument('--speed', type=_parse_speed, default=1.0, help='1x, 10x, ... или max')
+    replay.add_argument('--target', default='local', help='local (обработчик в процессе) или mqtt://хост:порт')
+    replay.add_argument('--timeout', type=float, default=30, help='Ожидание ответов после отправки, с')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        count = record_from_broker(args.capture, args.host, args.port, args.duration)
+        print(f"Записано сообщений: {count}", file=sys.stderr)
+        return 0
+
+    if args.target == 'local':
+        report = replay_to_handler(args.capture, args.speed, args.timeout)
+    elif args.target.startswith('mqtt://'):
+        host, _, port = args.target[len('mqtt://'):].partition(':')
+        report = replay_to_broker(args.capture, host, int(port or 1883), args.speed, args.timeout)
+    else:
+        parser.error(f"Неизвестная цель: {args.target}")
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+import re
+import sys
+
+import users_db
+
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+USER_STATUSES = ('active', 'inactive')
+USER_ROLES = ('user', 'admin', 'superuser')
+ID_PATTERN = re.compile(r'^[\w.\-@]{1,64}$')
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith('.ndjson') or name.endswith('.jsonl'):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def iter_ndjson_rows(stream):
+    for line_num, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_num, ValueError(f"Невалидный JSON: {e.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield line_num, ValueError("Строка должна быть JSON-объектом")
+            continue
+        yield line_num, row
+
+def validate_user_row(row):
+    def text(field, default=''):
+        value = row.get(field)
+        if value is None:
+            return default
+        return str(value).strip()
+
+    user_id = text('id')
+    name = text('name')
+
+    if not user_id or not name:
+        raise ValueError("Имя и ID пользователя обязательны")
+    if not ID_PATTERN.match(user_id):
+        raise ValueError(f"Недопустимый ID пользователя: {user_id}")
+
+    status = text('status', 'active').lower() or 'active'
+    if status not in USER_STATUSES:
+        raise ValueError(f"Недопустимый статус: {status}")
+
+    role = text('role', 'user').lower() or 'user'
+    if role not in USER_ROLES:
+        raise ValueError(f"Недопустимая роль: {role}")
+
+    pin = text('pin', '0') or '0'
+    if not pin.isdigit():
+        raise ValueError(f"PIN должен состоять из цифр: {pin}")
+
+    groups = row.get('groups') or ''
+    if isinstance(groups, (list, tuple)):
+        groups = ','.join(str(g) for g in groups)
+    groups = ','.join(dict.fromkeys(g.strip() for g in str(groups).split(',') if g.strip()))
+
+    return {
+        'name': name,
+        'id': user_id,
+        'status': status,
+        'groups': groups,
+        'creds': text('creds'),
+        'pin': int(pin),
+        'cardcode': text('cardcode'),
+        'liplate': text('liplate').upper(),
+        'role': role
+    }
+
+def import_users(stream, fmt='csv', chunk_size=1000, dry_run=False):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    report = {
+        'total': 0,
+        'imported': 0,
+        'failed': 0,
+        'groups_created': 0,
+        'errors': []
+    }
+
+    def add_error(line, user_id, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'line': line, 'id': user_id, 'error': error})
+
+    seen_cards = {}
+    rows = iter_csv_rows(stream) if fmt == 'csv' else iter_ndjson_rows(stream)
+
+    def valid_users():
+        for line_num, row in rows:
+            report['total'] += 1
+            if isinstance(row, Exception):
+                add_error(line_num, None, str(row))
+                continue
+            try:
+                user = validate_user_row(row)
+            except (ValueError, TypeError) as e:
+                add_error(line_num, row.get('id'), str(e))
+                continue
+
+            card = user['cardcode']
+            if card:
+                owner = seen_cards.setdefault(card, user['id'])
+                if owner != user['id']:
+                    add_error(line_num, user['id'], f"Карта {card} уже указана для {owner}")
+                    continue
+
+            user['line'] = line_num
+            yield user
+
+    stats = users_db.bulk_upsert_users(valid_users(), chunk_size=chunk_size, dry_run=dry_run)
+
+    for user_id, error, line_num in stats['rejected']:
+        add_error(line_num, user_id, error)
+
+    report['imported'] = stats['upserted']
+    report['groups_created'] = stats['groups_created']
+    report['dry_run'] = dry_run
+    return report
+
+def export_users(fmt='csv', batch_size=1000):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    if fmt == 'ndjson':
+        for user in users_db.iter_users(batch_size):
+            yield json.dumps(user, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=users_db.USER_FIELDS)
+    writer.writeheader()
+
+    for count, user in enumerate(users_db.iter_users(batch_size), start=1):
+        writer.writerow(user)
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def main():
+    import argparse
+    import contextlib
+    import time
+
+    parser = argparse.ArgumentParser(description='Массовый импорт/экспорт пользователей FiroAccess')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Импорт пользователей из CSV/NDJSON')
+    import_parser.add_argument('file', help='Путь к файлу или "-" для stdin')
+    import_parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию по расширению)')
+    import_parser.add_argument('--chunk-size', type=int, default=1000, help='Размер пачки на одну транзакцию')
+    import_parser.add_argument('--dry-run', action='store_true', help='Только проверить, не записывать')
+
+    export_parser = subparsers.add_parser('export', help='Экспорт пользователей в CSV/NDJSON')
+    export_parser.add_argument('file', help='Путь к файлу или "-" для stdout')
+    export_parser.add_argument('--format', choices=FORMATS, help='Формат файла (по умолчанию по расширению)')
+
+    args = parser.parse_args()
+    with contextlib.redirect_stdout(sys.stderr):
+        users_db.setupUserDB()
+
+    if args.command == 'import':
+        fmt = args.format or detect_format(args.file)
+        started = time.perf_counter()
+        if args.file == '-':
+            report = import_users(sys.stdin, fmt, args.chunk_size, args.dry_run)
+        else:
+            with open(args.file, encoding='utf-8-sig', newline='') as stream:
+                report = import_users(stream, fmt, args.chunk_size, args.dry_run)
+        elapsed = time.perf_counter() - started
+
+        for error in report['errors']:
+            print(f"Строка {error['line']} ({error['id']}): {error['error']}", file=sys.stderr)
+        print(f"Обработано {report['total']}, импортировано {report['imported']}, "
+              f"ошибок {report['failed']}, создано групп {report['groups_created']} за {elapsed:.2f} с")
+        sys.exit(1 if report['failed'] else 0)
+
+    fmt = args.format or detect_format(args.file)
+    if args.file == '-':
+        for part in export_users(fmt):
+            sys.stdout.write(part)
+    else:
+        with open(args.file, 'w', encoding='utf-8', newline='') as stream:
+            for part in export_users(fmt):
+                stream.write(part)
+
+if __name__ == "__main__":
+    main()
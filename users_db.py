@@ -1,14 +1,41 @@
 import sqlite3
+import threading
 import time
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+from collections import OrderedDict
 from pathlib import Path
 
+from api_cache import bump_data_version, get_data_version
+import metrics
+import schedules
+from plate_index import find_user_by_plate, get_plate_index
+
 current_file = Path(__file__)
 parent_dir = current_file.parent.parent
 target_file = parent_dir / 'firo_access.db'
 DB_NAME = target_file
 
+DB_QUERY_SECONDS = metrics.histogram('firo_db_query_seconds', 'Время выполнения функций users_db', ['function'])
+
+def db_timed(function):
+    return metrics.timed(DB_QUERY_SECONDS)(function)
+
+_change_listeners = []
+
+def add_change_listener(listener):
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def _notify_change(kind, keys=None):
+    # keys=None - изменилось неизвестное множество записей
+    for listener in _change_listeners:
+        try:
+            listener(kind, keys)
+        except Exception as e:
+            print(f"Ошибка обработчика изменений {kind}: {e}")
+
+@db_timed
 def setupUserDB():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -105,6 +132,13 @@ def setupUserDB():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_groups_id ON Groups(id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_doors_device ON Doors(device_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_permissions_group_device ON DoorPermissions(group_id, device_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_name_id ON Users(name, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_name_nocase ON Users(name COLLATE NOCASE)')
+
+    setup_user_search(cursor)
+    setup_credentials(cursor)
+    setup_zones(cursor)
+    setup_schedules(cursor)
 
     connection.commit()
     connection.close()
@@ -112,6 +146,7 @@ def setupUserDB():
     print(f"База данных '{DB_NAME}' успешно инициализирована")
     print("Созданы таблицы: Users, Groups, Doors, DoorPermissions")
 
+@db_timed
 def get_users():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -138,102 +173,638 @@ def get_users():
     connection.close()
     return Users
 
-def add_user(name, id, groups="", creds="", pin=0, cardcode="", liplate="", role="user", status="active"):
+USER_FIELDS = ('name', 'id', 'status', 'groups', 'creds', 'pin', 'cardcode', 'liplate', 'role')
+DIRECTORY_FIELDS = USER_FIELDS + ('created_at', 'updated_at')
+
+def setup_user_search(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'UsersSearch'")
+    if cursor.fetchone():
+        return True
+
+    try:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE UsersSearch USING fts5(name, id, cardcode, tokenize='trigram')
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Триграммный поиск недоступен ({e}), используется поиск по префиксу")
+        return False
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON Users BEGIN
+        INSERT OR REPLACE INTO UsersSearch (rowid, name, id, cardcode) VALUES (new.rowid, new.name, new.id, new.cardcode);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF name, id, cardcode ON Users BEGIN
+        DELETE FROM UsersSearch WHERE rowid = old.rowid;
+        INSERT INTO UsersSearch (rowid, name, id, cardcode) VALUES (new.rowid, new.name, new.id, new.cardcode);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON Users BEGIN
+        DELETE FROM UsersSearch WHERE rowid = old.rowid;
+    END
+    ''')
+    cursor.execute('INSERT INTO UsersSearch (rowid, name, id, cardcode) SELECT rowid, name, id, cardcode FROM Users')
+    return True
+
+CREDENTIAL_TYPES = ('card', 'pin', 'plate')
+CREDENTIAL_CACHE_SIZE = 50000
+# Версии данных локальны для процесса: в кластере изменения других процессов
+# становятся видны не позже чем через CREDENTIAL_CACHE_TTL секунд
+CREDENTIAL_CACHE_TTL = 30
+ACCESS_EVALUATE_MAX_CHECKS = 10000
+# Границы действия идентификаторов хранятся в UTC в одном формате, чтобы их можно было сравнивать
+CREDENTIAL_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+CREDENTIAL_CONFLICTS_REPORTED = 20
+
+_credential_cache = OrderedDict()
+_credential_cache_version = None
+_credential_cache_cleared = 0.0
+_credential_cache_lock = threading.Lock()
+
+def setup_credentials(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'Credentials'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Credentials (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        facility TEXT NOT NULL DEFAULT '',
+        value TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        valid_from TIMESTAMP,
+        valid_to TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES Users(id)
+    )
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_credentials_lookup ON Credentials(type, value, facility)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_credentials_user ON Credentials(user_id)')
+
+    # Поля cardcode, pin и liplate остаются основными идентификаторами пользователя
+    # и синхронизируются в Credentials триггерами
+    legacy = (
+        ('card', 'new.cardcode', "new.cardcode != ''", 'old.cardcode', 'new.cardcode IS NOT old.cardcode'),
+        ('pin', 'CAST(new.pin AS TEXT)', 'new.pin != 0', 'CAST(old.pin AS TEXT)', 'new.pin IS NOT old.pin'),
+        ('plate', 'new.liplate', "new.liplate != ''", 'old.liplate', 'new.liplate IS NOT old.liplate')
+    )
+
+    def inserts(changed_only):
+        # При изменении пользователя переносятся только измененные поля: неизмененный
+        # идентификатор, занятый другим пользователем до миграции, не блокирует сохранение
+        return '\n'.join(
+            f"INSERT INTO Credentials (type, value, user_id) SELECT '{kind}', {value}, new.id "
+            f"WHERE {condition}{f' AND {changed}' if changed_only else ''} AND NOT EXISTS "
+            f"(SELECT 1 FROM Credentials WHERE type = '{kind}' AND value = {value} AND facility = '' AND user_id = new.id);"
+            for kind, value, condition, _, changed in legacy
+        )
+    deletes = ' OR '.join(
+        f"(type = '{kind}' AND value = {old_value} AND {changed})" for kind, _, _, old_value, changed in legacy
+    )
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS credentials_users_insert AFTER INSERT ON Users BEGIN
+        {inserts(False)}
+    END
+    ''')
+    cursor.execute('DROP TRIGGER IF EXISTS credentials_users_update')
+    cursor.execute(f'''
+    CREATE TRIGGER credentials_users_update AFTER UPDATE OF cardcode, pin, liplate ON Users BEGIN
+        DELETE FROM Credentials WHERE user_id = old.id AND facility = '' AND ({deletes});
+        {inserts(True)}
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS credentials_users_delete AFTER DELETE ON Users BEGIN
+        DELETE FROM Credentials WHERE user_id = old.id;
+    END
+    ''')
+
+    # Границы действия, сохраненные до приведения к единому формату (с 'T' или часовым поясом)
+    for column in ('valid_from', 'valid_to'):
+        cursor.execute(f"UPDATE Credentials SET {column} = NULL WHERE {column} = ''")
+        cursor.execute(
+            f"UPDATE Credentials SET {column} = datetime({column}) "
+            f"WHERE datetime({column}) IS NOT NULL AND {column} != datetime({column})"
+        )
+
+    if exists:
+        return
+
+    before = cursor.connection.total_changes
+    cursor.execute("INSERT OR IGNORE INTO Credentials (type, value, user_id) SELECT 'card', cardcode, id FROM Users WHERE cardcode != '' ORDER BY created_at")
+    cursor.execute("INSERT OR IGNORE INTO Credentials (type, value, user_id) SELECT 'pin', CAST(pin AS TEXT), id FROM Users WHERE pin != 0 ORDER BY created_at")
+    cursor.execute("INSERT OR IGNORE INTO Credentials (type, value, user_id) SELECT 'plate', liplate, id FROM Users WHERE liplate != '' ORDER BY created_at")
+    migrated = cursor.connection.total_changes - before
+    if migrated:
+        print(f"Перенесено идентификаторов в Credentials: {migrated}")
+
+    conflicts = _legacy_credential_conflicts(cursor)
+    if conflicts:
+        print(f"Не перенесены идентификаторы, уже занятые другими пользователями: {len(conflicts)}")
+        for user_id, credential_type, value, owner in conflicts[:CREDENTIAL_CONFLICTS_REPORTED]:
+            print(f"  {user_id}: {credential_type} {value} принадлежит {owner}")
+        if len(conflicts) > CREDENTIAL_CONFLICTS_REPORTED:
+            print("  ... полный список: users_db.get_credential_conflicts()")
+
+def _legacy_credential_conflicts(cursor):
+    # Поля пользователей, значения которых в Credentials принадлежат другому пользователю
+    cursor.execute('''
+    SELECT u.id, 'card', u.cardcode, c.user_id FROM Users u
+    JOIN Credentials c ON c.type = 'card' AND c.value = u.cardcode AND c.facility = ''
+    WHERE u.cardcode != '' AND c.user_id != u.id
+    UNION ALL
+    SELECT u.id, 'pin', CAST(u.pin AS TEXT), c.user_id FROM Users u
+    JOIN Credentials c ON c.type = 'pin' AND c.value = CAST(u.pin AS TEXT) AND c.facility = ''
+    WHERE u.pin != 0 AND c.user_id != u.id
+    UNION ALL
+    SELECT u.id, 'plate', u.liplate, c.user_id FROM Users u
+    JOIN Credentials c ON c.type = 'plate' AND c.value = u.liplate AND c.facility = ''
+    WHERE u.liplate != '' AND c.user_id != u.id
+    ORDER BY 1, 2
+    ''')
+    return cursor.fetchall()
+
+@db_timed
+def get_credential_conflicts():
     connection = sqlite3.connect(DB_NAME)
-    cursor = connection.cursor()
+    try:
+        return [
+            {'user_id': user_id, 'type': credential_type, 'value': value, 'owner': owner}
+            for user_id, credential_type, value, owner in _legacy_credential_conflicts(connection.cursor())
+        ]
+    finally:
+        connection.close()
+
+def setup_zones(cursor):
+    # Дверь переводит проходящего из зоны zone_from в зону zone_to, пустая строка - вне объекта
+    cursor.execute('PRAGMA table_info(Doors)')
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, definition in (
+        ('zone_from', "TEXT NOT NULL DEFAULT ''"),
+        ('zone_to', "TEXT NOT NULL DEFAULT ''"),
+        ('anti_passback', 'BOOLEAN NOT NULL DEFAULT 0')
+    ):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE Doors ADD COLUMN {column} {definition}')
 
     cursor.execute('''
-    INSERT INTO Users (name, id, status, groups, creds, pin, cardcode, liplate, role)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (name, id, status, groups, creds, pin, cardcode, liplate, role))
+    CREATE TABLE IF NOT EXISTS ZonePresence (
+        user_id TEXT NOT NULL PRIMARY KEY,
+        user_name TEXT NOT NULL DEFAULT '',
+        zone TEXT NOT NULL,
+        device_id TEXT NOT NULL,
+        entered_at REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
 
-    connection.commit()
+def setup_schedules(cursor):
+    # Время начала и конца задается в часовом поясе timezone (в старых расписаниях - UTC)
+    cursor.execute('PRAGMA table_info(DoorAccessSchedules)')
+    columns = {row[1] for row in cursor.fetchall()}
+    for column, definition in (
+        ('holidays', "TEXT NOT NULL DEFAULT 'ignore'"),
+        ('timezone', "TEXT NOT NULL DEFAULT 'UTC'")
+    ):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE DoorAccessSchedules ADD COLUMN {column} {definition}')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Holidays (
+        date TEXT NOT NULL PRIMARY KEY,
+        name TEXT NOT NULL DEFAULT ''
+    ) WITHOUT ROWID
+    ''')
+
+def _normalize_credential(credential_type, value, facility=''):
+    if credential_type not in CREDENTIAL_TYPES:
+        raise ValueError(f"Неизвестный тип идентификатора: {credential_type}")
+
+    value = str(value).strip() if value is not None else ''
+    if credential_type == 'pin':
+        try:
+            value = str(int(value)) if int(value) else ''
+        except ValueError:
+            value = ''
+
+    facility = str(facility).strip() if facility is not None else ''
+    if facility == '0':
+        facility = ''
+    return value, facility
+
+def parse_credential_time(value):
+    # Принимает 'YYYY-MM-DD HH:MM[:SS]', ISO 8601 с 'T' и часовым поясом; результат - наивное время UTC
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"Неверная дата действия идентификатора: {value}")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(microsecond=0)
+
+def _stored_credential_time(value, unreadable):
+    try:
+        return parse_credential_time(value)
+    except ValueError:
+        # Нечитаемая граница не должна продлевать действие идентификатора
+        return unreadable
+
+def _user_from_row(row):
+    return {
+        'name': row[0],
+        'id': row[1],
+        'status': row[2],
+        'groups': row[3],
+        'creds': row[4],
+        'pin': row[5],
+        'cardcode': row[6],
+        'liplate': row[7],
+        'role': row[8],
+        'created_at': row[9],
+        'updated_at': row[10]
+    }
+
+def _credential_candidates(credential_type, value, facility):
+    global _credential_cache_version, _credential_cache_cleared
+    key = (credential_type, value, facility)
+    version = get_data_version('users', 'credentials')
+
+    # Кешем пользуются все потоки обработки MQTT: сброс, чтение и вытеснение под одной блокировкой
+    with _credential_cache_lock:
+        if _credential_cache_version != version or time.monotonic() - _credential_cache_cleared > CREDENTIAL_CACHE_TTL:
+            _credential_cache.clear()
+            _credential_cache_version = version
+            _credential_cache_cleared = time.monotonic()
+
+        candidates = _credential_cache.get(key)
+        if candidates is not None:
+            _credential_cache.move_to_end(key)
+            return candidates
+
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('''
+    SELECT c.facility, c.valid_from, c.valid_to, u.*
+    FROM Credentials c
+    JOIN Users u ON u.id = c.user_id
+    WHERE c.type = ? AND c.value = ? AND c.facility IN (?, '')
+    ORDER BY c.facility DESC
+    ''', (credential_type, value, facility))
+    candidates = [(
+        row[0],
+        _stored_credential_time(row[1], datetime.max),
+        _stored_credential_time(row[2], datetime.min),
+        _user_from_row(row[3:])
+    ) for row in cursor.fetchall()]
     connection.close()
 
-def delete_user(user_id):
+    with _credential_cache_lock:
+        # Пока шел запрос, данные могли измениться: устаревший результат не кешируется
+        if _credential_cache_version == version:
+            _credential_cache[key] = candidates
+            if len(_credential_cache) > CREDENTIAL_CACHE_SIZE:
+                _credential_cache.popitem(last=False)
+    return candidates
+
+def get_user_by_credential(credential_type, value, facility=''):
+    value, facility = _normalize_credential(credential_type, value, facility)
+    if not value:
+        return None
+
+    return _pick_credential(_credential_candidates(credential_type, value, facility), credential_type, value, datetime.utcnow())
+
+def _pick_credential(candidates, credential_type, value, moment):
+    # Кандидаты упорядочены: сначала точный facility, затем идентификатор без facility
+    for credential_facility, valid_from, valid_to, user in candidates:
+        if valid_from and valid_from > moment:
+            continue
+        if valid_to and valid_to <= moment:
+            continue
+        return dict(user, credential={'type': credential_type, 'value': value, 'facility': credential_facility})
+    return None
+
+@db_timed
+def add_credential(user_id, credential_type, value, facility='', valid_from=None, valid_to=None):
+    value, facility = _normalize_credential(credential_type, value, facility)
+    if not value:
+        raise ValueError("Пустое значение идентификатора")
+    valid_from, valid_to = (
+        moment.strftime(CREDENTIAL_TIME_FORMAT) if moment else None
+        for moment in (parse_credential_time(valid_from), parse_credential_time(valid_to))
+    )
+
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
+    try:
+        cursor.execute('''
+        INSERT INTO Credentials (type, facility, value, user_id, valid_from, valid_to)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''', (credential_type, facility, value, user_id, valid_from, valid_to))
+        connection.commit()
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Идентификатор {credential_type} {value} уже привязан к другому пользователю")
+    finally:
+        connection.close()
 
-    cursor.execute('DELETE FROM Users WHERE id = ?', (user_id,))
+    bump_data_version('credentials')
+    return cursor.lastrowid
+
+@db_timed
+def delete_credential(credential_id):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM Credentials WHERE id = ?', (credential_id,))
     connection.commit()
     connection.close()
+    bump_data_version('credentials')
 
-def update_user(user_id, **kwargs):
+@db_timed
+def get_user_credentials(user_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
+    cursor.execute('''
+    SELECT id, type, facility, value, valid_from, valid_to, created_at
+    FROM Credentials WHERE user_id = ? ORDER BY type, created_at
+    ''', (user_id,))
+    rows = cursor.fetchall()
+    connection.close()
 
-    if not kwargs:
-        connection.close()
-        return
+    return [{
+        'id': row[0],
+        'type': row[1],
+        'facility': row[2],
+        'value': row[3],
+        'valid_from': row[4],
+        'valid_to': row[5],
+        'created_at': row[6]
+    } for row in rows]
+
+@db_timed
+def get_credential_values(credential_type):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('SELECT DISTINCT value FROM Credentials WHERE type = ?', (credential_type,))
+    values = [row[0] for row in cursor.fetchall()]
+    connection.close()
+    return values
 
-    set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-    values = list(kwargs.values())
-    values.append(user_id)
+def _raise_credential_conflict(error):
+    if 'Credentials' in str(error):
+        raise ValueError("Карта, PIN или номер автомобиля уже привязаны к другому пользователю") from error
 
-    cursor.execute(f'UPDATE Users SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?', values)
-    connection.commit()
+def find_credential_owners(credential_type, values):
+    normalized = [_normalize_credential(credential_type, value)[0] for value in values]
+    normalized = [value for value in normalized if value]
+    owners = {}
+    if not normalized:
+        return owners
+
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    for start in range(0, len(normalized), 500):
+        part = normalized[start:start + 500]
+        cursor.execute(
+            f"SELECT value, user_id FROM Credentials WHERE type = ? AND facility = '' AND value IN ({','.join(['?'] * len(part))})",
+            [credential_type] + part
+        )
+        owners.update(cursor.fetchall())
     connection.close()
+    return owners
 
-def get_user_by_id(user_id):
+@db_timed
+def count_users():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
-    cursor.execute('SELECT * FROM Users WHERE id = ? COLLATE NOCASE', (user_id,))
-    user_data = cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) FROM Users')
+    count = cursor.fetchone()[0]
 
     connection.close()
+    return count
 
-    if user_data:
-        return {
-            'name': user_data[0],
-            'id': user_data[1],
-            'status': user_data[2],
-            'groups': user_data[3],
-            'creds': user_data[4],
-            'pin': user_data[5],
-            'cardcode': user_data[6],
-            'liplate': user_data[7],
-            'role': user_data[8],
-            'created_at': user_data[9],
-            'updated_at': user_data[10]
-        }
-    return None
+@db_timed
+def search_users(query='', after=None, limit=50, fields=None):
+    fields = [f for f in (fields or DIRECTORY_FIELDS) if f in DIRECTORY_FIELDS]
+    for required in ('id', 'name'):
+        if required not in fields:
+            fields.append(required)
 
-def get_user_by_card(card_number):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
-    cursor.execute('SELECT * FROM Users WHERE cardcode = ?', (card_number,))
-    user_data = cursor.fetchone()
+    columns = ', '.join(f'u.{field}' for field in fields)
+    sql = f'SELECT {columns} FROM Users u'
+    conditions = []
+    params = []
 
+    query = (query or '').strip()
+    if len(query) >= 3:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'UsersSearch'")
+        if cursor.fetchone():
+            sql += ' JOIN UsersSearch s ON s.rowid = u.rowid'
+            conditions.append('UsersSearch MATCH ?')
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            conditions.append("(u.name LIKE ? OR u.id LIKE ? OR u.cardcode LIKE ?)")
+            params.extend([f'%{query}%'] * 3)
+    elif query:
+        upper = query + '\uffff'
+        conditions.append('''(
+            (u.name >= ? COLLATE NOCASE AND u.name < ? COLLATE NOCASE)
+            OR (u.id >= ? AND u.id < ?)
+            OR (u.cardcode >= ? AND u.cardcode < ?)
+        )''')
+        params.extend([query, upper] * 3)
+
+    if after:
+        conditions.append('(u.name, u.id) > (?, ?)')
+        params.extend(after)
+
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY u.name, u.id LIMIT ?'
+    params.append(limit + 1)
+
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
     connection.close()
 
-    if user_data:
-        return {
-            'name': user_data[0],
-            'id': user_data[1],
-            'status': user_data[2],
-            'groups': user_data[3],
-            'creds': user_data[4],
-            'pin': user_data[5],
-            'cardcode': user_data[6],
-            'liplate': user_data[7],
-            'role': user_data[8],
-            'created_at': user_data[9],
-            'updated_at': user_data[10]
+    users = [dict(zip(fields, row)) for row in rows[:limit]]
+    next_after = None
+    if len(rows) > limit:
+        next_after = (users[-1]['name'], users[-1]['id'])
+
+    return users, next_after
+
+def iter_users(batch_size=1000):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f'SELECT {", ".join(USER_FIELDS)} FROM Users ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(USER_FIELDS, row))
+    finally:
+        connection.close()
+
+@db_timed
+def bulk_upsert_users(users, chunk_size=1000, dry_run=False):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    upsert_query = f'''
+    INSERT INTO Users ({", ".join(USER_FIELDS)})
+    VALUES ({", ".join(["?"] * len(USER_FIELDS))})
+    ON CONFLICT(id) DO UPDATE SET
+        {", ".join(f"{field} = excluded.{field}" for field in USER_FIELDS if field != 'id')},
+        updated_at = CURRENT_TIMESTAMP
+    '''
+
+    stats = {'upserted': 0, 'groups_created': 0, 'chunks': 0}
+    rejected = []
+
+    credential_fields = (('card', 'cardcode', 'Карта'), ('pin', 'pin', 'PIN'), ('plate', 'liplate', 'Номер'))
+
+    def flush(chunk):
+        owners = {
+            credential_type: find_credential_owners(credential_type, [user[field] for user in chunk])
+            for credential_type, field, _ in credential_fields
         }
-    return None
 
-def get_user_by_pin(pin_code):
+        rows = []
+        group_ids = set()
+        for user in chunk:
+            conflict = None
+            for credential_type, field, label in credential_fields:
+                value = _normalize_credential(credential_type, user[field])[0]
+                owner = owners[credential_type].get(value) if value else None
+                if owner and owner != user['id']:
+                    conflict = f"{label} {user[field]} уже привязан(а) к {owner}"
+                    break
+            if conflict:
+                # line - номер строки исходного файла, если его передал вызывающий код
+                rejected.append((user['id'], conflict, user.get('line')))
+                continue
+            for credential_type, field, _ in credential_fields:
+                value = _normalize_credential(credential_type, user[field])[0]
+                if value:
+                    owners[credential_type][value] = user['id']
+            rows.append(tuple(user[field] for field in USER_FIELDS))
+            group_ids.update(g.strip() for g in user['groups'].split(',') if g.strip())
+
+        if dry_run:
+            stats['upserted'] += len(rows)
+            return
+
+        with connection:
+            before = connection.total_changes
+            cursor.executemany('INSERT OR IGNORE INTO Groups (name, id) VALUES (?, ?)',
+                               [(group_id, group_id) for group_id in sorted(group_ids)])
+            stats['groups_created'] += connection.total_changes - before
+            cursor.executemany(upsert_query, rows)
+        bump_data_version('users', 'groups', 'credentials')
+        _notify_change('users', [row[USER_FIELDS.index('id')] for row in rows])
+        stats['upserted'] += len(rows)
+        stats['chunks'] += 1
+
+    try:
+        chunk = []
+        for user in users:
+            chunk.append(user)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        connection.close()
+
+    stats['rejected'] = rejected
+    return stats
+
+@db_timed
+def add_user(name, id, groups="", creds="", pin=0, cardcode="", liplate="", role="user", status="active"):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
     try:
-        pin_int = int(pin_code)
-    except ValueError:
-        pin_int = 0
+        cursor.execute('''
+        INSERT INTO Users (name, id, status, groups, creds, pin, cardcode, liplate, role)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, id, status, groups, creds, pin, cardcode, liplate, role))
+        connection.commit()
+    except sqlite3.IntegrityError as e:
+        _raise_credential_conflict(e)
+        raise
+    finally:
+        connection.close()
+
+    bump_data_version('users')
+    _notify_change('users', [id])
 
-    cursor.execute('SELECT * FROM Users WHERE pin = ?', (pin_int,))
+@db_timed
+def delete_user(user_id):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    cursor.execute('DELETE FROM Users WHERE id = ?', (user_id,))
+    connection.commit()
+    bump_data_version('users')
+    connection.close()
+    _notify_change('users', [user_id])
+
+@db_timed
+def update_user(user_id, **kwargs):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    if not kwargs:
+        connection.close()
+        return
+
+    legacy_fields = [field for field in ('cardcode', 'pin', 'liplate') if field in kwargs]
+    if legacy_fields:
+        cursor.execute(f'SELECT {", ".join(legacy_fields)} FROM Users WHERE id = ?', (user_id,))
+        current = cursor.fetchone()
+        # Форма редактирования присылает все поля: неизмененные идентификаторы не перезаписываются
+        # и не проверяются заново, даже если при миграции они оказались заняты другим пользователем
+        for field, value in zip(legacy_fields, current or ()):
+            if str(kwargs[field]) == str(value):
+                del kwargs[field]
+
+    assignments = [f"{key} = ?" for key in kwargs] + ['updated_at = CURRENT_TIMESTAMP']
+    values = list(kwargs.values())
+    values.append(user_id)
+
+    try:
+        cursor.execute(f'UPDATE Users SET {", ".join(assignments)} WHERE id = ?', values)
+        connection.commit()
+    except sqlite3.IntegrityError as e:
+        _raise_credential_conflict(e)
+        raise
+    finally:
+        connection.close()
+
+    bump_data_version('users')
+    _notify_change('users', [user_id])
+
+@db_timed
+def get_user_by_id(user_id):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    cursor.execute('SELECT * FROM Users WHERE id = ? COLLATE NOCASE', (user_id,))
     user_data = cursor.fetchone()
 
     connection.close()
@@ -254,64 +825,100 @@ def get_user_by_pin(pin_code):
         }
     return None
 
-def add_door_schedule(door_id, schedule_name, start_time, end_time,
-                     weekdays='1111111', access_type='allow_all'):
-    start_time = start_time.strip()
-    end_time = end_time.strip()
+@db_timed
+def get_user_by_card(card_number, facility_code=''):
+    return get_user_by_credential('card', card_number, facility_code)
 
-    import re
-    time_pattern = r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$'
+@db_timed
+def get_user_by_pin(pin_code):
+    return get_user_by_credential('pin', pin_code)
 
-    if not re.match(time_pattern, start_time) or not re.match(time_pattern, end_time):
-        raise ValueError(f"Неверный формат времени. Должно быть HH:MM, получено: {start_time}, {end_time}")
+@db_timed
+def get_user_by_plate(plate):
+    return get_user_by_credential('plate', plate)
 
-    start_utc = start_time
-    end_utc = end_time
+@db_timed
+def add_door_schedule(door_id, schedule_name, start_time, end_time,
+                     weekdays='1111111', access_type='allow_all', holidays='ignore',
+                     tz_name=schedules.DEFAULT_TIMEZONE):
+    # Время хранится как HH:MM в часовом поясе tz_name; конец раньше начала - окно через полночь
+    tz_name = schedules.get_timezone(tz_name).zone
+    start_minutes = schedules.parse_time(start_time)
+    end_minutes = schedules.parse_time(end_time)
+    weekdays = schedules.normalize_weekdays(weekdays)
+    if holidays not in schedules.HOLIDAY_MODES:
+        raise ValueError(f"Неверный режим праздников: {holidays}")
+
+    start_utc = f"{start_minutes // 60:02d}:{start_minutes % 60:02d}"
+    end_utc = f"{end_minutes // 60:02d}:{end_minutes % 60:02d}"
 
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
     cursor.execute('''
     INSERT OR REPLACE INTO DoorAccessSchedules
-    (door_id, schedule_name, start_time_utc, end_time_utc, weekdays, access_type)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', (door_id, schedule_name, start_utc, end_utc, weekdays, access_type))
+    (door_id, schedule_name, start_time_utc, end_time_utc, weekdays, access_type, holidays, timezone)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (door_id, schedule_name, start_utc, end_utc, weekdays, access_type, holidays, tz_name))
 
     connection.commit()
+    bump_data_version('schedules')
     connection.close()
-    print(f"Расписание '{schedule_name}' для {door_id}: {start_utc}-{end_utc} UTC")
+    print(f"Расписание '{schedule_name}' для {door_id}: {start_utc}-{end_utc} {tz_name}")
 
+@db_timed
 def is_door_in_open_hours(door_id):
-    print(f"\n=== DEBUG is_door_in_open_hours ===")
-    print(f"door_id: {door_id}")
-    
-    connection = sqlite3.connect(DB_NAME)
-    cursor = connection.cursor()
-    
-    current_utc = datetime.utcnow()
-    current_time = current_utc.strftime('%H:%M')
-    current_weekday = current_utc.weekday()
-    print(f"current_time (UTC): {current_time}")
-    print(f"current_weekday: {current_weekday}")
-    
-    query = '''
-    SELECT access_type
+    return door_schedule_access(schedules.get_door_hours(door_id), datetime.utcnow())
+
+@db_timed
+def get_active_door_schedules():
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('''
+    SELECT id, door_id, schedule_name, start_time_utc, end_time_utc, weekdays, access_type, holidays, timezone
     FROM DoorAccessSchedules
-    WHERE door_id = ?
-    AND is_active = 1
-    AND ? BETWEEN start_time_utc AND end_time_utc
-    AND substr(weekdays, ?, 1) = '1'
-    LIMIT 1
-    '''
-    
-    cursor.execute(query, (door_id, current_time, current_weekday + 1))
-    result = cursor.fetchone()
-    print(f"SQL result: {result}")
-    
+    WHERE is_active = 1
+    ORDER BY id
+    ''')
+    rows = cursor.fetchall()
+    connection.close()
+    return rows
+
+@db_timed
+def get_holidays():
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('SELECT date, name FROM Holidays ORDER BY date')
+    holidays = [{'date': row[0], 'name': row[1]} for row in cursor.fetchall()]
+    connection.close()
+    return holidays
+
+def get_holiday_dates():
+    return [holiday['date'] for holiday in get_holidays()]
+
+@db_timed
+def add_holiday(day, name=''):
+    day = schedules._parse_date(day)
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('INSERT OR REPLACE INTO Holidays (date, name) VALUES (?, ?)', (day, name or ''))
+    connection.commit()
+    bump_data_version('holidays')
+    connection.close()
+    return day
+
+@db_timed
+def delete_holiday(day):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM Holidays WHERE date = ?', (day,))
+    deleted = cursor.rowcount
+    connection.commit()
+    bump_data_version('holidays')
     connection.close()
-    
-    return result[0] if result else None
+    return deleted > 0
 
+@db_timed
 def delete_door_schedule(schedule_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -319,9 +926,11 @@ def delete_door_schedule(schedule_id):
     cursor.execute('DELETE FROM DoorAccessSchedules WHERE id = ?', (schedule_id,))
 
     connection.commit()
+    bump_data_version('schedules')
     connection.close()
     print(f"Удалено расписание с ID: {schedule_id}")
 
+@db_timed
 def get_groups():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -344,6 +953,7 @@ def get_groups():
     connection.close()
     return Groups
 
+@db_timed
 def add_group(name, id, status="active", peo="", description=""):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -354,16 +964,25 @@ def add_group(name, id, status="active", peo="", description=""):
     ''', (name, id, status, peo, description))
 
     connection.commit()
+    bump_data_version('groups')
     connection.close()
 
+@db_timed
 def delete_group(group_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
+    cursor.execute('SELECT device_id FROM DoorPermissions WHERE group_id = ?', (group_id,))
+    device_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute('DELETE FROM DoorPermissions WHERE group_id = ?', (group_id,))
     cursor.execute('DELETE FROM Groups WHERE id = ?', (group_id,))
     connection.commit()
+    bump_data_version('groups', 'permissions')
     connection.close()
+    if device_ids:
+        _notify_change('doors', device_ids)
 
+@db_timed
 def update_group(group_id, **kwargs):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -378,8 +997,10 @@ def update_group(group_id, **kwargs):
 
     cursor.execute(f'UPDATE Groups SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?', values)
     connection.commit()
+    bump_data_version('groups')
     connection.close()
 
+@db_timed
 def get_group_by_id(group_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -401,6 +1022,7 @@ def get_group_by_id(group_id):
         }
     return None
 
+@db_timed
 def add_user_to_group(user_id, group_id):
     user = get_user_by_id(user_id)
     if not user:
@@ -411,6 +1033,7 @@ def add_user_to_group(user_id, group_id):
         new_groups = current_groups + f",{group_id}" if current_groups else group_id
         update_user(user_id, groups=new_groups)
 
+@db_timed
 def remove_user_from_group(user_id, group_id):
     user = get_user_by_id(user_id)
     if not user:
@@ -423,6 +1046,7 @@ def remove_user_from_group(user_id, group_id):
         new_groups = ','.join(group_list)
         update_user(user_id, groups=new_groups)
 
+@db_timed
 def register_device(device_id, name=None, ip_address=None):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -448,6 +1072,11 @@ def register_device(device_id, name=None, ip_address=None):
     connection.commit()
     connection.close()
 
+    if not existing:
+        bump_data_version('doors')
+        _notify_change('doors', [device_id])
+
+@db_timed
 def update_device_last_seen(device_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -457,8 +1086,36 @@ def update_device_last_seen(device_id):
     ''', (datetime.now().isoformat(), device_id))
 
     connection.commit()
+    # Версия не меняется: время последней связи обновляется каждым сообщением устройства,
+    # а кешированный список дверей и так перестраивается не реже раза в api_cache.MAX_AGE
+    connection.close()
+
+def _door_from_row(row):
+    return {
+        'device_id': row[0],
+        'name': row[1],
+        'location': row[2],
+        'description': row[3],
+        'status': row[4],
+        'auto_created': bool(row[5]),
+        'last_seen': row[6],
+        'created_at': row[7],
+        'updated_at': row[8],
+        'zone_from': row[9],
+        'zone_to': row[10],
+        'anti_passback': bool(row[11])
+    }
+
+@db_timed
+def get_door_zones():
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute("SELECT device_id, zone_from, zone_to, anti_passback FROM Doors WHERE zone_from != '' OR zone_to != ''")
+    zones = {row[0]: (row[1], row[2], bool(row[3])) for row in cursor.fetchall()}
     connection.close()
+    return zones
 
+@db_timed
 def get_all_doors():
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -468,21 +1125,12 @@ def get_all_doors():
 
     doors = []
     for door in doors_data:
-        doors.append({
-            'device_id': door[0],
-            'name': door[1],
-            'location': door[2],
-            'description': door[3],
-            'status': door[4],
-            'auto_created': bool(door[5]),
-            'last_seen': door[6],
-            'created_at': door[7],
-            'updated_at': door[8]
-        })
+        doors.append(_door_from_row(door))
 
     connection.close()
     return doors
 
+@db_timed
 def get_door_by_device_id(device_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -493,19 +1141,10 @@ def get_door_by_device_id(device_id):
     connection.close()
 
     if door_data:
-        return {
-            'device_id': door_data[0],
-            'name': door_data[1],
-            'location': door_data[2],
-            'description': door_data[3],
-            'status': door_data[4],
-            'auto_created': bool(door_data[5]),
-            'last_seen': door_data[6],
-            'created_at': door_data[7],
-            'updated_at': door_data[8]
-        }
+        return _door_from_row(door_data)
     return None
 
+@db_timed
 def add_door(device_id, name, location="", description="", status="active", auto_created=False):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -516,8 +1155,11 @@ def add_door(device_id, name, location="", description="", status="active", auto
     ''', (device_id, name, location, description, status, 1 if auto_created else 0))
 
     connection.commit()
+    bump_data_version('doors')
     connection.close()
+    _notify_change('doors', [device_id])
 
+@db_timed
 def update_door(device_id, **kwargs):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -532,8 +1174,11 @@ def update_door(device_id, **kwargs):
 
     cursor.execute(f'UPDATE Doors SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE device_id = ?', values)
     connection.commit()
+    bump_data_version('doors')
     connection.close()
+    _notify_change('doors', [device_id])
 
+@db_timed
 def delete_door(device_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -542,9 +1187,16 @@ def delete_door(device_id):
     cursor.execute('DELETE FROM Doors WHERE device_id = ?', (device_id,))
 
     connection.commit()
+    bump_data_version('doors', 'permissions')
     connection.close()
+    _notify_change('doors', [device_id])
 
+@db_timed
 def set_door_permission(group_id, device_id, permission_type="allow", schedule="{}"):
+    if not isinstance(schedule, str):
+        schedule = json.dumps(schedule, ensure_ascii=False)
+    schedules.validate_schedule(schedule)
+
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
@@ -568,24 +1220,48 @@ def set_door_permission(group_id, device_id, permission_type="allow", schedule="
         ''', (group_id, device_id, permission_type, schedule))
 
     connection.commit()
+    bump_data_version('permissions')
     connection.close()
+    _notify_change('doors', [device_id])
 
+@db_timed
 def delete_door_permission(permission_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
+    cursor.execute('SELECT device_id FROM DoorPermissions WHERE id = ?', (permission_id,))
+    row = cursor.fetchone()
     cursor.execute('DELETE FROM DoorPermissions WHERE id = ?', (permission_id,))
     connection.commit()
+    bump_data_version('permissions')
     connection.close()
+    if row:
+        _notify_change('doors', [row[0]])
 
+@db_timed
 def delete_door_permission_by_ids(group_id, device_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
 
     cursor.execute('DELETE FROM DoorPermissions WHERE group_id = ? AND device_id = ?', (group_id, device_id))
     connection.commit()
+    bump_data_version('permissions')
+    connection.close()
+    _notify_change('doors', [device_id])
+
+@db_timed
+def get_door_permission_by_id(permission_id):
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    cursor.execute('SELECT id, group_id, device_id, permission_type FROM DoorPermissions WHERE id = ?', (permission_id,))
+    row = cursor.fetchone()
     connection.close()
 
+    if row:
+        return {'id': row[0], 'group_id': row[1], 'device_id': row[2], 'permission_type': row[3]}
+    return None
+
+@db_timed
 def get_door_permissions(device_id=None, group_id=None):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -635,204 +1311,339 @@ def get_door_permissions(device_id=None, group_id=None):
 
     return permissions
 
-def check_user_access(user, device_id, access_type='card'):
-    print(f"\n=== DEBUG check_user_access ===")
-    print(f"device_id: {device_id}")
-    print(f"access_type: {access_type}")
-    print(f"user: {user}")
-    
+def schedule_allows(schedule, moment):
+    return schedules.compile_schedule(schedule).allows(moment)
+
+def door_schedule_access(door_schedules, moment):
+    # door_schedules: (расписание, access_type, ...) активных расписаний двери
+    for entry in door_schedules:
+        if entry[0].allows(moment):
+            return entry[1]
+    return None
+
+# Коды причин для метрик и статистики: число значений ограничено, в отличие от текста сообщений
+ACCESS_REASON_CODES = {
+    "Свободный доступ (рабочие часы)": 'free_access',
+    "Пользователь не найден": 'user_not_found',
+    "Пользователь не активен": 'user_inactive',
+    "Карта не привязана": 'no_card',
+    "PIN не установлен": 'no_pin',
+    "Номер автомобиля не привязан": 'no_plate',
+    "Дверь не найдена": 'door_not_found',
+    "Дверь не активна": 'door_inactive',
+    "Пользователь не состоит в группах": 'no_groups',
+    "Нет разрешений для доступа": 'no_permission',
+    "Доступ разрешен": 'granted',
+    "Доступ запрещен (явный запрет)": 'explicit_deny',
+    "Доступ запрещен (не в разрешенное время)": 'outside_schedule',
+    "Доступ запрещен": 'denied',
+}
+
+def access_reason_code(message):
+    return ACCESS_REASON_CODES.get(message, 'other')
+
+def decide_access(user, door, permission, door_schedule=None, access_type='card', moment=None):
+    # Решение о доступе без обращений к БД: permission - (permission_type, schedule) первой
+    # подходящей записи DoorPermissions (запреты в приоритете) или None
+    moment = moment or datetime.utcnow()
+
+    if door_schedule == 'allow_all' and door and door.get('status') == 'active':
+        return True, "Свободный доступ (рабочие часы)"
 
-    door_schedule = is_door_in_open_hours(device_id)
-    print(f"door_schedule result: {door_schedule}")
-    
-    if door_schedule == 'allow_all':
-        door = get_door_by_device_id(device_id)
-        if door and door.get('status') == 'active':
-            print(f"DEBUG: Свободный доступ (рабочие часы)")
-            return True, "Свободный доступ (рабочие часы)"
-    
     if not user:
-        print(f"DEBUG: Пользователь не найден")
         return False, "Пользователь не найден"
-    
-    print(f"user status: {user.get('status', '')}")
+
     if user.get('status', '').lower() != 'active':
-        print(f"DEBUG: Пользователь не активен")
         return False, "Пользователь не активен"
-    
+
+    credential = user.get('credential') or {}
     if access_type == 'card':
-        print(f"user cardcode: {user.get('cardcode')}")
-        if not user.get('cardcode'):
-            print(f"DEBUG: Карта не привязана")
+        if not user.get('cardcode') and credential.get('type') != 'card':
             return False, "Карта не привязана"
     elif access_type == 'pin':
-        print(f"user pin: {user.get('pin')}")
-        if not user.get('pin') or user.get('pin') == 0:
-            print(f"DEBUG: PIN не установлен")
+        if (not user.get('pin') or user.get('pin') == 0) and credential.get('type') != 'pin':
             return False, "PIN не установлен"
-    
+    elif access_type == 'plate':
+        if not user.get('liplate') and credential.get('type') != 'plate':
+            return False, "Номер автомобиля не привязан"
 
-    door = get_door_by_device_id(device_id)
-    print(f"door exists: {bool(door)}")
-    
     if not door:
-        register_device(device_id)
-        door = get_door_by_device_id(device_id)
-        print(f"door after registration: {door}")
-        
-        if not door:
-            print(f"DEBUG: Дверь не найдена")
-            return False, "Дверь не найдена"
-    
-    print(f"door status: {door.get('status', '')}")
+        return False, "Дверь не найдена"
+
     if door.get('status', '').lower() != 'active':
-        print(f"DEBUG: Дверь не активна")
         return False, "Дверь не активна"
-    
-    user_groups = user.get('groups', '')
-    print(f"user groups raw: '{user_groups}'")
-    group_list = [g.strip() for g in user_groups.split(',') if g.strip()]
-    print(f"user group list: {group_list}")
-    
+
+    group_list = [g.strip() for g in user.get('groups', '').split(',') if g.strip()]
     if not group_list:
-        print(f"DEBUG: Пользователь не состоит в группах")
         return False, "Пользователь не состоит в группах"
-    
-    connection = sqlite3.connect(DB_NAME)
-    cursor = connection.cursor()
-    
-    placeholders = ','.join(['?'] * len(group_list))
-    
-    query = f'''
-    SELECT permission_type, schedule
-    FROM DoorPermissions
-    WHERE group_id IN ({placeholders}) AND device_id = ?
-    ORDER BY CASE WHEN permission_type = 'deny' THEN 1 ELSE 2 END
-    LIMIT 1
-    '''
-    
-    params = group_list + [device_id]
-    print(f"SQL query: {query}")
-    print(f"SQL params: {params}")
-    
-    cursor.execute(query, params)
-    result = cursor.fetchone()
-    print(f"SQL result: {result}")
-    
-    connection.close()
-    
-    if result:
-        permission_type = result[0]
-        schedule_json = result[1]
-        
-        try:
-            schedule = json.loads(schedule_json) if schedule_json else {}
-        except:
-            schedule = {}
-        
-        print(f"permission_type: {permission_type}")
-        print(f"schedule: {schedule}")
-        
-        has_access_now = check_schedule_access(schedule)
-        print(f"schedule access: {has_access_now}")
-        
-        if permission_type == 'allow' and has_access_now:
-            print(f"DEBUG: Доступ разрешен")
-            return True, "Доступ разрешен"
-        else:
-            reason = "Доступ запрещен"
-            if permission_type == 'deny':
-                reason = "Доступ запрещен (явный запрет)"
-            elif not has_access_now:
-                reason = "Доступ запрещен (не в разрешенное время)"
+
+    if not permission:
+        return False, "Нет разрешений для доступа"
+
+    permission_type, schedule = permission
+    has_access_now = schedule_allows(schedule, moment)
+
+    if permission_type == 'allow' and has_access_now:
+        return True, "Доступ разрешен"
+    if permission_type == 'deny':
+        return False, "Доступ запрещен (явный запрет)"
+    if not has_access_now:
+        return False, "Доступ запрещен (не в разрешенное время)"
+    return False, "Доступ запрещен"
+
+@db_timed
+def check_user_access(user, device_id, access_type='card'):
+    print(f"\n=== DEBUG check_user_access ===")
+    print(f"device_id: {device_id}, access_type: {access_type}, user: {user.get('id') if user else None}")
+
+    door_schedule = is_door_in_open_hours(device_id)
+    door = get_door_by_device_id(device_id)
+
+    if not door:
+        # Неизвестное устройство регистрируется, только если до проверки двери дошло
+        has_access, reason = decide_access(user, None, None, door_schedule, access_type)
+        if reason != "Дверь не найдена":
             print(f"DEBUG: {reason}")
-            return False, reason
-    
-    print(f"DEBUG: Нет разрешений для доступа")
-    return False, "Нет разрешений для доступа"
+            return has_access, reason
+        register_device(device_id)
+        door = get_door_by_device_id(device_id)
 
-def check_schedule_access(schedule):
-    print(f"\n=== DEBUG check_schedule_access ===")
-    print(f"schedule: {schedule}")
-    
-    if not schedule:
-        print(f"Empty schedule, returning True")
-        return True
-    
-
-    if 'always' in schedule:
-        always_value = schedule['always']
-
-        if (isinstance(always_value, str) and always_value.lower() == "true") or \
-           (isinstance(always_value, bool) and always_value):
-            print(f"Schedule has 'always' = true/True")
-            return True
-    
-    current_utc = datetime.utcnow()
-    current_hour = current_utc.hour
-    current_minute = current_utc.minute
-    current_time_str = f"{current_hour:02d}:{current_minute:02d}"
-    print(f"current_time_str: {current_time_str}")
-    
-    if 'time_range' in schedule:
-        start = schedule['time_range'].get('start', '00:00')
-        end = schedule['time_range'].get('end', '23:59')
-        print(f"time_range: {start} - {end}")
-        
-        result = start <= current_time_str <= end
-        print(f"time in range: {result}")
-        return result
-    
-
-    print(f"No 'always' or 'time_range' in schedule, returning False")
-    return False
+    permission = None
+    group_list = [g.strip() for g in (user or {}).get('groups', '').split(',') if g.strip()]
+    if door and group_list:
+        connection = sqlite3.connect(DB_NAME)
+        cursor = connection.cursor()
+        placeholders = ','.join(['?'] * len(group_list))
+        cursor.execute(f'''
+        SELECT permission_type, schedule
+        FROM DoorPermissions
+        WHERE group_id IN ({placeholders}) AND device_id = ?
+        ORDER BY CASE WHEN permission_type = 'deny' THEN 1 ELSE 2 END, id
+        LIMIT 1
+        ''', group_list + [device_id])
+        result = cursor.fetchone()
+        connection.close()
+        if result:
+            permission = (result[0], schedules.compile_schedule(result[1]))
 
-def get_accessible_doors_for_user(user_id):
-    user = get_user_by_id(user_id)
-    if not user or user.get('status', '').lower() != 'active':
-        return []
+    has_access, reason = decide_access(user, door, permission, door_schedule, access_type)
+    print(f"DEBUG: {reason}")
+    return has_access, reason
 
-    user_groups = user.get('groups', '')
-    if not user_groups:
-        return []
+def _select_in(cursor, query, column, values):
+    if values is None:
+        cursor.execute(query)
+        yield from cursor.fetchall()
+        return
+    values = sorted(values)
+    for start in range(0, len(values), 500):
+        part = values[start:start + 500]
+        cursor.execute(f"{query} AND {column} IN ({','.join(['?'] * len(part))})", part)
+        yield from cursor.fetchall()
+
+def load_access_policy(device_ids=None, user_ids=None, db_name=None):
+    # Снимок данных, от которых зависит решение о доступе (None - все двери или пользователи)
+    connection = sqlite3.connect(db_name or DB_NAME)
+    cursor = connection.cursor()
+    policy = {'doors': {}, 'rules': {}, 'door_schedules': {}, 'users': {}}
+
+    for row in _select_in(cursor, 'SELECT * FROM Doors WHERE 1=1', 'device_id', device_ids):
+        policy['doors'][row[0]] = _door_from_row(row)
+
+    rows = sorted(_select_in(
+        cursor, 'SELECT id, device_id, group_id, permission_type, schedule FROM DoorPermissions WHERE 1=1', 'device_id', device_ids
+    ))
+    for rule_id, device_id, group_id, permission_type, schedule in rows:
+        group_rules = policy['rules'].setdefault(device_id, {})
+        if group_id not in group_rules or (permission_type == 'deny' and group_rules[group_id][0] != 'deny'):
+            group_rules[group_id] = (permission_type, schedules.compile_schedule(schedule), rule_id)
+
+    rows = sorted(_select_in(
+        cursor,
+        'SELECT id, door_id, schedule_name, start_time_utc, end_time_utc, weekdays, access_type, holidays, timezone '
+        'FROM DoorAccessSchedules WHERE is_active = 1',
+        'door_id', device_ids
+    ))
+    for schedule_id, door_id, name, start, end, weekdays, access_type, holidays, tz_name in rows:
+        policy['door_schedules'].setdefault(door_id, []).append(
+            (schedules.compile_door_hours(start, end, weekdays, holidays, tz_name), access_type, schedule_id, name)
+        )
+
+    for row in _select_in(cursor, 'SELECT * FROM Users WHERE 1=1', 'lower(id)', user_ids):
+        policy['users'][row[1].lower()] = _user_from_row(row)
+
+    connection.close()
+    return policy
+
+def evaluate_policy_access(policy, user, device_id, access_type='card', moment=None, schedule_cache=None):
+    moment = moment or datetime.utcnow()
+    # Праздники, исключения и переход на летнее время зависят от даты: ключ - минута UTC
+    key = (device_id, moment.replace(second=0, microsecond=0))
+    if schedule_cache is not None and key in schedule_cache:
+        door_schedule = schedule_cache[key]
+    else:
+        door_schedule = door_schedule_access(policy['door_schedules'].get(device_id, ()), moment)
+        if schedule_cache is not None:
+            schedule_cache[key] = door_schedule
 
-    group_list = [g.strip() for g in user_groups.split(',') if g.strip()]
+    # Как в check_user_access: запрет в приоритете, иначе самое раннее разрешение
+    door_rules = policy['rules'].get(device_id, {})
+    matched = [door_rules[g] for g in {g.strip() for g in (user or {}).get('groups', '').split(',')} if g in door_rules]
+    permission = min(matched, key=lambda rule: (rule[0] != 'deny', rule[2]))[:2] if matched else None
 
+    return decide_access(user, policy['doors'].get(device_id), permission, door_schedule, access_type, moment)
+
+def _credential_candidates_batch(requested):
+    # requested: множество (type, value, facility); один запрос на тип и порцию значений вместо поиска на каждую проверку
+    values_by_type = {}
+    for credential_type, value, facility in requested:
+        values_by_type.setdefault(credential_type, set()).add(value)
+
+    found = {}
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
+    for credential_type, values in sorted(values_by_type.items()):
+        values = sorted(values)
+        for start in range(0, len(values), 500):
+            part = values[start:start + 500]
+            cursor.execute(f'''
+            SELECT c.value, c.facility, c.valid_from, c.valid_to, u.*
+            FROM Credentials c
+            JOIN Users u ON u.id = c.user_id
+            WHERE c.type = ? AND c.value IN ({','.join(['?'] * len(part))})
+            ORDER BY c.facility DESC
+            ''', [credential_type] + part)
+            for row in cursor.fetchall():
+                found.setdefault((credential_type, row[0]), []).append((
+                    row[1],
+                    _stored_credential_time(row[2], datetime.max),
+                    _stored_credential_time(row[3], datetime.min),
+                    _user_from_row(row[4:])
+                ))
+    connection.close()
 
-    placeholders = ','.join(['?'] * len(group_list))
+    return {
+        (credential_type, value, facility): [
+            candidate for candidate in found.get((credential_type, value), ()) if candidate[0] in (facility, '')
+        ]
+        for credential_type, value, facility in requested
+    }
+
+@db_timed
+def evaluate_access_batch(checks):
+    # checks: словари с user_id или card_number/pin_code/plate, device_id, timestamp, access_type
+    policy = load_access_policy(
+        {check.get('device_id') for check in checks if check.get('device_id')},
+        {str(check['user_id']).lower() for check in checks if check.get('user_id')}
+    )
 
-    query = f'''
-    SELECT DISTINCT d.*
-    FROM Doors d
-    JOIN DoorPermissions dp ON d.device_id = dp.device_id
-    WHERE dp.group_id IN ({placeholders})
-    AND dp.permission_type = 'allow'
-    AND d.status = 'active'
-    ORDER BY d.name
-    '''
+    now = datetime.utcnow()
+    moments = []
+    credentials = []
+    for index, check in enumerate(checks):
+        try:
+            moments.append(_parse_moment(check.get('timestamp')) or now)
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError(f"Некорректное время в проверке {index}: {check.get('timestamp')}")
+
+        if check.get('user_id'):
+            credentials.append(None)
+        elif check.get('card_number'):
+            credentials.append(('card',) + _normalize_credential('card', check['card_number'], check.get('facility_code')))
+        elif check.get('pin_code'):
+            credentials.append(('pin',) + _normalize_credential('pin', check['pin_code']))
+        elif check.get('plate'):
+            credentials.append(('plate', check['plate'], ''))
+        else:
+            credentials.append(None)
+
+    # Идентификаторы всех проверок читаются сразу; для номеров - все близкие значения из индекса
+    requested = set()
+    for credential in credentials:
+        if credential and credential[0] == 'plate':
+            requested.update(('plate', value, '') for value in get_plate_index().search(credential[1])[1])
+        elif credential and credential[1]:
+            requested.add(credential)
+    candidates = _credential_candidates_batch(requested) if requested else {}
+
+    schedule_cache = {}
+    results = []
+    for check, moment, credential in zip(checks, moments, credentials):
+        device_id = check.get('device_id')
+        if check.get('user_id'):
+            user = policy['users'].get(str(check['user_id']).lower())
+            access_type = check.get('access_type', 'card')
+        elif credential and credential[0] == 'plate':
+            user = find_user_by_plate(
+                credential[1], lambda value: _pick_credential(candidates.get(('plate', value, ''), ()), 'plate', value, moment)
+            )[0]
+            access_type = 'plate'
+        elif credential:
+            user = _pick_credential(candidates.get(credential, ()), credential[0], credential[1], moment)
+            access_type = credential[0]
+        else:
+            user = None
+            access_type = check.get('access_type', 'card')
+
+        has_access, reason = evaluate_policy_access(policy, user, device_id, access_type, moment, schedule_cache)
+        results.append({
+            'device_id': device_id,
+            'user_id': user.get('id') if user else None,
+            'timestamp': moment.isoformat(),
+            'success': has_access,
+            'reason': reason
+        })
+    return results
+
+def _parse_moment(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@db_timed
+def check_schedule_access(schedule):
+    return schedule_allows(schedule, datetime.utcnow())
+
+@db_timed
+def get_accessible_doors_for_user(user_id):
+    from permission_matrix import get_doors_for_user
+
+    device_ids = get_doors_for_user(user_id)
+    if not device_ids:
+        return []
 
-    cursor.execute(query, group_list)
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+
+    placeholders = ','.join(['?'] * len(device_ids))
+    cursor.execute(f'SELECT * FROM Doors WHERE device_id IN ({placeholders}) ORDER BY name', device_ids)
     doors_data = cursor.fetchall()
 
     doors = []
     for door in doors_data:
-        doors.append({
-            'device_id': door[0],
-            'name': door[1],
-            'location': door[2],
-            'description': door[3],
-            'status': door[4],
-            'auto_created': bool(door[5]),
-            'last_seen': door[6],
-            'created_at': door[7],
-            'updated_at': door[8]
-        })
+        doors.append(_door_from_row(door))
 
     connection.close()
     return doors
 
+@db_timed
+def get_user_names(user_ids):
+    names = {}
+    connection = sqlite3.connect(DB_NAME)
+    cursor = connection.cursor()
+    for start in range(0, len(user_ids), 500):
+        part = list(user_ids[start:start + 500])
+        cursor.execute(f'SELECT id, name FROM Users WHERE id IN ({",".join(["?"] * len(part))})', part)
+        names.update(cursor.fetchall())
+    connection.close()
+    return names
+
+@db_timed
 def get_groups_for_door(device_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -869,9 +1680,11 @@ def get_groups_for_door(device_id):
 
     return groups
 
+@db_timed
 def get_user_access_logs(user_id, limit=100):
     return []
 
+@db_timed
 def delete_door_schedule(schedule_id):
     connection = sqlite3.connect(DB_NAME)
     cursor = connection.cursor()
@@ -879,8 +1692,10 @@ def delete_door_schedule(schedule_id):
     cursor.execute('DELETE FROM DoorAccessSchedules WHERE id = ?', (schedule_id,))
 
     connection.commit()
+    bump_data_version('schedules')
     connection.close()
 
+@db_timed
 def migrate_data():
     print("Начинаем миграцию данных в firo_access.db...")
 
@@ -896,14 +1711,20 @@ def migrate_data():
         new_conn = sqlite3.connect(DB_NAME)
         new_cursor = new_conn.cursor()
 
-        for user in old_users:
-            try:
-                new_cursor.execute('''
-                INSERT OR REPLACE INTO Users (name, id, status, groups, creds, pin, cardcode, liplate, role)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', user)
-            except Exception as e:
-                print(f"Ошибка при переносе пользователя {user[1]}: {e}")
+        user_query = '''
+        INSERT OR REPLACE INTO Users (name, id, status, groups, creds, pin, cardcode, liplate, role)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        '''
+
+        try:
+            with new_conn:
+                new_cursor.executemany(user_query, old_users)
+        except Exception:
+            for user in old_users:
+                try:
+                    new_cursor.execute(user_query, user)
+                except Exception as e:
+                    print(f"Ошибка при переносе пользователя {user[1]}: {e}")
 
         new_conn.commit()
         new_conn.close()
@@ -920,20 +1741,28 @@ def migrate_data():
         new_conn = sqlite3.connect(DB_NAME)
         new_cursor = new_conn.cursor()
 
-        for group in old_groups:
-            try:
-                new_cursor.execute('''
-                INSERT OR REPLACE INTO Groups (name, id, status, peo)
-                VALUES (?, ?, ?, ?)
-                ''', group)
-            except Exception as e:
-                print(f"Ошибка при переносе группы {group[1]}: {e}")
+        group_query = '''
+        INSERT OR REPLACE INTO Groups (name, id, status, peo)
+        VALUES (?, ?, ?, ?)
+        '''
+
+        try:
+            with new_conn:
+                new_cursor.executemany(group_query, old_groups)
+        except Exception:
+            for group in old_groups:
+                try:
+                    new_cursor.execute(group_query, group)
+                except Exception as e:
+                    print(f"Ошибка при переносе группы {group[1]}: {e}")
 
         new_conn.commit()
         new_conn.close()
         old_conn.close()
         print(f"Перенесено {len(old_groups)} групп")
 
+    bump_data_version('users', 'groups')
+    _notify_change('users')
     print("Миграция данных завершена!")
 
 if __name__ == "__main__":
@@ -1,11 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_socketio import SocketIO, emit
 import ologger
 from login_db import Database
-from mqtt_client import init_mqtt, get_mqtt_handler
+from api_cache import cached_json_response
+import assets
+import metrics
+import profiler
+import occupancy
+import permission_matrix
+import schedules
+import realtime
+from mqtt_client import init_mqtt, stop_mqtt, get_mqtt_handler, PUBLISH_QUEUED
+from lifecycle import Lifecycle
+from shared_state import SharedDict
 import json
 from datetime import datetime
+from functools import wraps
 import time
 from datetime import datetime
 import pytz
@@ -24,10 +35,18 @@ from users_db import (
     add_user_to_group, remove_user_from_group, check_user_access
 )
 
+SERVER_HOST = '0.0.0.0'
+SERVER_PORT = 80
+# Отладчик Flask и отладочный сервер Werkzeug - только для разработки
+SERVER_DEBUG = False
+
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'
 
-socketio = SocketIO(app, cors_allowed_origins="*")
+assets.init_app(app)
+profiler.init_app(app)
+
+socketio = SocketIO(app, cors_allowed_origins="*", **realtime.socketio_options())
 
 db = Database()
 
@@ -37,18 +56,16 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Пожалуйста, войдите в систему для доступа к этой странице.'
 login_manager.login_message_category = 'info'
 
-try:
-    mqtt = init_mqtt()
-    print("MQTT обработчик инициализирован")
-except Exception as e:
-    print(f"Ошибка инициализации MQTT: {e}")
-    mqtt = None
+mqtt = None
+lifecycle = Lifecycle()
+
+SOCKETIO_CLIENTS = metrics.gauge('firo_socketio_clients', 'Подключенные Socket.IO клиенты')
 
-emergency_states = {
+emergency_states = SharedDict('emergency', {
     'evacuation': False,
     'lockdown': False,
     'normal': True
-}
+})
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -57,6 +74,7 @@ def load_user(user_id):
 @socketio.on('connect')
 def handle_connect():
     print(f"Клиент подключен: {request.sid}")
+    SOCKETIO_CLIENTS.inc()
     emit('connected', {'message': 'Подключено к серверу', 'timestamp': datetime.now().isoformat()})
     
     if mqtt:
@@ -67,13 +85,14 @@ def handle_connect():
         })
     
     emit('emergency_status', {
-        'status': emergency_states,
+        'status': emergency_states.snapshot(),
         'timestamp': datetime.now().isoformat()
     })
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"Клиент отключен: {request.sid}")
+    SOCKETIO_CLIENTS.dec()
 
 @socketio.on('open_door_request')
 def handle_open_door_request(data):
@@ -96,6 +115,55 @@ def handle_open_door_request(data):
 def log_event(msg, device="WebInterface"):
     ologger.newLog(msg, device, "FiroAccess")
 
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if getattr(current_user, 'role', None) != 'admin':
+            return jsonify({'success': False, 'message': 'Требуются права администратора'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/health/live')
+def health_live():
+    return jsonify({'alive': True})
+
+@app.route('/health/ready')
+def health_ready():
+    status = lifecycle.status()
+    status['mqtt_connected'] = bool(mqtt and mqtt.is_connected)
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/admin/profile')
+@login_required
+@admin_required
+def api_admin_profile():
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Некорректные параметры профилирования'}), 400
+
+    try:
+        stacks, samples = profiler.sample_stacks(seconds, interval)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+
+    log_event(f"Снят профиль стеков: {samples} выборок")
+    response = Response(stacks, mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    response.headers['X-Profile-Samples'] = str(samples)
+    return response
+
+@app.route('/api/admin/profile/functions')
+@login_required
+@admin_required
+def api_admin_profile_functions():
+    return jsonify(profiler.function_summary())
+
 @app.route('/door_schedules')
 @login_required
 def door_schedules():
@@ -127,9 +195,21 @@ def api_add_door_schedule():
                 'message': 'Время должно быть в формате HH:MM (24-часовой формат)'
             }), 400
         
+        weekdays = data.get('weekdays', '1111111')
+        if isinstance(weekdays, list):
+            # Страница расписаний передает номера дней как в JavaScript (0 - воскресенье)
+            weekdays = [(int(day) + 6) % 7 for day in weekdays]
+        
         from users_db import add_door_schedule
         
-        add_door_schedule(door_id, schedule_name, start_utc, end_utc)
+        try:
+            add_door_schedule(
+                door_id, schedule_name, start_utc, end_utc, weekdays,
+                data.get('access_type', 'allow_all'), data.get('holidays', 'ignore'),
+                data.get('timezone') or 'UTC'
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         return jsonify({
             'success': True,
@@ -159,7 +239,7 @@ def delete_door_schedule(sh_id):
 @app.route('/api/door/<door_id>/schedules')
 @login_required
 def api_get_door_schedules(door_id):
-    try:
+    def build():
         connection = sqlite3.connect(DB_NAME)
         cursor = connection.cursor()
         
@@ -180,15 +260,61 @@ def api_get_door_schedules(door_id):
                 'end': row[5],
                 'weekdays': row[6],
                 'type': row[7],
-                'created': row[8]
+                'created': row[8],
+                'holidays': row[9],
+                'timezone': row[10]
             })
         
         connection.close()
-        return jsonify({'success': True, 'schedules': schedules})
+        return {'success': True, 'schedules': schedules}
+
+    try:
+        return cached_json_response(('schedules',), build)
         
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/holidays', methods=['GET'])
+@login_required
+def api_get_holidays():
+    try:
+        from users_db import get_holidays
+        return cached_json_response(('holidays',), lambda: {'success': True, 'holidays': get_holidays()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/holidays', methods=['POST'])
+@login_required
+def api_add_holiday():
+    try:
+        data = request.get_json(silent=True) or {}
+        if not data.get('date'):
+            return jsonify({'success': False, 'message': 'Не указана дата'}), 400
+
+        from users_db import add_holiday
+        try:
+            day = add_holiday(data['date'], data.get('name', ''))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        log_event(f"Добавлен праздничный день {day}", "DoorManagement")
+        return jsonify({'success': True, 'message': f'Праздничный день {day} добавлен'})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/holidays/<day>', methods=['DELETE'])
+@login_required
+def api_delete_holiday(day):
+    try:
+        from users_db import delete_holiday
+        if not delete_holiday(day):
+            return jsonify({'success': False, 'message': 'Праздничный день не найден'}), 404
+
+        log_event(f"Удален праздничный день {day}", "DoorManagement")
+        return jsonify({'success': True, 'message': 'Праздничный день удален'})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/convert_to_utc', methods=['POST'])
 @login_required
 def api_convert_to_utc():
@@ -200,7 +326,8 @@ def api_convert_to_utc():
         if not time_str or not timezone_str:
             return jsonify({'success': False, 'message': 'Не указано время или часовой пояс'}), 400
         
-        today = datetime.now().date()
+        # Смещение зависит от даты (летнее время): по умолчанию берется сегодняшняя
+        today = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else datetime.now().date()
         time_parts = list(map(int, time_str.split(':')))
         
         if len(time_parts) < 2:
@@ -264,7 +391,7 @@ def logout():
 @login_required
 def dashboard():
     devices = mqtt.get_connected_devices() if mqtt else {}
-    return render_template('inPC.html', devices=devices, emergency_states=emergency_states)
+    return render_template('inPC.html', devices=devices, emergency_states=emergency_states.snapshot())
 
 @app.route('/events')
 @login_required
@@ -281,12 +408,26 @@ def events():
 
     return render_template('events.html', events=events)
 
+@app.route('/api/stats/access')
+@login_required
+def api_access_stats():
+    time_filter = request.args.get('range', 'today')
+    group_by = request.args.get('group_by', 'hour')
+    door = request.args.get('door')
+
+    if group_by not in ologger.STATS_GROUPS:
+        return jsonify({'success': False, 'message': f'Неизвестная группировка: {group_by}'}), 400
+
+    def build():
+        return ologger.get_access_stats(time_filter=time_filter, group_by=group_by, door=door)
+    return cached_json_response(('access_stats',), build)
+
 @app.route('/people_groups')
 @login_required
 def people_groups():
-    users = get_users()
+    from users_db import count_users
     groups = get_groups()
-    return render_template('poeples.html', users=users, groups=groups)
+    return render_template('poeples.html', users_count=count_users(), groups=groups)
 
 @app.route('/update_user/<string:user_id>', methods=['POST'])
 @login_required
@@ -337,12 +478,16 @@ def door_management():
 def api_get_doors():
     try:
         from users_db import get_all_doors
-        doors = get_all_doors()
-        return jsonify({
-            'success': True,
-            'doors': doors,
-            'count': len(doors)
-        })
+
+        def build():
+            doors = get_all_doors()
+            return {
+                'success': True,
+                'doors': doors,
+                'count': len(doors)
+            }
+
+        return cached_json_response(('doors',), build)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -398,6 +543,38 @@ def api_get_door(device_id):
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/door/<string:device_id>/users', methods=['GET'])
+@login_required
+def api_door_users(device_id):
+    try:
+        from users_db import get_user_names
+
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 5000)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        user_ids = permission_matrix.get_users_for_door(device_id)
+        page = user_ids[offset:offset + limit]
+        names = get_user_names(page)
+
+        return jsonify({
+            'success': True,
+            'device_id': device_id,
+            'count': len(user_ids),
+            'users': [{'id': user_id, 'name': names.get(user_id, '')} for user_id in page]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/users/<string:user_id>/doors', methods=['GET'])
+@login_required
+def api_user_doors(user_id):
+    try:
+        from users_db import get_accessible_doors_for_user
+        doors = get_accessible_doors_for_user(user_id)
+        return jsonify({'success': True, 'doors': doors, 'count': len(doors)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/door/<string:device_id>', methods=['PUT'])
 @login_required
 def api_update_door(device_id):
@@ -409,7 +586,7 @@ def api_update_door(device_id):
         from users_db import update_door
         update_data = {}
         
-        fields = ['name', 'location', 'description', 'status']
+        fields = ['name', 'location', 'description', 'status', 'zone_from', 'zone_to', 'anti_passback']
         for field in fields:
             if field in data:
                 update_data[field] = data[field]
@@ -448,12 +625,43 @@ def scenarios():
 def api_get_door_permissions():
     try:
         from users_db import get_door_permissions
-        permissions = get_door_permissions()
-        
-        return jsonify({
-            'success': True,
-            'permissions': permissions
-        })
+
+        def build():
+            return {
+                'success': True,
+                'permissions': get_door_permissions()
+            }
+
+        return cached_json_response(('permissions', 'groups', 'doors'), build)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def _dry_run():
+    return request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+
+def _impact_limit():
+    return min(max(request.args.get('limit', 100, type=int), 0), 10000)
+
+@app.route('/api/permissions/impact', methods=['POST'])
+@login_required
+def api_permissions_impact():
+    try:
+        data = request.get_json(silent=True) or {}
+        changes = data.get('changes')
+        if not isinstance(changes, list) or not changes:
+            return jsonify({'success': False, 'message': 'Нужен список изменений changes'}), 400
+        return jsonify({'success': True, 'impact': permission_matrix.preview_changes(changes, _impact_limit())})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/groups/<string:group_id>/delete_impact', methods=['GET'])
+@login_required
+def api_group_delete_impact(group_id):
+    try:
+        impact = permission_matrix.preview_changes([{'action': 'delete_group', 'group_id': group_id}], _impact_limit())
+        return jsonify({'success': True, 'impact': impact})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -471,13 +679,24 @@ def api_add_door_permission():
         if not group_id or not device_id:
             return jsonify({'success': False, 'message': 'group_id и device_id обязательны'}), 400
         
+        if _dry_run():
+            return jsonify({'success': True, 'impact': permission_matrix.preview_changes([{
+                'action': 'set',
+                'group_id': group_id,
+                'device_id': device_id,
+                'permission_type': data.get('permission_type', 'allow')
+            }], _impact_limit())})
+        
         from users_db import set_door_permission
-        set_door_permission(
-            group_id=group_id,
-            device_id=device_id,
-            permission_type=data.get('permission_type', 'allow'),
-            schedule=data.get('schedule', '{}')
-        )
+        try:
+            set_door_permission(
+                group_id=group_id,
+                device_id=device_id,
+                permission_type=data.get('permission_type', 'allow'),
+                schedule=data.get('schedule', '{}')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         log_event(f"Добавлено разрешение для группы {group_id} на дверь {device_id}", "DoorManagement")
         
@@ -493,6 +712,17 @@ def api_add_door_permission():
 @login_required
 def api_delete_door_permission(permission_id):
     try:
+        if _dry_run():
+            from users_db import get_door_permission_by_id
+            permission = get_door_permission_by_id(permission_id)
+            if not permission:
+                return jsonify({'success': False, 'message': 'Разрешение не найдено'}), 404
+            return jsonify({'success': True, 'impact': permission_matrix.preview_changes([{
+                'action': 'delete',
+                'group_id': permission['group_id'],
+                'device_id': permission['device_id']
+            }], _impact_limit())})
+        
         from users_db import delete_door_permission
         delete_door_permission(permission_id)
         
@@ -548,31 +778,205 @@ def api_test_door_access():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/access/evaluate', methods=['POST'])
+@login_required
+def api_access_evaluate():
+    try:
+        from users_db import evaluate_access_batch, ACCESS_EVALUATE_MAX_CHECKS
+
+        data = request.get_json(silent=True) or {}
+        checks = data.get('checks')
+        if not isinstance(checks, list) or not checks or not all(isinstance(check, dict) for check in checks):
+            return jsonify({'success': False, 'message': 'Нужен список проверок checks'}), 400
+        if len(checks) > ACCESS_EVALUATE_MAX_CHECKS:
+            return jsonify({'success': False, 'message': f'Не более {ACCESS_EVALUATE_MAX_CHECKS} проверок за запрос'}), 400
+
+        try:
+            results = evaluate_access_batch(checks)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        granted = sum(1 for result in results if result['success'])
+        return jsonify({
+            'success': True,
+            'results': results,
+            'summary': {'total': len(results), 'granted': granted, 'denied': len(results) - granted}
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/users/list', methods=['GET'])
 @login_required
 def api_get_users_list():
     try:
         from users_db import get_users
-        users = get_users()
-        
+
+        def build():
+            return {
+                'success': True,
+                'users': get_users()
+            }
+
+        return cached_json_response(('users',), build)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def encode_cursor(after):
+    import base64
+    if not after:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(after, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    import base64
+    if not cursor:
+        return None
+    after = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    if not isinstance(after, list) or len(after) != 2:
+        raise ValueError('Неверный курсор')
+    return tuple(after)
+
+@app.route('/api/users/directory', methods=['GET'])
+@login_required
+def api_users_directory():
+    try:
+        from users_db import search_users, DIRECTORY_FIELDS
+
+        query = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+
+        fields = None
+        if request.args.get('fields'):
+            fields = [f.strip() for f in request.args.get('fields').split(',') if f.strip()]
+            unknown = [f for f in fields if f not in DIRECTORY_FIELDS]
+            if unknown:
+                return jsonify({'success': False, 'message': f'Неизвестные поля: {", ".join(unknown)}'}), 400
+
+        try:
+            after = decode_cursor(request.args.get('cursor'))
+        except Exception:
+            return jsonify({'success': False, 'message': 'Неверный курсор'}), 400
+
+        users, next_after = search_users(query, after=after, limit=limit, fields=fields)
+
         return jsonify({
             'success': True,
-            'users': users
+            'users': users,
+            'next_cursor': encode_cursor(next_after)
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/users/import', methods=['POST'])
+@login_required
+def api_import_users():
+    try:
+        from user_import import import_users, detect_format, FORMATS
+        import io
+
+        upload = request.files.get('file')
+        if upload:
+            fmt = request.args.get('format') or detect_format(upload.filename)
+            raw = upload.stream
+        else:
+            fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (request.mimetype or '') else 'csv')
+            raw = request.stream
+
+        if fmt not in FORMATS:
+            return jsonify({'success': False, 'message': f'Неизвестный формат: {fmt}'}), 400
+
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        chunk_size = min(max(request.args.get('chunk_size', 1000, type=int), 1), 10000)
+
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        report = import_users(stream, fmt, chunk_size=chunk_size, dry_run=dry_run)
+
+        if not dry_run:
+            log_event(f"Массовый импорт пользователей: импортировано {report['imported']}, ошибок {report['failed']}")
+
+        return jsonify({'success': report['failed'] == 0, 'report': report})
+
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/users/export', methods=['GET'])
+@login_required
+def api_export_users():
+    from flask import stream_with_context
+    from user_import import export_users, FORMATS
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': f'Неизвестный формат: {fmt}'}), 400
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    log_event(f"Экспорт пользователей ({fmt})")
+
+    return Response(
+        stream_with_context(export_users(fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=users.{fmt}'}
+    )
+
+@app.route('/api/users/<string:user_id>/credentials', methods=['GET'])
+@login_required
+def api_get_user_credentials(user_id):
+    try:
+        from users_db import get_user_credentials
+        return jsonify({'success': True, 'credentials': get_user_credentials(user_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/users/<string:user_id>/credentials', methods=['POST'])
+@login_required
+def api_add_user_credential(user_id):
+    try:
+        from users_db import add_credential, CREDENTIAL_TYPES
+
+        data = request.get_json(silent=True) or {}
+        if not get_user_by_id(user_id):
+            return jsonify({'success': False, 'message': 'Пользователь не найден'}), 404
+        if not data.get('type') or not data.get('value'):
+            return jsonify({'success': False, 'message': 'Тип и значение идентификатора обязательны'}), 400
+        if data['type'] not in CREDENTIAL_TYPES:
+            return jsonify({'success': False, 'message': f"Неизвестный тип идентификатора: {data['type']}"}), 400
+
+        credential_id = add_credential(
+            user_id, data['type'], data['value'], data.get('facility', ''),
+            data.get('valid_from'), data.get('valid_to')
+        )
+        log_event(f"Пользователю {user_id} добавлен идентификатор {data['type']}")
+        return jsonify({'success': True, 'id': credential_id})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/credentials/<int:credential_id>', methods=['DELETE'])
+@login_required
+def api_delete_credential(credential_id):
+    try:
+        from users_db import delete_credential
+        delete_credential(credential_id)
+        log_event(f"Удален идентификатор {credential_id}")
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/groups', methods=['GET'])
 @login_required
 def api_get_groups():
     try:
         from users_db import get_groups
-        groups = get_groups()
-        
-        return jsonify({
-            'success': True,
-            'groups': groups
-        })
+
+        def build():
+            return {
+                'success': True,
+                'groups': get_groups()
+            }
+
+        return cached_json_response(('groups',), build)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -625,7 +1029,7 @@ def control_panel():
     devices = mqtt.get_connected_devices() if mqtt else {}
     return render_template('control_panel.html', 
                           devices=devices, 
-                          emergency_states=emergency_states)
+                          emergency_states=emergency_states.snapshot())
 
 @app.route('/add_group', methods=['POST'])
 @login_required
@@ -694,12 +1098,14 @@ def api_open_door():
             return jsonify({'success': False, 'message': 'Отказ: режим ЛОКДАУН активирован'}), 403
         
         if mqtt:
-            mqtt.open_door(device_id)
+            result = mqtt.open_door(device_id)
             
 
             
             log_event(f"Дверь открыта через интерфейс на устройстве {device_id}")
             
+            if result == PUBLISH_QUEUED:
+                return jsonify({'success': True, 'queued': True, 'message': f'MQTT недоступен, команда для {device_id} поставлена в очередь'})
             return jsonify({'success': True, 'message': f'Команда отправлена на устройство {device_id}'})
         else:
             return jsonify({'success': False, 'message': 'MQTT не инициализирован'})
@@ -727,10 +1133,16 @@ def api_close_door():
         
         if mqtt:
 
-            mqtt.close_door(device_id)
+            result = mqtt.close_door(device_id)
             
             log_event(f"Дверь закрыта через интерфейс на устройстве {device_id}")
             
+            if result == PUBLISH_QUEUED:
+                return jsonify({
+                    'success': True,
+                    'queued': True,
+                    'message': f'MQTT недоступен, команда закрытия для {device_id} поставлена в очередь'
+                })
             return jsonify({
                 'success': True, 
                 'message': f'Команда закрытия отправлена на устройство {device_id}'
@@ -781,7 +1193,7 @@ def api_evacuation():
         }, broadcast=True)
         
         socketio.emit('emergency_status', {
-            'status': emergency_states,
+            'status': emergency_states.snapshot(),
             'timestamp': datetime.now().isoformat()
         }, broadcast=True)
         
@@ -830,7 +1242,7 @@ def api_lockdown():
         }, broadcast=True)
         
         socketio.emit('emergency_status', {
-            'status': emergency_states,
+            'status': emergency_states.snapshot(),
             'timestamp': datetime.now().isoformat()
         }, broadcast=True)
         
@@ -858,7 +1270,7 @@ def api_normal_mode():
         }, broadcast=True)
         
         socketio.emit('emergency_status', {
-            'status': emergency_states,
+            'status': emergency_states.snapshot(),
             'timestamp': datetime.now().isoformat()
         }, broadcast=True)
         
@@ -875,10 +1287,48 @@ def api_normal_mode():
 def api_emergency_status():
     return jsonify({
         'success': True,
-        'status': emergency_states,
+        'status': emergency_states.snapshot(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/occupancy', methods=['GET'])
+@login_required
+def api_occupancy():
+    try:
+        return jsonify({
+            'success': True,
+            'occupancy': occupancy.get_occupancy(),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/occupancy/roll_call', methods=['GET'])
+@login_required
+def api_roll_call():
+    try:
+        people = occupancy.get_roll_call(request.args.get('zone'))
+        return jsonify({
+            'success': True,
+            'people': people,
+            'count': len(people),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/occupancy/reset', methods=['POST'])
+@login_required
+@admin_required
+def api_reset_occupancy():
+    try:
+        data = request.get_json(silent=True) or {}
+        count = occupancy.reset_presence(data.get('user_id'), data.get('zone'))
+        log_event(f"Сброшено присутствие в зонах: {count} (инициатор: {current_user.username})", "Emergency-System")
+        return jsonify({'success': True, 'reset': count})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/devices')
 @login_required
 def api_get_devices():
@@ -951,34 +1401,33 @@ def api_check_access():
                 'message': 'Доступ запрещен: активирован режим ЛОКДАУН'
             })
         
-        user = None
-        if card_number:
-            user = get_user_by_card(card_number)
-        elif pin_code:
-            user = get_user_by_pin(pin_code)
-        
-        if user and user.get('status') == 'active':
-            response = {
-                'success': True,
-                'message': f'Доступ разрешен для {user.get("name")}',
-                'user': {
-                    'id': user.get('id'),
-                    'name': user.get('name')
-                },
-                'device_id': device_id,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            
+        if not card_number and not pin_code:
+            return jsonify({'success': False, 'message': 'Нужен card_number или pin_code'}), 400
 
-            log_event(f"Тестовый доступ: {user.get('name')} - разрешен")
-            
-            return jsonify(response)
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Доступ запрещен - пользователь не найден или неактивен'
-            })
+        # Та же логика решения, что и для устройств, но без регистрации неизвестных дверей
+        from users_db import evaluate_access_batch
+        result = evaluate_access_batch([{
+            'card_number': card_number,
+            'pin_code': None if card_number else pin_code,
+            'device_id': device_id
+        }])[0]
+
+        response = {
+            'success': result['success'],
+            'message': result['reason'],
+            'device_id': device_id,
+            'timestamp': datetime.now().isoformat()
+        }
+
+        if result['user_id']:
+            user = get_user_by_id(result['user_id'])
+            response['user'] = {
+                'id': user.get('id'),
+                'name': user.get('name')
+            } if user else None
+            log_event(f"Тестовый доступ: {user.get('name') if user else result['user_id']} - {'разрешен' if result['success'] else 'запрещен'}: {result['reason']}")
+
+        return jsonify(response)
             
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -995,27 +1444,52 @@ from users_db import (
     register_device, update_device_last_seen, migrate_data
 )
 
-def start():
-    setupUserDB()
-    ologger.setupLogger()
-    
-    try:
-        from schedule_scheduler import start_schedule_scheduler
-        schedule_scheduler = start_schedule_scheduler()
-        print("Планировщик расписаний запущен")
-    except Exception as e:
-        print(f"Ошибка запуска планировщика расписаний: {e}")
+def setup_scenarios_db():
+    from scenarios_db import setup_scenarios_db
+    setup_scenarios_db()
+
+def start_mqtt():
+    global mqtt
+    mqtt = init_mqtt()
+
+def start_scheduler():
+    from schedule_scheduler import start_schedule_scheduler
+    start_schedule_scheduler()
+
+def stop_scheduler():
+    from schedule_scheduler import stop_schedule_scheduler
+    stop_schedule_scheduler()
+
+lifecycle.register('users_db', setupUserDB)
+lifecycle.register('logger', ologger.setupLogger)
+lifecycle.register('scenarios_db', setup_scenarios_db)
+lifecycle.register('occupancy', occupancy.load, stop=occupancy.stop, depends=('users_db',))
+lifecycle.register('permission_matrix', permission_matrix.get_matrix, depends=('users_db',), required=False)
+lifecycle.register('mqtt', start_mqtt, stop=stop_mqtt, depends=('logger', 'users_db'))
+lifecycle.register('schedules', schedules.start_transition_refresh, stop=schedules.stop_transition_refresh, depends=('users_db',))
+lifecycle.register('scheduler', start_scheduler, stop=stop_scheduler, depends=('users_db', 'mqtt'), required=False)
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, debug=SERVER_DEBUG):
+    realtime.start(socketio)
+    if debug:
+        socketio.run(app, host=host, port=port, debug=True, allow_unsafe_werkzeug=True, use_reloader=False)
+        return
+
+    import eventlet
+    import eventlet.wsgi
+    # SO_REUSEPORT: процессы HTTP из cluster.py принимают соединения на одном порту
+    listener = eventlet.listen((host, port), reuse_port=True)
+    eventlet.wsgi.server(listener, app, log_output=False)
+
+def start(run_server=True):
+    if lifecycle.start():
+        print(f"Подсистемы запущены за {lifecycle.startup_seconds:.3f} с")
+    else:
+        print(f"Ошибка запуска подсистем: {lifecycle.status()['subsystems']}")
     
-    if __name__ == '__main__':
+    if run_server:
         print("Запуск сервера FiroAccess...")
-        print("Планировщик расписаний активен")
-        
-        socketio.run(app, 
-                    host='0.0.0.0', 
-                    port=80, 
-                    debug=True, 
-                    allow_unsafe_werkzeug=True,
-                    use_reloader=False)
+        serve()
 
 if __name__ == '__main__':
     start()